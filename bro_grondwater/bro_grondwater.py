@@ -11,10 +11,21 @@ if sys.stdout is None:
 if sys.stderr is None:
     sys.stderr = io.StringIO()
 
+import json
 import os
 import re
+import time
 from concurrent.futures import ThreadPoolExecutor, as_completed
-from qgis.PyQt.QtCore import QSettings, QTranslator, QCoreApplication, Qt, QTimer
+from qgis.PyQt.QtCore import (
+    QSettings,
+    QTranslator,
+    QCoreApplication,
+    Qt,
+    QTimer,
+    QUrl,
+    QDate,
+)
+from qgis.PyQt.QtNetwork import QNetworkReply
 from qgis.PyQt.QtGui import QIcon
 from qgis.PyQt.QtWidgets import QAction, QFileDialog, QMessageBox, QDockWidget
 from qgis.core import (
@@ -25,19 +36,65 @@ from qgis.core import (
     QgsGeometry,
     QgsPointXY,
     QgsField,
+    QgsFields,
     QgsCoordinateReferenceSystem,
     QgsCoordinateTransform,
     QgsRectangle,
     QgsMessageLog,
+    QgsApplication,
+    QgsFeatureRequest,
+    QgsNetworkAccessManager,
+    QgsNetworkContentFetcherTask,
+    QgsTask,
     Qgis,
 )
 from qgis.PyQt.QtCore import QVariant
+from qgis.gui import QgsMapToolEmitPoint
 from .bro_grondwater_dialog import BROGrondwaterPluginPanel
+from .download_policy import (
+    NO_GMW_ID,
+    RETRYABLE,
+    TRANSIENT,
+    CircuitBreaker,
+    classify_error,
+    fetch_with_retries,
+)
+from .capabilities_cache import CapabilitiesCache, capabilities_key, has_layer
+from .correlation import CorrelationCache
+from .download_journal import DownloadJournal
+from .gld_parser import DEFAULT_BASE_URL, GLDSeries, fetch_gmw_series
+from .engine_selection import (
+    DEFAULT_ENGINE,
+    ENGINE_PREFERENCE,
+    EnginePolicy,
+    benchmark_engines,
+    detect_engines,
+    engine_kwargs,
+    workload_bucket,
+)
+from .metadata_store import PROGRESS_ROWS, MetadataStore, read_csv_snapshot
+from .polygon_query import PolygonQuery, dedupe_records
+from .profiling import OperationProfiler
+from .series_store import SeriesStore, sidecar_path
+from .shared_cache import SharedSeriesCache
+from .single_flight import SingleFlight
+from .spatial_index import WellIndex
+from .time_window import (
+    FULL_HISTORY,
+    merge_series,
+    missing_spans,
+    series_coverage,
+)
+from .wells_geopackage import append_wells, create_wells_geopackage, open_wells_layer
 
 
 class BROGrondwaterPlugin:
     """QGIS Plugin Implementation."""
 
+    # Custom layer property marking the wells layer, saved with the project
+    WELLS_LAYER_PROPERTY = "bro_grondwater/wells_layer"
+    CLUSTER_LAYER_PROPERTY = "bro_grondwater/well_clusters"
+
     def __init__(self, iface):
         """Constructor.
 
@@ -77,14 +134,108 @@ class BROGrondwaterPlugin:
         self._cancelled = False
         self._downloaded_measurements = {}  # Cache for downloaded measurements {cache_key: data}
 
+        # Project persistence: extent of the last retrieval and the series store
+        self._retrieval_extent = None
+        self._series_store = None
+        self._stored_keys = set()
+        self._restore_task = None
+        self._pending_filter = None
+
+        # PDOK capabilities cache and running layer loading tasks {kind: task}
+        self._capabilities_cache = CapabilitiesCache(
+            os.path.join(
+                QgsApplication.qgisSettingsDirPath(), "bro_grondwater", "capabilities"
+            ),
+            max_age_hours=int(
+                QSettings().value("BROGrondwater/capabilities_max_age_hours", 168)
+            ),
+        )
+        self._layer_tasks = {}
+        # Validated capabilities files handed to the WMS provider {capabilities_key: path}
+        self._served_capabilities = {}
+        self._preprocessor_id = None
+
+        # Local store with a bulk BRO GMW metadata snapshot
+        self._metadata_store = MetadataStore(
+            os.path.join(
+                QgsApplication.qgisSettingsDirPath(),
+                "bro_grondwater",
+                "gmw_snapshot.sqlite",
+            )
+        )
+        self._import_task = None
+
+        # Measured hpd.read_bro engine choice per extent size
+        self._engine_policy = None
+        self._benchmark_task = None
+
+        # Temporal Controller animation of levels on the wells layer
+        self._level_animation = None
+        self._surface_task = None
+
+        # Correlation analyses of the downloaded series, reused while unchanged
+        self._correlation_cache = CorrelationCache()
+        self._correlation_task = None
+        self._correlation_dialog = None
+
+        # Background export of the downloaded measurements
+        self._export_task = None
+
+        # Plot window following the downloads; plot arrays per cache key are
+        # kept between openings and dropped when a download changes the series
+        self._plot_window = None
+        self._plot_arrays = {}
+
+        # Spatial index over the wells layer for nearest/radius queries
+        self._well_index = None
+        self._pick_tool = None
+
+        # Grid clusters of the wells layer shown at small scales
+        self._cluster_layer = None
+        self._cluster_pyramid = None
+        self._cluster_keys = []  # Measurement cache key per clustered tube
+        self._plot_after_download = None
+
         # ThreadPoolExecutor for background downloads
         self._executor = None
         self._futures = []
+        self._future_sizes = {}  # Number of wells covered by each future
         self._poll_timer = None
         self._expected_results = 0
         self._downloaded_count = 0
         self._failed_count = 0
 
+        # Failed wells that can be retried {cache_key: {"feature", "error", "error_kind"}}
+        self._failed_wells = {}
+        self._failed_kinds = {}  # Failure count per error kind in the current batch
+        self._circuit_breaker = CircuitBreaker()
+
+        # Download through the streaming GLD parser instead of hydropandas
+        self._fast_parser = False
+
+        # Measurement cache shared with other QGIS sessions (optional)
+        self._shared_cache = None
+
+        # Series requests in flight per (GMW id, tube), shared by all consumers
+        self._flights = SingleFlight()
+
+        # Opt-in cProfile/tracemalloc capture of top-level operations
+        self.profiler = OperationProfiler(
+            QSettings().value(
+                "BROGrondwater/profile_dir",
+                os.path.join(
+                    QgsApplication.qgisSettingsDirPath(), "bro_grondwater", "profiles"
+                ),
+            ),
+            on_report=self._on_profile_report,
+        )
+
+        # On-disk journal of the running download session
+        self._journal = None
+        self._session_dir = os.path.join(
+            QgsApplication.qgisSettingsDirPath(), "bro_grondwater", "download_session"
+        )
+
     def tr(self, message):
         """Get the translation for a string using Qt translation API."""
         return QCoreApplication.translate("BROGrondwaterPlugin", message)
@@ -135,13 +286,41 @@ class BROGrondwaterPlugin:
             parent=self.iface.mainWindow(),
         )
 
+        QgsProject.instance().readProject.connect(self._on_project_read)
+        QgsProject.instance().writeProject.connect(self._on_project_write)
+        self._preprocessor_id = QgsNetworkAccessManager.setRequestPreprocessor(
+            self._serve_cached_capabilities
+        )
+
     def unload(self):
         """Removes the plugin menu item and icon from QGIS GUI."""
+        QgsProject.instance().readProject.disconnect(self._on_project_read)
+        QgsProject.instance().writeProject.disconnect(self._on_project_write)
+        if self._preprocessor_id is not None:
+            QgsNetworkAccessManager.removeRequestPreprocessor(self._preprocessor_id)
+            self._preprocessor_id = None
+
         for action in self.actions:
             self.iface.removePluginMenu(self.tr("&BRO Grondwater Plugin"), action)
             self.iface.removeToolBarIcon(action)
         del self.toolbar
 
+        if self._pick_tool is not None:
+            self.iface.mapCanvas().unsetMapTool(self._pick_tool)
+            self._pick_tool = None
+        self._stop_level_animation()
+        if self._surface_task is not None:
+            self._surface_task.cancel()
+        if self._correlation_task is not None:
+            self._correlation_task.cancel()
+        if self._export_task is not None:
+            self._export_task.cancel()
+        if self._correlation_dialog is not None:
+            self._correlation_dialog.close()
+            self._correlation_dialog = None
+        self._close_plot_window()
+        self._remove_cluster_layers()
+
         # Remove dock widget
         if self.dock_widget is not None:
             self.iface.removeDockWidget(self.dock_widget)
@@ -159,11 +338,57 @@ class BROGrondwaterPlugin:
             # Connect signals
             self.dlg.btnAddBasemap.clicked.connect(self.add_basemap)
             self.dlg.btnAddWmsLayer.clicked.connect(self.add_wms_layer)
-            self.dlg.btnRetrieveWells.clicked.connect(self.retrieve_wells)
-            self.dlg.btnApplyFilter.clicked.connect(self.apply_filter)
-            self.dlg.btnDownloadMeasurements.clicked.connect(self.download_measurements)
-            self.dlg.btnPlotData.clicked.connect(self.plot_measurements)
-            self.dlg.btnExportExcel.clicked.connect(self.export_to_excel)
+            self.dlg.btnRetrieveWells.clicked.connect(
+                self.profiler.slot(self.retrieve_wells)
+            )
+            self.dlg.btnRetrievePolygon.clicked.connect(
+                self.profiler.slot(self.retrieve_wells_in_polygon)
+            )
+            self.dlg.cmbPolygonLayer.setFilters(Qgis.LayerFilter.PolygonLayer)
+            self.dlg.btnPickWells.clicked.connect(self.pick_wells_around_point)
+            self.dlg.btnImportSnapshot.clicked.connect(self.import_snapshot)
+            self.dlg.btnBenchmarkEngines.clicked.connect(self.benchmark_engines)
+            self._update_snapshot_info()
+
+            # Default download period: the last 10 years
+            today = QDate.currentDate()
+            self.dlg.dateFrom.setDate(today.addYears(-10))
+            self.dlg.dateTo.setDate(today)
+            self.dlg.chkLimitPeriod.toggled.connect(self.dlg.dateFrom.setEnabled)
+            self.dlg.chkLimitPeriod.toggled.connect(self.dlg.dateTo.setEnabled)
+            self.dlg.btnApplyFilter.clicked.connect(self.profiler.slot(self.apply_filter))
+            self.dlg.btnDownloadMeasurements.clicked.connect(
+                self.profiler.slot(self.download_measurements)
+            )
+            self.dlg.btnRetryFailed.clicked.connect(self.retry_failed_downloads)
+            self.dlg.btnPlotData.clicked.connect(self.profiler.slot(self.plot_measurements))
+            self.dlg.btnExportExcel.clicked.connect(self.profiler.slot(self.export_to_excel))
+            self.dlg.btnExportGeoPackage.clicked.connect(
+                self.profiler.slot(self.export_to_geopackage)
+            )
+            self.dlg.btnExportParquet.clicked.connect(
+                self.profiler.slot(lambda: self.export_streaming("parquet"))
+            )
+            self.dlg.btnExportCsv.clicked.connect(
+                self.profiler.slot(lambda: self.export_streaming("csv"))
+            )
+            self.dlg.btnAnimateLevels.toggled.connect(self.toggle_level_animation)
+            self.dlg.btnCorrelation.clicked.connect(self.profiler.slot(self.analyze_correlation))
+            self.dlg.dateSurface.setDate(QDate.currentDate())
+            self.dlg.cmbSurfaceValue.currentIndexChanged.connect(
+                lambda index: self.dlg.dateSurface.setEnabled(index == 0)
+            )
+            self.dlg.btnInterpolateSurface.clicked.connect(
+                self.profiler.slot(self.interpolate_level_surface)
+            )
+
+            # Profiling mode, remembered between sessions
+            profiling = QSettings().value("BROGrondwater/profiling", False, type=bool)
+            self.dlg.chkProfiling.setChecked(profiling)
+            self.profiler.enabled = profiling
+            self.dlg.chkProfiling.toggled.connect(self._set_profiling)
+            self.dlg.chkClusterWells.setChecked(self._clustering_enabled())
+            self.dlg.chkClusterWells.toggled.connect(self._set_cluster_wells)
             self.dlg.btnCancel.clicked.connect(self._cancel_operation)
 
             # Create dock widget and add panel
@@ -179,6 +404,13 @@ class BROGrondwaterPlugin:
                 Qt.DockWidgetArea.RightDockWidgetArea, self.dock_widget
             )
 
+            # Show state that was restored from a project before the panel existed
+            if self.wells_layer is not None:
+                self._restore_filter_state()
+
+            # Offer to resume a download that was interrupted by a crash
+            self._offer_resume_download()
+
         # Show/toggle the dock widget
         if self.dock_widget.isVisible():
             self.dock_widget.hide()
@@ -217,18 +449,14 @@ class BROGrondwaterPlugin:
                 "request=GetCapabilities&service=WMS"
             )
 
-            self.wms_layer = QgsRasterLayer(wms_url, "BRO GMW Locations (WMS)", "wms")
-
-            if self.wms_layer.isValid():
-                QgsProject.instance().addMapLayer(self.wms_layer)
-                self.dlg.statusLabel.setText("WMS layer added successfully")
-            else:
-                QMessageBox.warning(
-                    self.dlg,
-                    "WMS Error",
-                    "Could not load WMS layer. Check your internet connection.",
-                )
-                self.wms_layer = None
+            self._add_service_layer(
+                "wms",
+                wms_url,
+                "BRO GMW Locations (WMS)",
+                "https://service.pdok.nl/bzk/bro-gminsamenhang-karakteristieken/wms/v1_0"
+                "?request=GetCapabilities&service=WMS",
+                "gm_gmw",
+            )
 
         except Exception as e:
             QMessageBox.critical(
@@ -270,44 +498,167 @@ class BROGrondwaterPlugin:
                 "url=https://service.pdok.nl/brt/achtergrondkaart/wmts/v2_0?request%3DGetCapabilities%26service%3DWMTS"
             )
 
-            # Create layer using QgsRasterLayer with wms provider
-            self.basemap_layer = QgsRasterLayer(
-                wmts_url, "BRT Achtergrondkaart (grijs)", "wms"
+            self._add_service_layer(
+                "basemap",
+                wmts_url,
+                "BRT Achtergrondkaart (grijs)",
+                "https://service.pdok.nl/brt/achtergrondkaart/wmts/v2_0"
+                "?request=GetCapabilities&service=WMTS",
+                "grijs",
             )
 
-            if self.basemap_layer.isValid():
-                # First add to project with addToLegend=True (default)
-                QgsProject.instance().addMapLayer(self.basemap_layer, True)
+        except Exception as e:
+            QMessageBox.critical(self.dlg, "Error", f"Error adding basemap:\n{str(e)}")
 
-                # Move layer to bottom of layer tree
-                root = QgsProject.instance().layerTreeRoot()
-                layer_node = root.findLayer(self.basemap_layer.id())
-                if layer_node:
-                    # Clone and re-add at bottom
-                    cloned_node = layer_node.clone()
-                    root.insertChildNode(-1, cloned_node)
-                    # Remove original node (which was at top)
-                    parent = layer_node.parent()
-                    if parent:
-                        parent.removeChildNode(layer_node)
+    def _add_service_layer(self, kind, uri, name, capabilities_url, layer_name):
+        """Validate a PDOK service and add its layer without blocking the UI.
 
-                # Force refresh
-                self.basemap_layer.triggerRepaint()
-                self.iface.mapCanvas().refresh()
+        The capabilities document is taken from the disk cache or fetched
+        asynchronously, and the raster layer is created in a background task.
+        """
+        if kind in self._layer_tasks:
+            self.dlg.statusLabel.setText(f"{name} is already loading...")
+            return
 
-                self.dlg.statusLabel.setText("Basemap added successfully")
-            else:
-                QMessageBox.warning(
-                    self.dlg,
-                    "Basemap Error",
-                    "Could not load basemap. Check your internet connection.\n\n"
-                    "You can manually add the BRT basemap via:\n"
-                    "Layer > Add Layer > Add WMS/WMTS Layer",
+        self._layer_tasks[kind] = None
+        content = self._capabilities_cache.get(capabilities_url)
+        if content is not None:
+            self._on_capabilities_ready(kind, uri, name, capabilities_url, layer_name, content)
+            return
+
+        self.dlg.statusLabel.setText(f"Loading {name}...")
+        task = QgsNetworkContentFetcherTask(QUrl(capabilities_url))
+        task.fetched.connect(
+            lambda: self._on_capabilities_fetched(
+                task, kind, uri, name, capabilities_url, layer_name
+            )
+        )
+        self._layer_tasks[kind] = task
+        QgsApplication.taskManager().addTask(task)
+
+    def _on_capabilities_fetched(
+        self, task, kind, uri, name, capabilities_url, layer_name
+    ):
+        """Cache a fetched capabilities document and continue loading the layer."""
+        reply = task.reply()
+        content = None
+        if reply is not None and reply.error() == QNetworkReply.NetworkError.NoError:
+            content = bytes(reply.readAll())
+            try:
+                self._capabilities_cache.put(capabilities_url, content)
+            except OSError as e:
+                QgsMessageLog.logMessage(
+                    f"Could not cache capabilities: {e}", "BRO Grondwater", Qgis.Warning
                 )
-                self.basemap_layer = None
+        else:
+            # Offline or service down: an expired document is better than nothing
+            content = self._capabilities_cache.get(capabilities_url, allow_stale=True)
 
-        except Exception as e:
-            QMessageBox.critical(self.dlg, "Error", f"Error adding basemap:\n{str(e)}")
+        self._on_capabilities_ready(kind, uri, name, capabilities_url, layer_name, content)
+
+    def _on_capabilities_ready(self, kind, uri, name, capabilities_url, layer_name, content):
+        """Create the raster layer in a background task once the service is validated.
+
+        The WMS provider is given the cached document, so it does not request
+        the capabilities again and also works offline with an expired document.
+        """
+        if content is None or not has_layer(content, layer_name):
+            self._layer_tasks.pop(kind, None)
+            self._on_service_layer_failed(kind)
+            return
+
+        path = self._capabilities_cache.path(capabilities_url)
+        if path is not None:
+            self._served_capabilities[capabilities_key(capabilities_url)] = path
+
+        task = QgsTask.fromFunction(
+            f"Loading {name}",
+            self._create_raster_layer,
+            uri,
+            name,
+            on_finished=lambda exception, result=None: self._on_service_layer_created(
+                kind, exception, result
+            ),
+        )
+        self._layer_tasks[kind] = task
+        QgsApplication.taskManager().addTask(task)
+
+    def _serve_cached_capabilities(self, request):
+        """Point GetCapabilities requests of validated services at the cached file.
+
+        Runs as a QgsNetworkAccessManager request preprocessor, in any thread.
+        """
+        if not self._served_capabilities:
+            return
+        url = request.url().toString()
+        if "getcapabilities" not in url.lower():
+            return
+        path = self._served_capabilities.get(capabilities_key(url))
+        if path is not None:
+            request.setUrl(QUrl.fromLocalFile(path))
+
+    def _create_raster_layer(self, task, uri, name):
+        """Create a WMS/WMTS raster layer (runs in a QgsTask)."""
+        layer = QgsRasterLayer(uri, name, "wms")
+        # Hand the layer over to the main thread before it is added to the project
+        layer.moveToThread(QCoreApplication.instance().thread())
+        return layer
+
+    def _on_service_layer_created(self, kind, exception, layer):
+        """Add a raster layer created in the background to the project."""
+        self._layer_tasks.pop(kind, None)
+        if exception is not None or layer is None or not layer.isValid():
+            self._on_service_layer_failed(kind)
+            return
+
+        if kind == "wms":
+            self.wms_layer = layer
+            QgsProject.instance().addMapLayer(self.wms_layer)
+            self.dlg.statusLabel.setText("WMS layer added successfully")
+            return
+
+        self.basemap_layer = layer
+
+        # First add to project with addToLegend=True (default)
+        QgsProject.instance().addMapLayer(self.basemap_layer, True)
+
+        # Move layer to bottom of layer tree
+        root = QgsProject.instance().layerTreeRoot()
+        layer_node = root.findLayer(self.basemap_layer.id())
+        if layer_node:
+            # Clone and re-add at bottom
+            cloned_node = layer_node.clone()
+            root.insertChildNode(-1, cloned_node)
+            # Remove original node (which was at top)
+            parent = layer_node.parent()
+            if parent:
+                parent.removeChildNode(layer_node)
+
+        # Force refresh
+        self.basemap_layer.triggerRepaint()
+        self.iface.mapCanvas().refresh()
+
+        self.dlg.statusLabel.setText("Basemap added successfully")
+
+    def _on_service_layer_failed(self, kind):
+        """Report that a PDOK service layer could not be loaded."""
+        self.dlg.statusLabel.setText("Ready")
+        if kind == "wms":
+            self.wms_layer = None
+            QMessageBox.warning(
+                self.dlg,
+                "WMS Error",
+                "Could not load WMS layer. Check your internet connection.",
+            )
+        else:
+            self.basemap_layer = None
+            QMessageBox.warning(
+                self.dlg,
+                "Basemap Error",
+                "Could not load basemap. Check your internet connection.\n\n"
+                "You can manually add the BRT basemap via:\n"
+                "Layer > Add Layer > Add WMS/WMTS Layer",
+            )
 
     def _start_operation(self):
         """Prepare UI for a long-running operation."""
@@ -315,7 +666,7 @@ class BROGrondwaterPlugin:
         self.dlg.btnCancel.setEnabled(True)
         self.dlg.btnRetrieveWells.setEnabled(False)
         self.dlg.btnDownloadMeasurements.setEnabled(False)
-        self.dlg.btnPlotData.setEnabled(False)
+        self.dlg.btnRetryFailed.setEnabled(False)
         self.dlg.btnExportExcel.setEnabled(False)
 
     def _end_operation(self):
@@ -324,7 +675,7 @@ class BROGrondwaterPlugin:
         self.dlg.btnCancel.setEnabled(False)
         self.dlg.btnRetrieveWells.setEnabled(True)
         self.dlg.btnDownloadMeasurements.setEnabled(True)
-        self.dlg.btnPlotData.setEnabled(True)
+        self.dlg.btnRetryFailed.setEnabled(bool(self._retryable_failed_wells()))
         self.dlg.btnExportExcel.setEnabled(True)
         self.dlg.progressBar.setValue(0)
 
@@ -335,6 +686,16 @@ class BROGrondwaterPlugin:
 
     def retrieve_wells(self):
         """Retrieve BRO groundwater monitoring wells for the current extent."""
+        self._retrieve_wells()
+
+    def retrieve_wells_in_polygon(self):
+        """Retrieve BRO groundwater monitoring wells within the chosen polygons."""
+        polygon_query = self._polygon_query()
+        if polygon_query is not None:
+            self._retrieve_wells(polygon_query)
+
+    def _retrieve_wells(self, polygon_query=None):
+        """Retrieve wells for the canvas extent, or within a PolygonQuery."""
         self._start_operation()
         try:
             # Import hydropandas here to avoid import errors if not installed
@@ -358,165 +719,132 @@ class BROGrondwaterPlugin:
                 )
                 return
 
-            # Get current map extent
-            canvas = self.iface.mapCanvas()
-            extent = canvas.extent()
-            crs = canvas.mapSettings().destinationCrs()
-
             self.dlg.progressBar.setValue(10)
             self.dlg.statusLabel.setText("Retrieving well locations from BRO...")
 
-            # Transform extent to RD (EPSG:28992) if needed (hydropandas default)
-            if crs.authid() != "EPSG:28992":
-                transform = QgsCoordinateTransform(
-                    crs,
-                    QgsCoordinateReferenceSystem("EPSG:28992"),
-                    QgsProject.instance(),
-                )
-                extent_rd = transform.transformBoundingBox(extent)
+            if polygon_query is None:
+                boxes = [self._canvas_extent_rd()]
+                self._retrieval_extent = boxes[0]
             else:
-                extent_rd = extent
-
-            # Create extent tuple for hydropandas (xmin, xmax, ymin, ymax)
-            extent_tuple = (
-                extent_rd.xMinimum(),
-                extent_rd.xMaximum(),
-                extent_rd.yMinimum(),
-                extent_rd.yMaximum(),
-            )
+                # Tight boxes along the polygon instead of its bounding box
+                boxes = polygon_query.boxes()
+                self._retrieval_extent = polygon_query.extent()
 
             self.dlg.progressBar.setValue(30)
 
-            # Retrieve observations using hydropandas
-            # Use read_bro for extent-based queries (returns ObsCollection)
-            # Use only_metadata=True for fast initial retrieval (measurements loaded on-demand)
-            # Try brodata engine first (faster), fall back to default if not available
+            obs_collection = None
             engine_used = None
-            try:
-                try:
-                    obs_collection = hpd.read_bro(
-                        extent=extent_tuple,
-                        tmin=None,
-                        tmax=None,
-                        only_metadata=True,
-                        engine="brodata",
-                    )
-                    engine_used = "brodata"
-                except TypeError:
-                    # brodata engine not available, use default
-                    obs_collection = hpd.read_bro(
-                        extent=extent_tuple, tmin=None, tmax=None, only_metadata=True
+            records = []
+            for box_nr, extent_tuple in enumerate(boxes):
+                if self.dlg.chkUseSnapshot.isChecked() and self._metadata_store.exists():
+                    # Well locations from the local BRO snapshot, no network call
+                    records.extend(self._metadata_store.query_extent(*extent_tuple))
+                    engine_used = "local snapshot"
+                else:
+                    # Retrieve observations using hydropandas
+                    # Use read_bro for extent-based queries (returns ObsCollection)
+                    # Use only_metadata=True for fast initial retrieval (measurements loaded on-demand)
+                    # The engine is the one measured fastest for this extent size
+                    bucket = workload_bucket(extent_tuple)
+                    engine_used = self._select_engine(hpd, bucket)
+                    try:
+                        start = time.perf_counter()
+                        try:
+                            obs_collection = hpd.read_bro(
+                                extent=extent_tuple,
+                                tmin=None,
+                                tmax=None,
+                                only_metadata=True,
+                                **engine_kwargs(engine_used),
+                            )
+                        except TypeError:
+                            if engine_used == DEFAULT_ENGINE:
+                                raise
+                            # Engine not supported by this hydropandas, use default
+                            self._save_engines(hpd, [DEFAULT_ENGINE])
+                            engine_used = DEFAULT_ENGINE
+                            start = time.perf_counter()
+                            obs_collection = hpd.read_bro(
+                                extent=extent_tuple,
+                                tmin=None,
+                                tmax=None,
+                                only_metadata=True,
+                            )
+                        self._record_engine_timing(
+                            bucket, engine_used, time.perf_counter() - start
+                        )
+                    except Exception as e:
+                        QMessageBox.warning(
+                            self.dlg,
+                            "Retrieval Error",
+                            f"Error retrieving data from BRO:\n{str(e)}\n\n"
+                            "Please check your internet connection and try again.",
+                        )
+                        self.dlg.progressBar.setValue(0)
+                        self.dlg.statusLabel.setText("Ready")
+                        return
+
+                    records.extend(self._collection_to_records(obs_collection))
+
+                if len(boxes) > 1:
+                    self.dlg.progressBar.setValue(30 + 30 * (box_nr + 1) // len(boxes))
+                    self.dlg.statusLabel.setText(
+                        f"Retrieving well locations from BRO ({box_nr + 1}/{len(boxes)} areas)..."
                     )
-                    engine_used = "default"
-            except Exception as e:
-                QMessageBox.warning(
-                    self.dlg,
-                    "Retrieval Error",
-                    f"Error retrieving data from BRO:\n{str(e)}\n\n"
-                    "Please check your internet connection and try again.",
-                )
-                self.dlg.progressBar.setValue(0)
-                self.dlg.statusLabel.setText("Ready")
-                return
+                    QCoreApplication.processEvents()
+
+            if polygon_query is not None:
+                # Wells found by overlapping boxes, then keep those inside the polygon
+                records = polygon_query.clip(dedupe_records(records))
 
             self.dlg.progressBar.setValue(60)
 
-            if len(obs_collection) == 0:
+            if len(records) == 0:
                 QMessageBox.information(
                     self.dlg,
                     "No Data",
-                    "No monitoring wells found in the current extent.",
+                    "No monitoring wells found in the current extent."
+                    if polygon_query is None
+                    else "No monitoring wells found within the polygons.",
                 )
                 self.dlg.progressBar.setValue(0)
                 self.dlg.statusLabel.setText("Ready")
                 return
 
-            # Create vector layer
-            layer = QgsVectorLayer(
-                "Point?crs=EPSG:28992", "BRO Monitoring Wells", "memory"
-            )
-            provider = layer.dataProvider()
-
-            # Add fields (Hydropandas style naming)
-            provider.addAttributes(
-                [
-                    QgsField("name", QVariant.String),
-                    QgsField("bro_id", QVariant.String),
-                    QgsField("x", QVariant.Double),
-                    QgsField("y", QVariant.Double),
-                    QgsField("ground_level", QVariant.Double),
-                    QgsField("screen_top", QVariant.Double),
-                    QgsField("screen_bottom", QVariant.Double),
-                    QgsField("tube_top", QVariant.Double),
-                    QgsField("tube_nr", QVariant.Int),
-                ]
-            )
-            layer.updateFields()
-
-            # Add features
-            features = []
-            for idx, row in obs_collection.iterrows():
-                obs = row["obs"]
-                feature = QgsFeature()
-
-                # Get coordinates (assuming RD coordinates in metadata)
-                if hasattr(obs, "x") and hasattr(obs, "y"):
-                    x, y = obs.x, obs.y
-                elif (
-                    hasattr(obs, "metadata")
-                    and "x" in obs.metadata
-                    and "y" in obs.metadata
-                ):
-                    x = obs.metadata["x"]
-                    y = obs.metadata["y"]
-                elif "x" in row and "y" in row:
-                    x, y = row["x"], row["y"]
-                else:
-                    continue
-
-                feature.setGeometry(QgsGeometry.fromPointXY(QgsPointXY(x, y)))
-
-                # Get metadata from obs object or row
-                metadata = obs.metadata if hasattr(obs, "metadata") else {}
-
-                # Set attributes
-                attributes = [
-                    obs.name if hasattr(obs, "name") else row.get("name", ""),
-                    metadata.get("bro_id", row.get("bro_id", "")),
-                    x,
-                    y,
-                    metadata.get("ground_level", row.get("ground_level", None)),
-                    metadata.get("screen_top", row.get("screen_top", None)),
-                    metadata.get("screen_bottom", row.get("screen_bottom", None)),
-                    metadata.get("tube_top", row.get("tube_top", None)),
-                    metadata.get("tube_nr", row.get("tube_nr", None)),
-                ]
-                feature.setAttributes(attributes)
-                features.append(feature)
+            if self.dlg.chkStoreGeoPackage.isChecked():
+                layer, added_count = self._store_wells_in_geopackage(records)
+                if layer is None:
+                    self.dlg.progressBar.setValue(0)
+                    self.dlg.statusLabel.setText("Ready")
+                    return
+            else:
+                # Create vector layer
+                layer = QgsVectorLayer(
+                    "Point?crs=EPSG:28992", "BRO Monitoring Wells", "memory"
+                )
+                provider = layer.dataProvider()
+                provider.addAttributes(self._well_fields())
+                layer.updateFields()
 
-            provider.addFeatures(features)
-            layer.updateExtents()
+                features = self._records_to_features(records, layer.fields())
+                provider.addFeatures(features)
+                layer.updateExtents()
+                added_count = len(features)
 
             self.dlg.progressBar.setValue(80)
 
-            # Add layer to map
-            QgsProject.instance().addMapLayer(layer)
+            # Add layer to map (a GeoPackage layer may already be in the project)
+            if QgsProject.instance().mapLayer(layer.id()) is None:
+                layer.setCustomProperty(self.WELLS_LAYER_PROPERTY, True)
+                QgsProject.instance().addMapLayer(layer)
             self.wells_layer = layer
 
-            # Apply QML styling if available
-            qml_path = os.path.join(self.plugin_dir, "styles", "gmw.qml")
-            if os.path.exists(qml_path):
-                success, msg = layer.loadNamedStyle(qml_path)
-                if success:
-                    layer.triggerRepaint()
-                else:
-                    print(f"Failed to load style: {msg}")
-            else:
-                print(f"Style file not found: {qml_path}")
+            self._apply_wells_style(layer)
 
             self.dlg.progressBar.setValue(100)
             self.dlg.statusLabel.setText(
-                f"Retrieved {len(features)} wells (engine: {engine_used})"
+                f"Retrieved {len(records)} wells, {added_count} new "
+                f"(engine: {engine_used})"
             )
 
             # Store observation collection for later use
@@ -525,11 +853,13 @@ class BROGrondwaterPlugin:
 
             # Update filter histogram with screen_top values
             self._update_filter_histogram()
+            self._build_well_index()
+            self._build_well_clusters()
 
             QMessageBox.information(
                 self.dlg,
                 "Success",
-                f"Successfully retrieved {len(features)} monitoring wells.",
+                f"Successfully retrieved {len(records)} monitoring wells.",
             )
 
         except Exception as e:
@@ -538,231 +868,1367 @@ class BROGrondwaterPlugin:
         finally:
             self._end_operation()
 
-    def apply_filter(self):
-        """Apply depth filter to the wells layer."""
-        if self.wells_layer is None:
-            QMessageBox.warning(self.dlg, "No Layer", "Please retrieve wells first.")
-            return
-
-        try:
-            min_depth = self.dlg.spinMinDepth.value()
-            max_depth = self.dlg.spinMaxDepth.value()
-
-            # Build filter expression
-            if max_depth > min_depth:
-                filter_expr = (
-                    f'"screen_top" >= {min_depth} AND "screen_top" <= {max_depth}'
-                )
+    def _apply_wells_style(self, layer):
+        """Apply the QML styling of the wells layer if available."""
+        qml_path = os.path.join(self.plugin_dir, "styles", "gmw.qml")
+        if os.path.exists(qml_path):
+            success, msg = layer.loadNamedStyle(qml_path)
+            if success:
+                layer.triggerRepaint()
             else:
-                filter_expr = f'"screen_top" >= {min_depth}'
+                print(f"Failed to load style: {msg}")
+        else:
+            print(f"Style file not found: {qml_path}")
+        self._set_wells_scale_visibility(layer)
 
-            self.wells_layer.setSubsetString(filter_expr)
+    def _polygon_query(self):
+        """Return a PolygonQuery for the chosen polygon layer (or its selection)."""
+        layer = self.dlg.cmbPolygonLayer.currentLayer()
+        if layer is None:
+            QMessageBox.warning(
+                self.dlg, "No Polygon Layer", "Choose a polygon layer to retrieve wells in."
+            )
+            return None
 
-            # Refresh the layer and canvas
-            self.wells_layer.triggerRepaint()
-            self.iface.mapCanvas().refresh()
+        if self.dlg.chkPolygonSelected.isChecked():
+            features = layer.getSelectedFeatures()
+        else:
+            features = layer.getFeatures()
+        geometries = [f.geometry() for f in features if f.hasGeometry()]
+        if not geometries:
+            QMessageBox.warning(
+                self.dlg,
+                "No Polygons",
+                "The polygon layer has no (selected) features to retrieve wells in.",
+            )
+            return None
 
-            filtered_count = self.wells_layer.featureCount()
-            self.dlg.statusLabel.setText(
-                f"Filter applied: {filtered_count} wells visible"
+        geometry = QgsGeometry.unaryUnion(geometries)
+        if layer.crs().authid() != "EPSG:28992":
+            geometry.transform(
+                QgsCoordinateTransform(
+                    layer.crs(),
+                    QgsCoordinateReferenceSystem("EPSG:28992"),
+                    QgsProject.instance(),
+                )
+            )
+        return PolygonQuery(geometry, self.dlg.spinPolygonBuffer.value())
+
+    def _canvas_extent_rd(self):
+        """Return the map canvas extent in RD as (xmin, xmax, ymin, ymax)."""
+        canvas = self.iface.mapCanvas()
+        extent = canvas.extent()
+        crs = canvas.mapSettings().destinationCrs()
+
+        # Transform extent to RD (EPSG:28992) if needed (hydropandas default)
+        if crs.authid() != "EPSG:28992":
+            transform = QgsCoordinateTransform(
+                crs,
+                QgsCoordinateReferenceSystem("EPSG:28992"),
+                QgsProject.instance(),
             )
+            extent = transform.transformBoundingBox(extent)
+
+        # Extent tuple for hydropandas (xmin, xmax, ymin, ymax)
+        return (
+            extent.xMinimum(),
+            extent.xMaximum(),
+            extent.yMinimum(),
+            extent.yMaximum(),
+        )
 
-            # Zoom to filtered features if any
-            if filtered_count > 0:
-                self.wells_layer.updateExtents()
-                self.iface.mapCanvas().setExtent(self.wells_layer.extent())
-                self.iface.mapCanvas().refresh()
+    def _engine_version_key(self, hpd):
+        """Return the installed hydropandas/brodata versions the engine data belongs to."""
+        from importlib import metadata
 
-            # Update histogram to show filter range
-            self._update_filter_histogram(min_depth, max_depth)
+        try:
+            brodata_version = metadata.version("brodata")
+        except metadata.PackageNotFoundError:
+            brodata_version = "none"
+        return f"hydropandas {getattr(hpd, '__version__', '?')}, brodata {brodata_version}"
+
+    def _available_engines(self, hpd):
+        """Return the supported engines, detected once per installed version."""
+        settings = QSettings()
+        version_key = self._engine_version_key(hpd)
+        if settings.value("BROGrondwater/engine_version") == version_key:
+            engines = settings.value("BROGrondwater/engines", "")
+            if engines:
+                return engines.split(",")
+
+        engines = detect_engines(hpd.read_bro)
+        if engines is None:
+            # Unknown until the first retrieval tries it
+            return list(ENGINE_PREFERENCE)
+        self._save_engines(hpd, engines)
+        return engines
+
+    def _save_engines(self, hpd, engines):
+        """Remember the supported engines; measured timings of another version are dropped."""
+        settings = QSettings()
+        version_key = self._engine_version_key(hpd)
+        if settings.value("BROGrondwater/engine_version") != version_key:
+            settings.setValue("BROGrondwater/engine_timings", "{}")
+            settings.setValue("BROGrondwater/engine_benchmarks", "{}")
+            self._engine_policy = None
+        settings.setValue("BROGrondwater/engine_version", version_key)
+        settings.setValue("BROGrondwater/engines", ",".join(engines))
+        if self._engine_policy is not None:
+            self._engine_policy.engines = list(engines)
+
+    def _get_engine_policy(self, hpd):
+        """Return the engine policy with the timings measured so far."""
+        if self._engine_policy is None:
+            engines = self._available_engines(hpd)
+            series = []
+            for key in ("BROGrondwater/engine_timings", "BROGrondwater/engine_benchmarks"):
+                try:
+                    series.append(json.loads(QSettings().value(key, "{}") or "{}"))
+                except ValueError:
+                    series.append({})
+            self._engine_policy = EnginePolicy(engines, *series)
+        return self._engine_policy
+
+    def _select_engine(self, hpd, bucket):
+        """Return the engine chosen in the panel, or the fastest one for the bucket."""
+        policy = self._get_engine_policy(hpd)
+        choice = self.dlg.cmbEngine.currentText()
+        if choice in policy.engines:
+            return choice
+        engine = policy.choose(bucket)
+        QgsMessageLog.logMessage(
+            f"Using engine {engine} for a {bucket} extent", "BRO Grondwater", Qgis.Info
+        )
+        return engine
 
-        except Exception as e:
-            QMessageBox.critical(
-                self.dlg, "Filter Error", f"Error applying filter:\n{str(e)}"
+    def _record_engine_timing(self, bucket, engine, seconds, benchmark=False):
+        """Add a retrieval (or benchmark) timing to the engine policy and log it."""
+        if self._engine_policy is None:
+            return
+        runs, mean = self._engine_policy.record(bucket, engine, seconds, benchmark)
+        if benchmark:
+            QSettings().setValue(
+                "BROGrondwater/engine_benchmarks", json.dumps(self._engine_policy.benchmarks)
             )
+        else:
+            QSettings().setValue(
+                "BROGrondwater/engine_timings", json.dumps(self._engine_policy.timings)
+            )
+        QgsMessageLog.logMessage(
+            f"Engine {engine} for a {bucket} extent: {seconds:.2f} s "
+            f"({'benchmark ' if benchmark else ''}mean {mean:.2f} s over {runs} runs)",
+            "BRO Grondwater",
+            Qgis.Info,
+        )
 
-    def download_measurements(self):
-        """Download measurements for selected wells (or all if none selected).
-
-        Uses multiprocessing to run downloads in separate Python processes,
-        avoiding pyproj/PROJ conflicts with QGIS.
-        """
-        if self.wells_layer is None:
-            QMessageBox.warning(self.dlg, "No Layer", "Please retrieve wells first.")
+    def benchmark_engines(self):
+        """Time the available engines on the current extent in a background task."""
+        if self._benchmark_task is not None:
+            self.dlg.statusLabel.setText("Engine benchmark already running...")
+            return
+        try:
+            import hydropandas as hpd
+        except ImportError:
+            QMessageBox.critical(
+                self.dlg,
+                "Missing Dependency",
+                "Hydropandas is not installed.\n\n"
+                "Install via OSGeo4W Shell:\n"
+                "  pip install hydropandas pandas xlsxwriter matplotlib brodata",
+            )
             return
 
-        selected_features = self.wells_layer.selectedFeatures()
-
-        # If no selection, use all visible features
-        if len(selected_features) == 0:
-            selected_features = list(self.wells_layer.getFeatures())
-            if len(selected_features) == 0:
-                QMessageBox.warning(
-                    self.dlg, "No Wells", "No wells available to download."
-                )
-                return
+        extent = self._canvas_extent_rd()
+        engines = self._get_engine_policy(hpd).engines
+        # Responses are recorded per extent, so repeated benchmarks run offline
+        fixture_dir = os.path.join(
+            QgsApplication.qgisSettingsDirPath(),
+            "bro_grondwater",
+            "engine_fixtures",
+            "_".join(str(round(v)) for v in extent),
+        )
 
-        # Filter out already downloaded wells
-        features_to_download = []
-        for feature in selected_features:
-            cache_key = f"{feature['bro_id']}_{feature['tube_nr']}_{feature['name']}"
-            if cache_key not in self._downloaded_measurements:
-                features_to_download.append(
-                    {
-                        "bro_id": feature["bro_id"],
-                        "name": feature["name"],
-                        "tube_nr": feature["tube_nr"],
-                    }
-                )
+        self._benchmark_task = QgsTask.fromFunction(
+            "Benchmarking hydropandas engines",
+            lambda task: benchmark_engines(
+                extent,
+                engines,
+                fixture_dir,
+                is_cancelled=task.isCanceled,
+            ),
+            on_finished=lambda exception, result=None: self._on_engines_benchmarked(
+                workload_bucket(extent), exception, result
+            ),
+        )
+        QgsApplication.taskManager().addTask(self._benchmark_task)
+        self.dlg.statusLabel.setText(
+            f"Benchmarking engines ({', '.join(engines)}) on the current extent..."
+        )
 
-        if len(features_to_download) == 0:
-            self.dlg.statusLabel.setText(
-                f"All {len(selected_features)} wells already downloaded"
+    def _on_engines_benchmarked(self, bucket, exception, result=None):
+        """Store the benchmark timings in the engine policy and report them."""
+        self._benchmark_task = None
+        if exception is not None:
+            QMessageBox.warning(
+                self.dlg, "Benchmark Error", f"Error benchmarking engines:\n{str(exception)}"
             )
             return
+        if not result:
+            self.dlg.statusLabel.setText("Engine benchmark gave no results")
+            return
 
-        # Warn user if downloading many wells
-        if len(features_to_download) > 20:
-            reply = QMessageBox.warning(
-                self.dlg,
-                "Large Download",
-                f"You are about to download measurements for {len(features_to_download)} wells.\n\n"
-                "This may take a long time. Consider selecting fewer wells or "
-                "applying a filter first.\n\n"
-                f"Do you want to download the timeseries for all {len(features_to_download)} wells anyway?",
-                QMessageBox.Yes | QMessageBox.No,
-                QMessageBox.No,
-            )
-            if reply != QMessageBox.Yes:
-                self.dlg.statusLabel.setText("Download cancelled")
-                return
-
-        self._start_operation()
+        summary = []
+        for engine, timings in result.items():
+            for seconds in timings:
+                self._record_engine_timing(bucket, engine, seconds, benchmark=True)
+            summary.append(f"{engine} {min(timings):.2f} s")
+        fastest = self._engine_policy.fastest(bucket)
         self.dlg.statusLabel.setText(
-            f"Starting download of {len(features_to_download)} wells..."
+            f"Benchmark ({bucket}): {', '.join(summary)}; using {fastest}"
         )
 
-        # Setup for threaded downloads
-        self._expected_results = len(features_to_download)
-        self._downloaded_count = 0
-        self._failed_count = 0
-        self._futures = []
+    def import_snapshot(self):
+        """Import a bulk BRO GMW metadata export into the local snapshot store."""
+        if self._import_task is not None:
+            self.dlg.statusLabel.setText("Snapshot import already running...")
+            return
 
-        # Start ThreadPoolExecutor
-        try:
-            self._executor = ThreadPoolExecutor(max_workers=3)
+        file_path, _ = QFileDialog.getOpenFileName(
+            self.dlg,
+            "Import BRO GMW Snapshot",
+            os.path.expanduser("~"),
+            "BRO GMW export (*.csv *.gpkg *.gml *.geojson);;All files (*)",
+        )
+        if not file_path:
+            return
 
-            # Submit all downloads
-            for feature_data in features_to_download:
-                future = self._executor.submit(self._download_single_well, feature_data)
-                self._futures.append(future)
+        self._import_task = QgsTask.fromFunction(
+            "Importing BRO GMW snapshot",
+            self._run_snapshot_import,
+            file_path,
+            on_finished=self._on_snapshot_imported,
+        )
+        QgsApplication.taskManager().addTask(self._import_task)
+        self.dlg.statusLabel.setText(f"Importing {os.path.basename(file_path)}...")
 
-            # Start timer to poll for results
-            self._poll_timer = QTimer()
-            self._poll_timer.timeout.connect(self._poll_download_results)
-            self._poll_timer.start(200)  # Poll every 200ms
+    def _snapshot_rows(self, file_path, progress=None):
+        """Stream rows from a snapshot file; non-CSV files are read through OGR.
 
-        except Exception as e:
+        ``progress`` is called with the fraction of the file read so far.
+        """
+        if file_path.lower().endswith(".csv"):
+            yield from read_csv_snapshot(file_path, progress)
+            return
+
+        layer = QgsVectorLayer(file_path, "snapshot", "ogr")
+        if not layer.isValid():
+            raise IOError(f"Could not open {file_path}")
+
+        # Point geometries are transformed to RD when the source uses another CRS
+        transform = None
+        if layer.crs().authid() != "EPSG:28992":
+            transform = QgsCoordinateTransform(
+                layer.crs(),
+                QgsCoordinateReferenceSystem("EPSG:28992"),
+                QgsProject.instance().transformContext(),
+            )
+        names = layer.fields().names()
+        feature_count = max(layer.featureCount(), 1)
+        for count, feature in enumerate(layer.getFeatures(), 1):
+            if progress is not None and count % PROGRESS_ROWS == 0:
+                progress(min(1.0, count / feature_count))
+            row = dict(zip(names, feature.attributes()))
+            geometry = feature.geometry()
+            if geometry is not None and not geometry.isEmpty():
+                point = geometry.centroid().asPoint()
+                if transform is not None:
+                    point = transform.transform(point)
+                row["x"], row["y"] = point.x(), point.y()
+            yield row
+
+    def _run_snapshot_import(self, task, file_path):
+        """Bulk load a snapshot into the metadata store (runs in a QgsTask)."""
+        # Reading the file is most of the work; the indexes are built after it
+        rows = self._snapshot_rows(
+            file_path, progress=lambda fraction: task.setProgress(90 * fraction)
+        )
+        return self._metadata_store.ingest(rows, file_path, is_cancelled=task.isCanceled)
+
+    def _on_snapshot_imported(self, exception, result=None):
+        """Report the result of a snapshot import."""
+        self._import_task = None
+        if exception is not None:
             QMessageBox.critical(
-                self.dlg, "Download Error", f"Error starting download:\n{str(e)}"
+                self.dlg, "Import Error", f"Error importing snapshot:\n{str(exception)}"
             )
-            self._end_operation()
+            return
+        if result is None:
+            self.dlg.statusLabel.setText("Snapshot import cancelled")
+            return
 
-    def _download_single_well(self, feature_data):
-        """Download measurements for a single well (runs in thread)."""
-        import hydropandas as hpd
-        import math
-        import time
+        self._update_snapshot_info()
+        self.dlg.chkUseSnapshot.setChecked(True)
+        self.dlg.statusLabel.setText(f"Imported {result} wells into local snapshot")
+
+    def _update_snapshot_info(self):
+        """Show the age of the local snapshot next to the option that uses it."""
+        info = self._metadata_store.info()
+        self.dlg.chkUseSnapshot.setEnabled(bool(info))
+        if info:
+            self.dlg.chkUseSnapshot.setToolTip(
+                f"Snapshot of {info.get('imported', '?')[:10]} "
+                f"({info.get('count', '?')} wells from {info.get('source', '?')}). "
+                "Import a new export to refresh it."
+            )
 
-        bro_id = feature_data["bro_id"]
-        name = feature_data["name"]
-        tube_nr = feature_data["tube_nr"]
-        cache_key = f"{bro_id}_{tube_nr}_{name}"
+    def _well_fields(self):
+        """Return the attribute fields of the wells layer (Hydropandas style naming)."""
+        return [
+            QgsField("name", QVariant.String),
+            QgsField("bro_id", QVariant.String),
+            QgsField("x", QVariant.Double),
+            QgsField("y", QVariant.Double),
+            QgsField("ground_level", QVariant.Double),
+            QgsField("screen_top", QVariant.Double),
+            QgsField("screen_bottom", QVariant.Double),
+            QgsField("tube_top", QVariant.Double),
+            QgsField("tube_nr", QVariant.Int),
+        ]
+
+    def _collection_to_records(self, obs_collection):
+        """Convert an ObsCollection into a list of well attribute dictionaries."""
+        records = []
+        for idx, row in obs_collection.iterrows():
+            obs = row["obs"]
+
+            # Get coordinates (assuming RD coordinates in metadata)
+            if hasattr(obs, "x") and hasattr(obs, "y"):
+                x, y = obs.x, obs.y
+            elif hasattr(obs, "metadata") and "x" in obs.metadata and "y" in obs.metadata:
+                x = obs.metadata["x"]
+                y = obs.metadata["y"]
+            elif "x" in row and "y" in row:
+                x, y = row["x"], row["y"]
+            else:
+                continue
+
+            # Get metadata from obs object or row
+            metadata = obs.metadata if hasattr(obs, "metadata") else {}
+
+            records.append(
+                {
+                    "name": obs.name if hasattr(obs, "name") else row.get("name", ""),
+                    "bro_id": metadata.get("bro_id", row.get("bro_id", "")),
+                    "x": x,
+                    "y": y,
+                    "ground_level": metadata.get(
+                        "ground_level", row.get("ground_level", None)
+                    ),
+                    "screen_top": metadata.get("screen_top", row.get("screen_top", None)),
+                    "screen_bottom": metadata.get(
+                        "screen_bottom", row.get("screen_bottom", None)
+                    ),
+                    "tube_top": metadata.get("tube_top", row.get("tube_top", None)),
+                    "tube_nr": metadata.get("tube_nr", row.get("tube_nr", None)),
+                }
+            )
+        return records
+
+    def _records_to_features(self, records, fields):
+        """Build point features for the given fields from well records."""
+        features = []
+        for record in records:
+            feature = QgsFeature(fields)
+            feature.setGeometry(
+                QgsGeometry.fromPointXY(QgsPointXY(record["x"], record["y"]))
+            )
+            for field_name, value in record.items():
+                if fields.indexOf(field_name) >= 0:
+                    feature.setAttribute(field_name, value)
+            features.append(feature)
+        return features
 
-        # Try to find GMW id
-        gmw_id = None
-        for candidate in [bro_id, name]:
-            if candidate and "GMW" in str(candidate):
-                match = re.search(r"GMW\d+", str(candidate))
-                if match:
-                    gmw_id = match.group(0)
-                    break
+    def _wells_geopackage_path(self):
+        """Return the GeoPackage used for wells, asking the user if none is set.
 
-        if not gmw_id:
-            return {
-                "success": False,
-                "cache_key": cache_key,
-                "error": "No GMW ID found",
-                "name": name,
-                "bro_id": bro_id,
-                "tube_nr": tube_nr,
+        The path is stored in the project, so every project has its own wells.
+        """
+        project = QgsProject.instance()
+        path, ok = project.readEntry("BROGrondwater", "wells_gpkg_path", "")
+        if ok and path:
+            return project.readPath(path)
+
+        # Default to the project folder so the data travels with the project
+        project_dir = project.absolutePath()
+        if not project_dir:
+            project_dir = os.path.expanduser("~")
+        default_path = os.path.join(project_dir, "BRO_GMW_wells.gpkg")
+
+        path, _ = QFileDialog.getSaveFileName(
+            self.dlg, "Store Wells in GeoPackage", default_path, "GeoPackage (*.gpkg)"
+        )
+        if path:
+            project.writeEntry("BROGrondwater", "wells_gpkg_path", project.writePath(path))
+        return path
+
+    def _store_wells_in_geopackage(self, records):
+        """Append well records to the wells GeoPackage.
+
+        Returns the (possibly already loaded) wells layer and the number of
+        wells that were new, or (None, 0) if no GeoPackage was chosen.
+        """
+        path = self._wells_geopackage_path()
+        if not path:
+            return None, 0
+
+        # Reuse the layer in the project if it points at the same GeoPackage
+        layer = None
+        if self.wells_layer is not None:
+            try:
+                source = self.wells_layer.source().split("|")[0]
+                if os.path.normcase(os.path.abspath(source)) == os.path.normcase(
+                    os.path.abspath(path)
+                ):
+                    layer = self.wells_layer
+            except RuntimeError:
+                # Layer was deleted, reset reference
+                self.wells_layer = None
+
+        if layer is None:
+            layer = open_wells_layer(path, "BRO Monitoring Wells")
+        if layer is None:
+            fields = QgsFields()
+            for field in self._well_fields():
+                fields.append(field)
+            create_wells_geopackage(path, fields)
+            layer = open_wells_layer(path, "BRO Monitoring Wells")
+            if layer is None:
+                raise IOError(f"Could not open GeoPackage {path}")
+
+        features = self._records_to_features(records, layer.fields())
+        added_count = append_wells(layer, features)
+        return layer, added_count
+
+    def _on_project_read(self, *args):
+        """Restore the wells layer and downloaded series saved with the project."""
+        import json
+
+        self.wells_layer = None
+        for layer in QgsProject.instance().mapLayers().values():
+            if layer.customProperty(self.WELLS_LAYER_PROPERTY, False):
+                self.wells_layer = layer
+                break
+
+        self._downloaded_measurements = {}
+        self._series_store = None
+        self._restore_task = None
+        self._stored_keys = set()
+        self._pending_filter = None
+        self._close_plot_window()
+
+        state_json, ok = QgsProject.instance().readEntry("BROGrondwater", "state", "")
+        state = json.loads(state_json) if ok and state_json else {}
+        extent = state.get("extent")
+        self._retrieval_extent = tuple(extent) if extent else None
+        self._pending_filter = state.get("filter")
+
+        if self.wells_layer is not None and self.dlg is not None:
+            self.dlg.statusLabel.setText(
+                f"Loaded {self.wells_layer.featureCount()} wells from project"
+            )
+            self._restore_filter_state()
+        self._build_well_index()
+        # Memory layers are saved without features: rebuild the clusters
+        self._build_well_clusters()
+
+        # Read the series index in the background; series are paged in on use
+        store_name = state.get("series_store")
+        project_file = QgsProject.instance().fileName()
+        if store_name and project_file:
+            store_path = os.path.join(os.path.dirname(project_file), store_name)
+            if os.path.exists(store_path):
+                store = self._series_store = SeriesStore(store_path)
+                self._restore_task = QgsTask.fromFunction(
+                    "Restoring BRO measurement series",
+                    self._read_series_index,
+                    store,
+                    on_finished=lambda exception, result=None: self._on_series_index_read(
+                        store, exception, result
+                    ),
+                )
+                QgsApplication.taskManager().addTask(self._restore_task)
+
+    def _restore_filter_state(self):
+        """Apply the depth filter restored from the project, if any."""
+        if self._pending_filter:
+            filter_min = self._pending_filter.get("min")
+            filter_max = self._pending_filter.get("max")
+            self._pending_filter = None
+            self._update_filter_histogram(filter_min, filter_max)
+            self.dlg.spinMinDepth.setValue(filter_min)
+            self.dlg.spinMaxDepth.setValue(filter_max)
+        else:
+            self._update_filter_histogram()
+
+    def _read_series_index(self, task, store):
+        """Read the stored series index (runs in a QgsTask)."""
+        return store.read_index()
+
+    def _on_series_index_read(self, store, exception, result=None):
+        """Register the restored series without loading their measurements."""
+        if store is not self._series_store:
+            # Another project was read, or the project was saved elsewhere
+            return
+
+        self._restore_task = None
+        if exception is not None or result is None:
+            QgsMessageLog.logMessage(
+                f"Could not restore measurement series: {exception}",
+                "BRO Grondwater",
+                Qgis.Warning,
+            )
+            return
+
+        self._register_series_index(result)
+
+        if self.dlg is not None:
+            self.dlg.labelDownloadStatus.setText(
+                f"Restored {len(result)} series from project"
+            )
+            self.dlg.labelDownloadStatus.setStyleSheet(
+                "color: #006600; font-style: normal;"
+            )
+
+    def _register_series_index(self, entries):
+        """Add stored series to the measurement cache; they are loaded on use."""
+        for entry in entries:
+            cache_key = entry["cache_key"]
+            if cache_key in self._downloaded_measurements:
+                continue
+            self._downloaded_measurements[cache_key] = {
+                "data": None,
+                "name": entry["name"],
+                "bro_id": entry["bro_id"],
+                "tube_nr": entry["tube_nr"],
             }
+            self._stored_keys.add(cache_key)
+        self._update_cluster_availability()
 
-        max_retries = 3
-        for attempt in range(max_retries):
+    def _on_project_write(self, *args):
+        """Save plugin state in the project and series next to the project file."""
+        import json
+
+        project = QgsProject.instance()
+        state = {"extent": self._retrieval_extent}
+
+        if self.dlg is not None and self.wells_layer is not None:
+            state["filter"] = {
+                "min": self.dlg.spinMinDepth.value(),
+                "max": self.dlg.spinMaxDepth.value(),
+            }
+
+        project_file = project.fileName()
+        # While the series index is still being restored the cache is
+        # incomplete, but the store must stay referenced by the project
+        restoring = self._restore_task is not None
+        if project_file and (self._downloaded_measurements or restoring):
             try:
-                obs = hpd.GroundwaterObs.from_bro(gmw_id, tube_nr or 1)
-
-                if obs is not None and len(obs) > 0:
-                    # Serialize the observation data, filtering out NaN values
-                    raw_values = obs.iloc[:, 0].tolist()
-                    valid_pairs = [
-                        (d.isoformat(), v)
-                        for d, v in zip(obs.index.tolist(), raw_values)
-                        if not (isinstance(v, float) and math.isnan(v))
-                    ]
-                    dates = [p[0] for p in valid_pairs]
-                    values = [p[1] for p in valid_pairs]
-
-                    # Extract metadata from obs object
-                    metadata = {
-                        "tube_nr": getattr(obs, "tube_nr", tube_nr),
-                        "x": getattr(obs, "x", None),
-                        "y": getattr(obs, "y", None),
-                        "ground_level": getattr(obs, "ground_level", None),
-                        "screen_top": getattr(obs, "screen_top", None),
-                        "screen_bottom": getattr(obs, "screen_bottom", None),
-                        "tube_top": getattr(obs, "tube_top", None),
-                        "source": getattr(obs, "source", "BRO"),
-                        "unit": getattr(obs, "unit", "m NAP"),
-                    }
+                store_path = sidecar_path(project_file)
+                if self._series_store is None or self._series_store.path != store_path:
+                    if restoring:
+                        # The old store is about to be replaced: take its index now
+                        self._register_series_index(self._series_store.read_index())
+                        self._restore_task = None
+                    # Saving to a new location: page in everything from the old store
+                    for cache_key in list(self._downloaded_measurements):
+                        self._series_data(cache_key)
+                    self._series_store = SeriesStore(store_path)
+                    self._stored_keys = set()
+
+                unsaved = {
+                    cache_key: measurement
+                    for cache_key, measurement in self._downloaded_measurements.items()
+                    if cache_key not in self._stored_keys
+                }
+                self._series_store.write(unsaved)
+                self._stored_keys.update(unsaved)
+                state["series_store"] = os.path.basename(store_path)
+            except Exception as e:
+                QgsMessageLog.logMessage(
+                    f"Could not save measurement series: {e}",
+                    "BRO Grondwater",
+                    Qgis.Warning,
+                )
 
-                    return {
-                        "success": True,
-                        "cache_key": cache_key,
-                        "data": {
-                            "dates": dates,
-                            "values": values,
-                            "metadata": metadata,
-                        },
-                        "name": name,
-                        "bro_id": bro_id,
-                        "tube_nr": tube_nr,
-                    }
-                else:
-                    return {
-                        "success": False,
-                        "cache_key": cache_key,
-                        "error": "No data returned",
-                        "name": name,
-                        "bro_id": bro_id,
-                        "tube_nr": tube_nr,
+        project.writeEntry("BROGrondwater", "state", json.dumps(state))
+
+    def _series_data(self, cache_key):
+        """Return the series data for a cache key, loading it from the store if needed."""
+        measurement = self._downloaded_measurements.get(cache_key)
+        if measurement is None:
+            return None
+
+        if measurement.get("data") is None and self._series_store is not None:
+            measurement["data"] = self._series_store.load(cache_key)
+        return measurement.get("data")
+
+    def _build_well_index(self):
+        """Build the spatial index over the (filtered) wells layer."""
+        self._well_index = None
+        if self.wells_layer is None:
+            return
+
+        xs, ys, fids = [], [], []
+        request = QgsFeatureRequest().setNoAttributes()
+        for feature in self.wells_layer.getFeatures(request):
+            geometry = feature.geometry()
+            if geometry is None or geometry.isEmpty():
+                continue
+            point = geometry.asPoint()
+            xs.append(point.x())
+            ys.append(point.y())
+            fids.append(feature.id())
+        self._well_index = WellIndex(xs, ys, fids)
+
+    def _clustering_enabled(self):
+        return QSettings().value("BROGrondwater/cluster_wells", True, type=bool)
+
+    def _build_well_clusters(self):
+        """Aggregate the (filtered) wells into the cluster layer shown at small scales."""
+        from .clustering import GridPyramid, create_cluster_layer
+
+        self._remove_cluster_layers()
+        if self.wells_layer is None or not self._clustering_enabled():
+            return
+
+        xs, ys, screen_tops, well_ids, cache_keys = [], [], [], [], []
+        for feature in self.wells_layer.getFeatures():
+            geometry = feature.geometry()
+            if geometry is None or geometry.isEmpty():
+                continue
+            point = geometry.asPoint()
+            screen_top = feature["screen_top"]
+            xs.append(point.x())
+            ys.append(point.y())
+            screen_tops.append(
+                float(screen_top) if isinstance(screen_top, (int, float)) else float("nan")
+            )
+            # Tubes without a GMW id are counted as a well of their own
+            well_ids.append(
+                self._find_gmw_id(feature["bro_id"], feature["name"]) or f"#{feature.id()}"
+            )
+            cache_keys.append(
+                self._feature_cache_key(
+                    {
+                        "bro_id": feature["bro_id"],
+                        "name": feature["name"],
+                        "tube_nr": feature["tube_nr"],
                     }
-            except Exception as e:
-                error_str = str(e)
-                if (
-                    "429" in error_str or "Too Many Requests" in error_str
-                ) and attempt < max_retries - 1:
-                    time.sleep(2**attempt)  # exponential backoff: 1s, 2s
+                )
+            )
+        if not xs:
+            return
+
+        self._cluster_pyramid = GridPyramid(xs, ys, screen_tops, well_ids)
+        self._cluster_keys = cache_keys
+        self._cluster_pyramid.set_with_data(
+            [cache_key in self._downloaded_measurements for cache_key in cache_keys]
+        )
+        layer = create_cluster_layer(self._cluster_pyramid)
+        layer.setCustomProperty(self.CLUSTER_LAYER_PROPERTY, True)
+        QgsProject.instance().addMapLayer(layer)
+        self._cluster_layer = layer
+
+    def _remove_cluster_layers(self):
+        """Remove the cluster layer, including ones restored with a project."""
+        self._cluster_layer = None
+        self._cluster_pyramid = None
+        self._cluster_keys = []
+        project = QgsProject.instance()
+        layer_ids = [
+            layer_id
+            for layer_id, layer in project.mapLayers().items()
+            if layer.customProperty(self.CLUSTER_LAYER_PROPERTY, False)
+        ]
+        if layer_ids:
+            project.removeMapLayers(layer_ids)
+
+    def _update_cluster_availability(self):
+        """Count the downloaded series per cluster after a download or restore."""
+        from .clustering import update_with_data
+
+        if self._cluster_pyramid is None or self._cluster_layer is None:
+            return
+        try:
+            self._cluster_pyramid.set_with_data(
+                [cache_key in self._downloaded_measurements for cache_key in self._cluster_keys]
+            )
+            update_with_data(self._cluster_layer, self._cluster_pyramid)
+        except RuntimeError:
+            # The layer was removed by the user
+            self._cluster_layer = None
+            self._cluster_pyramid = None
+
+    def _set_cluster_wells(self, enabled):
+        """Turn clustering of the wells at small scales on or off."""
+        QSettings().setValue("BROGrondwater/cluster_wells", enabled)
+        self._build_well_clusters()
+        if self.wells_layer is not None:
+            self._set_wells_scale_visibility(self.wells_layer)
+            self.wells_layer.triggerRepaint()
+
+    def _set_wells_scale_visibility(self, layer):
+        """Hide the individual wells at the scales where the clusters are shown."""
+        from .clustering import DETAIL_SCALE
+
+        enabled = self._clustering_enabled()
+        layer.setScaleBasedVisibility(enabled)
+        if enabled:
+            layer.setMinimumScale(DETAIL_SCALE)
+            layer.setMaximumScale(0)
+
+    def pick_wells_around_point(self):
+        """Activate a map tool that selects and plots wells around a clicked point."""
+        if self.wells_layer is None or self._well_index is None:
+            QMessageBox.warning(self.dlg, "No Layer", "Please retrieve wells first.")
+            return
+
+        canvas = self.iface.mapCanvas()
+        if self._pick_tool is None:
+            self._pick_tool = QgsMapToolEmitPoint(canvas)
+            self._pick_tool.canvasClicked.connect(self._on_pick_point)
+        canvas.setMapTool(self._pick_tool)
+        self.dlg.statusLabel.setText("Click on the map to plot nearby wells")
+
+    def _on_pick_point(self, point, button):
+        """Select the wells around a clicked point and plot their measurements."""
+        canvas = self.iface.mapCanvas()
+        canvas.unsetMapTool(self._pick_tool)
+
+        # The index is in RD coordinates (EPSG:28992)
+        crs = canvas.mapSettings().destinationCrs()
+        if crs.authid() != "EPSG:28992":
+            transform = QgsCoordinateTransform(
+                crs,
+                QgsCoordinateReferenceSystem("EPSG:28992"),
+                QgsProject.instance(),
+            )
+            point = transform.transform(point)
+
+        radius = self.dlg.spinPickRadius.value()
+        indices = self._well_index.within(point.x(), point.y(), radius)
+        if len(indices) == 0:
+            indices = self._well_index.nearest(point.x(), point.y(), 1)
+        fids = [self._well_index.keys[i] for i in indices]
+        if not fids:
+            self.dlg.statusLabel.setText("No wells found")
+            return
+
+        self.wells_layer.selectByIds(fids)
+
+        features = list(
+            self.wells_layer.getFeatures(QgsFeatureRequest().setFilterFids(fids))
+        )
+        cache_keys = [
+            self._feature_cache_key(
+                {"bro_id": f["bro_id"], "name": f["name"], "tube_nr": f["tube_nr"]}
+            )
+            for f in features
+        ]
+        features_to_download = self._plan_downloads(features)
+
+        if features_to_download:
+            # Plot once the missing wells have been downloaded
+            self._plot_after_download = cache_keys
+            self._start_download(features_to_download)
+        else:
+            self._plot_wells(cache_keys)
+
+    def apply_filter(self):
+        """Apply depth filter to the wells layer."""
+        if self.wells_layer is None:
+            QMessageBox.warning(self.dlg, "No Layer", "Please retrieve wells first.")
+            return
+
+        try:
+            min_depth = self.dlg.spinMinDepth.value()
+            max_depth = self.dlg.spinMaxDepth.value()
+            self.wells_layer.setSubsetString(self._depth_filter_expression())
+
+            # Refresh the layer and canvas
+            self.wells_layer.triggerRepaint()
+            self.iface.mapCanvas().refresh()
+
+            filtered_count = self.wells_layer.featureCount()
+            self.dlg.statusLabel.setText(
+                f"Filter applied: {filtered_count} wells visible"
+            )
+
+            # Zoom to filtered features if any
+            if filtered_count > 0:
+                self.wells_layer.updateExtents()
+                self.iface.mapCanvas().setExtent(self.wells_layer.extent())
+                self.iface.mapCanvas().refresh()
+
+            # Update histogram to show filter range
+            self._update_filter_histogram(min_depth, max_depth)
+            self._build_well_index()
+            self._build_well_clusters()
+
+        except Exception as e:
+            QMessageBox.critical(
+                self.dlg, "Filter Error", f"Error applying filter:\n{str(e)}"
+            )
+
+    def _depth_filter_expression(self):
+        """Return the screen_top filter expression of the depth filter spin boxes."""
+        min_depth = self.dlg.spinMinDepth.value()
+        max_depth = self.dlg.spinMaxDepth.value()
+        if max_depth > min_depth:
+            return f'"screen_top" >= {min_depth} AND "screen_top" <= {max_depth}'
+        return f'"screen_top" >= {min_depth}'
+
+    def download_measurements(self):
+        """Download measurements for selected wells (or all if none selected).
+
+        Uses multiprocessing to run downloads in separate Python processes,
+        avoiding pyproj/PROJ conflicts with QGIS.
+        """
+        if self.wells_layer is None:
+            QMessageBox.warning(self.dlg, "No Layer", "Please retrieve wells first.")
+            return
+
+        selected_features = self.wells_layer.selectedFeatures()
+
+        # If no selection, use all visible features
+        if len(selected_features) == 0:
+            selected_features = list(self.wells_layer.getFeatures())
+            if len(selected_features) == 0:
+                QMessageBox.warning(
+                    self.dlg, "No Wells", "No wells available to download."
+                )
+                return
+
+        # Filter out wells already downloaded for the requested period
+        features_to_download = self._plan_downloads(selected_features)
+
+        if len(features_to_download) == 0:
+            self.dlg.statusLabel.setText(
+                f"All {len(selected_features)} wells already downloaded"
+            )
+            return
+
+        # Warn user if downloading many wells
+        if len(features_to_download) > 20:
+            reply = QMessageBox.warning(
+                self.dlg,
+                "Large Download",
+                f"You are about to download measurements for {len(features_to_download)} wells.\n\n"
+                "This may take a long time. Consider selecting fewer wells or "
+                "applying a filter first.\n\n"
+                f"Do you want to download the timeseries for all {len(features_to_download)} wells anyway?",
+                QMessageBox.Yes | QMessageBox.No,
+                QMessageBox.No,
+            )
+            if reply != QMessageBox.Yes:
+                self.dlg.statusLabel.setText("Download cancelled")
+                return
+
+        self._start_download(features_to_download)
+
+    def _download_window(self):
+        """Return the (tmin, tmax) period selected in the panel."""
+        if not self.dlg.chkLimitPeriod.isChecked():
+            return FULL_HISTORY
+        return (
+            self.dlg.dateFrom.date().toString("yyyy-MM-dd"),
+            self.dlg.dateTo.date().toString("yyyy-MM-dd"),
+        )
+
+    def _plan_downloads(self, features):
+        """Return feature data for the spans of the requested period not cached yet.
+
+        Wells cached for a wider period are skipped; wells cached for part of
+        the period get one entry per missing span (before and/or after).
+        """
+        window = self._download_window()
+        features_to_download = []
+        field_names = set(self.wells_layer.fields().names()) if self.wells_layer else set()
+        for feature in features:
+            feature_data = {
+                "bro_id": feature["bro_id"],
+                "name": feature["name"],
+                "tube_nr": feature["tube_nr"],
+            }
+            # Well attributes, used as metadata by the streaming GLD parser
+            for key in ("x", "y", "ground_level", "screen_top", "screen_bottom", "tube_top"):
+                value = feature[key] if key in field_names else None
+                # NULL attributes are not numbers
+                if isinstance(value, (int, float)):
+                    feature_data[key] = float(value)
+            cache_key = self._feature_cache_key(feature_data)
+            coverage = None
+            if cache_key in self._downloaded_measurements:
+                coverage = series_coverage(self._series_data(cache_key))
+            flight_key = self._flight_key(feature_data)
+            for tmin, tmax in missing_spans(coverage, window):
+                # Already being downloaded, e.g. by a batch that is still running
+                if flight_key is not None and self._flights.in_flight(flight_key, (tmin, tmax)):
                     continue
-                return {
-                    "success": False,
-                    "cache_key": cache_key,
-                    "error": error_str,
-                    "name": name,
-                    "bro_id": bro_id,
+                features_to_download.append(dict(feature_data, tmin=tmin, tmax=tmax))
+        return features_to_download
+
+    def _flight_key(self, feature_data):
+        """Return the single-flight key (GMW id, tube) of a feature, or None."""
+        gmw_id = self._find_gmw_id(feature_data["bro_id"], feature_data["name"])
+        if not gmw_id:
+            return None
+        return gmw_id, int(feature_data["tube_nr"] or 1)
+
+    def retry_failed_downloads(self):
+        """Download the wells that failed with a retryable error again."""
+        features_to_download = self._retryable_failed_wells()
+        if not features_to_download:
+            self.dlg.statusLabel.setText("No failed wells to retry")
+            return
+        self._start_download(features_to_download)
+
+    def _retryable_failed_wells(self):
+        """Return feature data of failed wells that can be requested again."""
+        return [
+            failure["feature"]
+            for cache_key, failure in self._failed_wells.items()
+            if failure["error_kind"] in RETRYABLE
+            and cache_key not in self._downloaded_measurements
+        ]
+
+    def _offer_resume_download(self):
+        """Ask to resume a download session that did not finish."""
+        try:
+            journal = DownloadJournal.find_unfinished(self._session_dir)
+            if journal is None:
+                return
+            planned, completed = journal.read()
+        except Exception as e:
+            QgsMessageLog.logMessage(
+                f"Could not read download session: {e}", "BRO Grondwater", Qgis.Warning
+            )
+            return
+
+        remaining = [
+            feature_data
+            for feature_data in planned
+            if self._journal_span(feature_data) not in completed
+        ]
+        reply = QMessageBox.question(
+            self.dlg,
+            "Resume Download",
+            f"A download of {len(planned)} wells was interrupted "
+            f"({len(completed)} completed).\n\n"
+            f"Do you want to restore the completed wells and download the "
+            f"remaining {len(remaining)}?",
+            QMessageBox.Yes | QMessageBox.No,
+            QMessageBox.Yes,
+        )
+        if reply != QMessageBox.Yes:
+            journal.discard()
+            return
+
+        restored = journal.load_completed()
+        self._downloaded_measurements.update(restored)
+        self.dlg.labelDownloadStatus.setText(
+            f"Restored {len(restored)} wells from interrupted download"
+        )
+        self.dlg.labelDownloadStatus.setStyleSheet(
+            "color: #006600; font-style: normal;"
+        )
+
+        if remaining:
+            self._start_download(remaining, journal=journal)
+        else:
+            journal.discard()
+
+    def _feature_cache_key(self, feature_data):
+        """Return the measurement cache key for a feature data dict."""
+        return f"{feature_data['bro_id']}_{feature_data['tube_nr']}_{feature_data['name']}"
+
+    def _journal_span(self, feature_data):
+        """Return the (cache_key, tmin, tmax) span a feature data dict plans."""
+        return (
+            self._feature_cache_key(feature_data),
+            feature_data.get("tmin"),
+            feature_data.get("tmax"),
+        )
+
+    def _start_download(self, features_to_download, journal=None):
+        """Start background downloads for a list of feature data dicts.
+
+        The session is journaled to disk so it can be resumed after a crash;
+        pass ``journal`` to continue an existing session. While a download is
+        running, the wells are added to it.
+        """
+        if self._executor is not None:
+            self._expected_results += len(features_to_download)
+            if self._journal is not None:
+                self._journal.add_planned(features_to_download)
+            self._submit_downloads(features_to_download)
+            self.dlg.statusLabel.setText(
+                f"Added {len(features_to_download)} wells to the running download"
+            )
+            return
+
+        self._start_operation()
+        self.dlg.statusLabel.setText(
+            f"Starting download of {len(features_to_download)} wells..."
+        )
+
+        # Setup for threaded downloads
+        self._expected_results = len(features_to_download)
+        self._downloaded_count = 0
+        self._failed_count = 0
+        self._futures = []
+        self._failed_kinds = {}
+        self._circuit_breaker = CircuitBreaker()
+        self._fast_parser = self.dlg.chkFastParser.isChecked()
+
+        # Start ThreadPoolExecutor
+        try:
+            # Cache shared with other QGIS sessions, e.g. on a terminal server
+            shared_dir = QSettings().value("BROGrondwater/shared_cache_dir", "")
+            self._shared_cache = SharedSeriesCache(shared_dir) if shared_dir else None
+
+            if journal is None:
+                journal = DownloadJournal.start(self._session_dir, features_to_download)
+            self._journal = journal
+
+            self._executor = ThreadPoolExecutor(max_workers=3)
+            self._submit_downloads(features_to_download)
+
+            # Start timer to poll for results
+            self._poll_timer = QTimer()
+            self._poll_timer.timeout.connect(self.profiler.span(self._poll_download_results))
+            self._poll_timer.start(200)  # Poll every 200ms
+
+            # A profiled download ends in _finish_download/_cancel_download
+            self.profiler.keep_running()
+
+        except Exception as e:
+            QMessageBox.critical(
+                self.dlg, "Download Error", f"Error starting download:\n{str(e)}"
+            )
+            self._end_operation()
+
+    def _submit_downloads(self, features_to_download):
+        """Submit one download per GMW and period, covering all of its tubes.
+
+        The tubes are registered as in flight when submitted, so they are not
+        requested again while the download is queued or running.
+        """
+        groups = self._group_by_gmw(features_to_download)
+        download_gmw = self.profiler.wrap(self._download_gmw)
+        for (gmw_id, tmin, tmax), feature_list in groups.items():
+            flights = None
+            if gmw_id:
+                tube_nrs = {int(f["tube_nr"] or 1) for f in feature_list}
+                flights = self._flights.begin(
+                    [(gmw_id, tube_nr) for tube_nr in tube_nrs], (tmin, tmax)
+                )
+            future = self._executor.submit(
+                download_gmw, gmw_id, feature_list, tmin, tmax, flights
+            )
+            if flights is not None:
+                # Release the tubes if the download never runs or fails
+                future.add_done_callback(
+                    lambda _, owned=flights[0]: self._flights.abandon(owned)
+                )
+            self._futures.append(future)
+            self._future_sizes[future] = len(feature_list)
+
+    def _set_profiling(self, enabled):
+        """Turn profiling of top-level operations on or off."""
+        self.profiler.enabled = enabled
+        QSettings().setValue("BROGrondwater/profiling", enabled)
+        if enabled:
+            self.dlg.statusLabel.setText(
+                f"Profiling on, reports in {self.profiler.output_dir}"
+            )
+
+    def _on_profile_report(self, name, paths):
+        """Log where the reports of a profiled operation were written."""
+        prof_path, memory_path = paths
+        QgsMessageLog.logMessage(
+            f"Profile of {name}: {prof_path} (memory report: {memory_path})",
+            "BRO Grondwater",
+            Qgis.Info,
+        )
+
+    def _find_gmw_id(self, *candidates):
+        """Return the GMW id (format: GMW000000041261) found in the candidates."""
+        for candidate in candidates:
+            if candidate and "GMW" in str(candidate):
+                match = re.search(r"GMW\d+", str(candidate))
+                if match:
+                    return match.group(0)
+        return None
+
+    def _group_by_gmw(self, features_to_download):
+        """Group features by GMW id and period so every well is requested only once.
+
+        Returns a dict {(gmw_id, tmin, tmax): [feature_data, ...]}; features
+        without a GMW id are grouped under a None id.
+        """
+        groups = {}
+        for feature_data in features_to_download:
+            gmw_id = self._find_gmw_id(feature_data["bro_id"], feature_data["name"])
+            key = (gmw_id, feature_data.get("tmin"), feature_data.get("tmax"))
+            groups.setdefault(key, []).append(feature_data)
+        return groups
+
+    def _download_result(self, feature_data, obs=None, error=None, error_kind=None):
+        """Build the result dict for one tube from an observation or an error.
+
+        A tube without measurements in the period gives an empty series that
+        covers the period.
+        """
+        import math
+
+        import numpy as np
+
+        bro_id = feature_data["bro_id"]
+        name = feature_data["name"]
+        tube_nr = feature_data["tube_nr"]
+        result = {
+            "success": False,
+            "cache_key": self._feature_cache_key(feature_data),
+            "name": name,
+            "bro_id": bro_id,
+            "tube_nr": tube_nr,
+        }
+
+        result["feature"] = feature_data
+        if error is not None:
+            result["error"] = error
+            result["error_kind"] = error_kind or classify_error(error)
+            return result
+        if obs is None or len(obs) == 0:
+            # No measurements in the period (or no GLD for the tube) is a
+            # result: the span is covered and need not be requested again
+            obs = GLDSeries.empty()
+
+        if isinstance(obs, GLDSeries):
+            # Streaming parser: dates in winter time like hydropandas, well metadata from the layer
+            valid = np.isfinite(obs.values)
+            result["success"] = True
+            result["data"] = {
+                "dates": obs.iso_dates()[valid].tolist(),
+                "values": obs.values[valid].tolist(),
+                "metadata": {
+                    "coverage": [feature_data.get("tmin"), feature_data.get("tmax")],
                     "tube_nr": tube_nr,
-                }
+                    "x": feature_data.get("x"),
+                    "y": feature_data.get("y"),
+                    "ground_level": feature_data.get("ground_level"),
+                    "screen_top": feature_data.get("screen_top"),
+                    "screen_bottom": feature_data.get("screen_bottom"),
+                    "tube_top": feature_data.get("tube_top"),
+                    "source": "BRO",
+                    "unit": "m NAP",
+                },
+            }
+            return result
+
+        # Serialize the observation data, filtering out NaN values
+        raw_values = obs.iloc[:, 0].tolist()
+        valid_pairs = [
+            (d.isoformat(), v)
+            for d, v in zip(obs.index.tolist(), raw_values)
+            if not (isinstance(v, float) and math.isnan(v))
+        ]
+
+        # Extract metadata from obs object; coverage is the requested period
+        metadata = {
+            "coverage": [feature_data.get("tmin"), feature_data.get("tmax")],
+            "tube_nr": getattr(obs, "tube_nr", tube_nr),
+            "x": getattr(obs, "x", None),
+            "y": getattr(obs, "y", None),
+            "ground_level": getattr(obs, "ground_level", None),
+            "screen_top": getattr(obs, "screen_top", None),
+            "screen_bottom": getattr(obs, "screen_bottom", None),
+            "tube_top": getattr(obs, "tube_top", None),
+            "source": getattr(obs, "source", "BRO"),
+            "unit": getattr(obs, "unit", "m NAP"),
+        }
+
+        result["success"] = True
+        result["data"] = {
+            "dates": [p[0] for p in valid_pairs],
+            "values": [p[1] for p in valid_pairs],
+            "metadata": metadata,
+        }
+        return result
+
+    def _fetch_gmw_tubes(self, gmw_id, tube_nrs, tmin=None, tmax=None):
+        """Fetch observations for the given tubes of one GMW within a period.
+
+        The streaming parser requests the GLD listing once for the whole GMW
+        and returns GLDSeries; otherwise every tube is read with
+        GroundwaterObs.from_bro. Returns a dict {tube_nr: obs}.
+        """
+        if self._fast_parser:
+            base_url = QSettings().value("BROGrondwater/bro_api_url", DEFAULT_BASE_URL)
+            return fetch_gmw_series(gmw_id, tube_nrs, tmin, tmax, base_url=base_url)
+
+        import hydropandas as hpd
+
+        # hydropandas caches the GMW document, so the tubes share one request
+        return {
+            tube_nr: hpd.GroundwaterObs.from_bro(gmw_id, tube_nr, tmin=tmin, tmax=tmax)
+            for tube_nr in tube_nrs
+        }
+
+    def _download_gmw(self, gmw_id, feature_list, tmin=None, tmax=None, flights=None):
+        """Download measurements for all requested tubes of one GMW (runs in thread).
+
+        Tubes already in flight for the period are not requested again: the
+        result of that request is waited for and shared. ``flights`` are the
+        (owned, joined) flights registered at submit time; without them the
+        tubes are registered here. Returns a list with one result dict per
+        feature.
+        """
+        if not gmw_id:
+            return [
+                self._download_result(
+                    feature_data, error="No GMW ID found", error_kind=NO_GMW_ID
+                )
+                for feature_data in feature_list
+            ]
+
+        if flights is None:
+            tube_nrs = {int(f["tube_nr"] or 1) for f in feature_list}
+            flights = self._flights.begin(
+                [(gmw_id, tube_nr) for tube_nr in tube_nrs], (tmin, tmax)
+            )
+        owned, joined = flights
+
+        results = []
+        own_features = [
+            f for f in feature_list if (gmw_id, int(f["tube_nr"] or 1)) in owned
+        ]
+        try:
+            if own_features:
+                results = self._download_owned(gmw_id, own_features, tmin, tmax)
+            for result in results:
+                key = (gmw_id, int(result["tube_nr"] or 1))
+                self._flights.finish(key, owned[key], result)
+        finally:
+            # Waiters must not hang on a download that raised
+            self._flights.abandon(
+                owned, {"success": False, "error": "Download failed", "error_kind": TRANSIENT}
+            )
+
+        for feature_data in feature_list:
+            flight = joined.get((gmw_id, int(feature_data["tube_nr"] or 1)))
+            if flight is None:
+                continue
+            shared = flight.wait(lambda: self._cancelled)
+            if shared is None:
+                shared = {"success": False, "error": "Cancelled", "error_kind": TRANSIENT}
+            results.append(self._shared_result(feature_data, shared))
+        return results
+
+    def _shared_result(self, feature_data, shared):
+        """Build the result of a feature from the result of a joined request."""
+        if not shared.get("success"):
+            return self._download_result(
+                feature_data, error=shared.get("error"), error_kind=shared.get("error_kind")
+            )
+        return {
+            "success": True,
+            "cache_key": self._feature_cache_key(feature_data),
+            "name": feature_data["name"],
+            "bro_id": feature_data["bro_id"],
+            "tube_nr": feature_data["tube_nr"],
+            "feature": feature_data,
+            "data": shared["data"],
+        }
+
+    def _download_owned(self, gmw_id, feature_list, tmin=None, tmax=None):
+        """Download the tubes of one GMW that this request owns.
+
+        With a shared cache, tubes cached for the period by any session are
+        read from it. Otherwise the GMW is claimed, so other sessions wait for
+        this download and read its result instead of downloading it as well.
+        """
+        tube_nrs = {int(f["tube_nr"] or 1) for f in feature_list}
+        shared = self._shared_cache
+        if shared is None:
+            return self._fetch_with_retries(gmw_id, feature_list, tube_nrs, tmin, tmax)
+
+        cached = shared.lookup(gmw_id, tube_nrs, (tmin, tmax))
+        if len(cached) == len(tube_nrs):
+            return self._shared_cache_results(feature_list, cached)
+
+        with shared.claim(gmw_id, lambda: self._cancelled) as waited:
+            if waited is None:
+                return [
+                    self._download_result(
+                        feature_data, error="Cancelled", error_kind=TRANSIENT
+                    )
+                    for feature_data in feature_list
+                ]
+            if waited:
+                # Another session downloaded this GMW in the meantime
+                cached = shared.lookup(gmw_id, tube_nrs, (tmin, tmax))
+                if len(cached) == len(tube_nrs):
+                    return self._shared_cache_results(feature_list, cached)
+
+            results = self._fetch_with_retries(gmw_id, feature_list, tube_nrs, tmin, tmax)
+            for result in results:
+                if not result["success"]:
+                    continue
+                try:
+                    shared.write(gmw_id, int(result["tube_nr"] or 1), result["data"])
+                except OSError as e:
+                    QgsMessageLog.logMessage(
+                        f"Could not write {gmw_id} to the shared cache: {e}",
+                        "BRO Grondwater",
+                        Qgis.Warning,
+                    )
+            return results
+
+    def _shared_cache_results(self, feature_list, cached):
+        """Build download results from shared cache entries."""
+        return [
+            {
+                "success": True,
+                "cache_key": self._feature_cache_key(feature_data),
+                "name": feature_data["name"],
+                "bro_id": feature_data["bro_id"],
+                "tube_nr": feature_data["tube_nr"],
+                "feature": feature_data,
+                "data": cached[int(feature_data["tube_nr"] or 1)],
+            }
+            for feature_data in feature_list
+        ]
+
+    def _fetch_with_retries(self, gmw_id, feature_list, tube_nrs, tmin=None, tmax=None):
+        """Fetch the tubes of one GMW with retries, backoff and the circuit breaker."""
+        observations, error, error_kind = fetch_with_retries(
+            lambda: self._fetch_gmw_tubes(gmw_id, tube_nrs, tmin, tmax),
+            self._circuit_breaker,
+            is_cancelled=lambda: self._cancelled,
+        )
+        if error is not None:
+            return [
+                self._download_result(feature_data, error=error, error_kind=error_kind)
+                for feature_data in feature_list
+            ]
+        return [
+            self._download_result(
+                feature_data, obs=observations.get(int(feature_data["tube_nr"] or 1))
+            )
+            for feature_data in feature_list
+        ]
 
     def _poll_download_results(self):
         """Poll for results from worker threads."""
@@ -773,41 +2239,85 @@ class BROGrondwaterPlugin:
 
         # Check completed futures
         completed_futures = [f for f in self._futures if f.done()]
+        completed_measurements = {}
+        completed_spans = []
 
         for future in completed_futures:
             self._futures.remove(future)
+            well_count = self._future_sizes.pop(future, 1)
 
             try:
-                result = future.result()
-                if result.get("success"):
-                    self._downloaded_measurements[result["cache_key"]] = {
-                        "data": result["data"],
-                        "name": result["name"],
-                        "bro_id": result["bro_id"],
-                        "tube_nr": result["tube_nr"],
-                    }
-                    self._downloaded_count += 1
-                else:
-                    QgsMessageLog.logMessage(
-                        f"Download failed for {result.get('name', 'unknown')}: {result.get('error', 'Unknown')}",
-                        "BRO Grondwater",
-                        Qgis.Warning,
-                    )
-                    self._failed_count += 1
+                for result in future.result():
+                    if result.get("success"):
+                        data = result["data"]
+                        if result["cache_key"] in self._downloaded_measurements:
+                            # A span of a series that is already cached
+                            stored = self._series_data(result["cache_key"])
+                            if stored:
+                                data = merge_series(stored, data)
+                            self._stored_keys.discard(result["cache_key"])
+                        self._downloaded_measurements[result["cache_key"]] = {
+                            "data": data,
+                            "name": result["name"],
+                            "bro_id": result["bro_id"],
+                            "tube_nr": result["tube_nr"],
+                        }
+                        completed_measurements[result["cache_key"]] = (
+                            self._downloaded_measurements[result["cache_key"]]
+                        )
+                        completed_spans.append(self._journal_span(result["feature"]))
+                        self._failed_wells.pop(result["cache_key"], None)
+                        self._downloaded_count += 1
+                    else:
+                        QgsMessageLog.logMessage(
+                            f"Download failed for {result.get('name', 'unknown')} "
+                            f"({result.get('error_kind', 'unknown')}): {result.get('error', 'Unknown')}",
+                            "BRO Grondwater",
+                            Qgis.Warning,
+                        )
+                        self._failed_wells[result["cache_key"]] = {
+                            "feature": result["feature"],
+                            "error": result.get("error"),
+                            "error_kind": result.get("error_kind"),
+                        }
+                        kind = result.get("error_kind")
+                        self._failed_kinds[kind] = self._failed_kinds.get(kind, 0) + 1
+                        self._failed_count += 1
             except Exception as e:
                 QgsMessageLog.logMessage(
                     f"Error processing result: {e}", "BRO Grondwater", Qgis.Warning
                 )
-                self._failed_count += 1
+                self._failed_count += well_count
+
+        if completed_measurements:
+            self._on_series_changed(list(completed_measurements))
+
+        # Journal the wells completed in this poll in one write
+        if self._journal is not None and completed_measurements:
+            try:
+                self._journal.record_completed(completed_measurements, completed_spans)
+            except Exception as e:
+                QgsMessageLog.logMessage(
+                    f"Could not journal download progress: {e}",
+                    "BRO Grondwater",
+                    Qgis.Warning,
+                )
 
         # Update progress
         completed = self._downloaded_count + self._failed_count
         if self._expected_results > 0:
             progress = int((completed / self._expected_results) * 100)
             self.dlg.progressBar.setValue(progress)
-            self.dlg.statusLabel.setText(
-                f"Downloading: {completed}/{self._expected_results} completed"
-            )
+            pause = self._circuit_breaker.seconds_until_retry()
+            if self._circuit_breaker.is_open:
+                self.dlg.statusLabel.setText(
+                    f"BRO unavailable, downloads paused ({pause:.0f}s): "
+                    f"{completed}/{self._expected_results} completed"
+                )
+            else:
+                self.dlg.statusLabel.setText(
+                    f"Downloading: {completed}/{self._expected_results} completed"
+                )
 
         # Check if all done
         if completed >= self._expected_results and len(self._futures) == 0:
@@ -827,11 +2337,18 @@ class BROGrondwaterPlugin:
         failed_count = self._failed_count
 
         self._futures = []
+        self._future_sizes = {}
+        self._discard_journal()
+        self.profiler.finish()
+        self._update_cluster_availability()
 
         self.dlg.progressBar.setValue(100)
         status_msg = f"Downloaded {downloaded_count} wells"
         if failed_count > 0:
-            status_msg += f" ({failed_count} failed)"
+            kinds = ", ".join(
+                f"{count} {kind}" for kind, count in self._failed_kinds.items()
+            )
+            status_msg += f" ({failed_count} failed: {kinds})"
         self.dlg.labelDownloadStatus.setText(status_msg)
         self.dlg.labelDownloadStatus.setStyleSheet(
             "color: #006600; font-style: normal;"
@@ -840,6 +2357,16 @@ class BROGrondwaterPlugin:
 
         self._end_operation()
 
+        if self._plot_after_download is not None:
+            cache_keys = [
+                cache_key
+                for cache_key in self._plot_after_download
+                if cache_key in self._downloaded_measurements
+            ]
+            self._plot_after_download = None
+            if cache_keys:
+                self._plot_wells(cache_keys)
+
     def _cancel_download(self):
         """Cancel the download process."""
         if self._poll_timer:
@@ -851,10 +2378,20 @@ class BROGrondwaterPlugin:
             self._executor = None
 
         self._futures = []
+        self._future_sizes = {}
+        self._discard_journal()
+        self._plot_after_download = None
+        self.profiler.finish()
 
         self.dlg.statusLabel.setText("Download cancelled")
         self._end_operation()
 
+    def _discard_journal(self):
+        """Remove the journal of a download session that ended normally."""
+        if self._journal is not None:
+            self._journal.discard()
+            self._journal = None
+
     def _update_filter_histogram(self, filter_min=None, filter_max=None):
         """Update the histogram showing screen_top distribution."""
         if self.wells_layer is None:
@@ -955,7 +2492,11 @@ class BROGrondwaterPlugin:
                 self.wells_layer.setSubsetString(saved_filter)
 
     def _get_measurements_for_well(self, bro_id, tube_nr, name=None):
-        """Fetch measurements for a single well on-demand."""
+        """Fetch the full measurement series of a single well on-demand.
+
+        A download of the same GMW tube that is already in flight is joined
+        instead of requested again. Returns the series data, or None.
+        """
         # Fix for tqdm/numpy writing to None stdout in QGIS
         import io
 
@@ -964,30 +2505,25 @@ class BROGrondwaterPlugin:
         if sys.stderr is None:
             sys.stderr = io.StringIO()
 
-        import hydropandas as hpd
-
         # Try to find GMW id from bro_id or name
-        gmw_id = None
-        for candidate in [bro_id, name]:
-            if candidate and "GMW" in str(candidate):
-                # Extract GMW id (format: GMW000000041261)
-                import re
-
-                match = re.search(r"GMW\d+", str(candidate))
-                if match:
-                    gmw_id = match.group(0)
-                    break
+        gmw_id = self._find_gmw_id(bro_id, name)
 
         if not gmw_id:
             print(f"No GMW id found in bro_id={bro_id}, name={name}")
             return None
 
-        try:
-            obs = hpd.GroundwaterObs.from_bro(gmw_id, tube_nr or 1)
-            return obs
-        except Exception as e:
-            print(f"Error fetching measurements for {gmw_id}: {e}")
+        feature_data = {"bro_id": bro_id, "name": name, "tube_nr": tube_nr}
+        cache_key = self._feature_cache_key(feature_data)
+        if cache_key in self._downloaded_measurements:
+            series_data = self._series_data(cache_key)
+            if not missing_spans(series_coverage(series_data), FULL_HISTORY):
+                return series_data
+
+        result = self._download_gmw(gmw_id, [feature_data])[0]
+        if not result["success"]:
+            print(f"Error fetching measurements for {gmw_id}: {result.get('error')}")
             return None
+        return result["data"]
 
     def _get_numeric_values(self, obs):
         """Extract numeric measurement values from GroundwaterObs object.
@@ -1057,186 +2593,483 @@ class BROGrondwaterPlugin:
             self.dlg.statusLabel.setText(f"Plot saved to {os.path.basename(file_path)}")
 
     def plot_measurements(self):
-        """Plot measurements for downloaded wells."""
+        """Show the downloaded wells in the plot window that follows the downloads.
+
+        The window is non-modal and kept between openings; only series that
+        are not plotted yet are converted and drawn.
+        """
         if len(self._downloaded_measurements) == 0:
             QMessageBox.warning(
                 self.dlg, "No Data", "Please download measurements first (step 4)."
             )
             return
+        if not self._pyqtgraph_available():
+            return
+
+        if self._plot_window is None:
+            from .plot_window import PlotWindow
+
+            self._plot_window = PlotWindow(save_plot=self._save_plot, parent=self.dlg)
+
+        window = self._plot_window
+        cache_keys = [
+            cache_key
+            for cache_key in self._downloaded_measurements
+            if cache_key not in window or cache_key in window.stale
+        ]
+        if not self._show_plot(window, cache_keys):
+            return
+        window.raise_()
+        window.activateWindow()
+
+    def _plot_wells(self, cache_keys):
+        """Plot measurements for the given downloaded wells in a separate window."""
+        if len(cache_keys) == 0:
+            QMessageBox.warning(
+                self.dlg, "No Data", "Please download measurements first (step 4)."
+            )
+            return
+        if not self._pyqtgraph_available():
+            return
 
-        self._start_operation()
-        try:
-            try:
-                import pyqtgraph as pg
-            except ImportError:
-                QMessageBox.critical(
-                    self.dlg,
-                    "Missing Dependency",
-                    "pyqtgraph is not yet installed.\n\n"
-                    "Please restart QGIS to trigger automatic installation, "
-                    "or install it manually via OSGeo4W Shell:\n"
-                    "  pip install pyqtgraph",
-                )
-                return
-            from datetime import datetime as dt
-            from qgis.PyQt.QtWidgets import (
-                QDialog,
-                QVBoxLayout,
-                QHBoxLayout,
-                QPushButton,
-                QToolButton,
-                QButtonGroup,
-            )
-            from qgis.PyQt.QtCore import QSize
-
-            # Create plot dialog
-            plot_dialog = QDialog(self.dlg)
-            plot_dialog.setWindowTitle("Grondwaterstand")
-            plot_dialog.resize(800, 500)
-            layout = QVBoxLayout()
-
-            # Time series plot with date axis
-            date_axis = pg.DateAxisItem(orientation="bottom")
-            plot_widget = pg.PlotWidget(axisItems={"bottom": date_axis})
-            plot_widget.setBackground("w")
-            plot_widget.showGrid(x=True, y=True, alpha=0.3)
-            plot_widget.setLabel("left", "Stijghoogte (m NAP)")
-            plot_widget.setLabel("bottom", "Datum")
-            plot_widget.setTitle("Grondwaterstand")
-            plot_widget.addLegend()
-
-            colors = [
-                "#1f77b4",
-                "#ff7f0e",
-                "#2ca02c",
-                "#d62728",
-                "#9467bd",
-                "#8c564b",
-                "#e377c2",
-                "#7f7f7f",
-                "#bcbd22",
-                "#17becf",
-            ]
-
-            self.dlg.statusLabel.setText("Creating plot...")
-            plotted_count = 0
+        from qgis.PyQt.QtCore import Qt
 
-            for i, (cache_key, measurement) in enumerate(
-                self._downloaded_measurements.items()
-            ):
-                series_data = measurement.get("data")
-                name = measurement["name"]
-                bro_id = measurement["bro_id"]
+        from .plot_window import PlotWindow
 
-                if (
-                    series_data
-                    and series_data.get("dates")
-                    and series_data.get("values")
-                ):
-                    gmw_match = re.search(r"GMW\d+", str(name) + str(bro_id))
-                    label = gmw_match.group(0) if gmw_match else (name or bro_id)
-
-                    timestamps = [
-                        dt.fromisoformat(d).timestamp() for d in series_data["dates"]
-                    ]
-                    values = series_data["values"]
-
-                    if timestamps and values:
-                        color = colors[i % len(colors)]
-                        plot_widget.plot(
-                            timestamps,
-                            values,
-                            name=label,
-                            pen=pg.mkPen(color=color, width=1.5),
-                        )
-                        plotted_count += 1
+        window = PlotWindow(save_plot=self._save_plot, parent=self.dlg)
+        window.setAttribute(Qt.WidgetAttribute.WA_DeleteOnClose)
+        self._show_plot(window, cache_keys)
 
-            if self._cancelled:
-                self.dlg.statusLabel.setText("Cancelled")
-                return
+    def _pyqtgraph_available(self):
+        try:
+            import pyqtgraph  # noqa: F401
+        except ImportError:
+            QMessageBox.critical(
+                self.dlg,
+                "Missing Dependency",
+                "pyqtgraph is not yet installed.\n\n"
+                "Please restart QGIS to trigger automatic installation, "
+                "or install it manually via OSGeo4W Shell:\n"
+                "  pip install pyqtgraph",
+            )
+            return False
+        return True
+
+    def _plot_series(self, cache_keys):
+        """Return (cache_key, label, timestamps, values) of the wells with data."""
+        from .plotting import series_arrays
+
+        series = []
+        for cache_key in cache_keys:
+            measurement = self._downloaded_measurements.get(cache_key)
+            if measurement is None:
+                continue
+            arrays = self._plot_arrays.get(cache_key)
+            if arrays is None:
+                series_data = self._series_data(cache_key)
+                if not (series_data and series_data.get("dates") and series_data.get("values")):
+                    continue
+                arrays = self._plot_arrays[cache_key] = series_arrays(series_data)
+            if len(arrays[0]) == 0:
+                continue
+            name = measurement["name"]
+            bro_id = measurement["bro_id"]
+            gmw_match = re.search(r"GMW\d+", str(name) + str(bro_id))
+            label = gmw_match.group(0) if gmw_match else (name or bro_id)
+            series.append((cache_key, label, arrays[0], arrays[1]))
+        return series
+
+    def _show_plot(self, window, cache_keys):
+        """Add the series of the wells to a plot window and show it.
+
+        Does not block the other operations: the plot window can be opened
+        while a download is running and follows it.
+        """
+        try:
+            self.dlg.statusLabel.setText("Creating plot...")
+            window.add_series(self._plot_series(cache_keys))
 
-            if plotted_count == 0:
+            if len(window) == 0:
                 QMessageBox.warning(
                     self.dlg,
                     "No Data",
                     "No numeric measurement data found for the selected wells.",
                 )
                 self.dlg.statusLabel.setText("Ready")
-                return
+                return False
+
+            self.dlg.statusLabel.setText(f"Plot created ({len(window)} wells)")
+            window.show()
+            return True
+
+        except Exception as e:
+            QMessageBox.critical(
+                self.dlg, "Plot Error", f"Error creating plot:\n{str(e)}"
+            )
+            return False
+
+    def _on_series_changed(self, cache_keys):
+        """Update the plot window with downloaded or updated series."""
+        for cache_key in cache_keys:
+            self._plot_arrays.pop(cache_key, None)
+        window = self._plot_window
+        if window is None:
+            return
+        if not window.isVisible():
+            # Redrawn when the window is opened again
+            window.stale.update(key for key in cache_keys if key in window)
+            return
+        try:
+            window.add_series(self._plot_series(cache_keys))
+        except Exception as e:
+            QgsMessageLog.logMessage(
+                f"Could not update the plot: {e}", "BRO Grondwater", Qgis.Warning
+            )
+
+    def _close_plot_window(self):
+        """Close the plot window and drop the plot arrays of the current series."""
+        self._plot_arrays.clear()
+        if self._plot_window is not None:
+            self._plot_window.close()
+            self._plot_window.deleteLater()
+            self._plot_window = None
+
+    def analyze_correlation(self):
+        """Correlate all downloaded series with each other in a background task.
+
+        The series are resampled to a common daily or weekly grid; results
+        are cached until the downloaded series or the settings change.
+        """
+        if self._correlation_task is not None:
+            self.dlg.statusLabel.setText("Correlation analysis already running...")
+            return
+        if len(self._downloaded_measurements) < 2:
+            QMessageBox.warning(
+                self.dlg, "No Data", "Please download measurements of at least two wells first."
+            )
+            return
+        try:
+            import pyqtgraph  # noqa: F401
+        except ImportError:
+            QMessageBox.critical(
+                self.dlg,
+                "Missing Dependency",
+                "pyqtgraph is not yet installed.\n\n"
+                "Please restart QGIS to trigger automatic installation, "
+                "or install it manually via OSGeo4W Shell:\n"
+                "  pip install pyqtgraph",
+            )
+            return
+
+        import numpy as np
+
+        from .correlation import DAY, analyze, fingerprint
+        from .plotting import series_arrays
+
+        series, labels = {}, {}
+        for cache_key, measurement in self._downloaded_measurements.items():
+            series_data = self._series_data(cache_key)
+            if not series_data or not series_data.get("dates"):
+                continue
+            timestamps, values = series_arrays(series_data)
+            if len(timestamps) == 0:
+                continue
+            order = np.argsort(timestamps, kind="stable")
+            series[cache_key] = (timestamps[order], values[order])
+            name, bro_id = measurement["name"], measurement["bro_id"]
+            gmw_match = re.search(r"GMW\d+", str(name) + str(bro_id))
+            label = gmw_match.group(0) if gmw_match else (name or bro_id)
+            labels[cache_key] = f"{label}-{measurement['tube_nr']}"
+
+        parameters = {
+            "step": DAY * (7 if self.dlg.cmbCorrelationStep.currentIndex() == 1 else 1),
+            "max_lag": self.dlg.spinMaxLag.value(),
+            "changes": self.dlg.chkCorrelationChanges.isChecked(),
+        }
+        key = fingerprint(series, **parameters)
+        result = self._correlation_cache.get(key)
+        if result is not None:
+            self._show_correlation(result)
+            return
+
+        self._correlation_task = QgsTask.fromFunction(
+            f"Correlating {len(series)} groundwater level series",
+            lambda task: analyze(series, labels, is_cancelled=task.isCanceled, **parameters),
+            on_finished=lambda exception, result=None: self._on_correlation_computed(
+                key, exception, result
+            ),
+        )
+        QgsApplication.taskManager().addTask(self._correlation_task)
+        self.dlg.statusLabel.setText(f"Correlating {len(series)} series...")
+
+    def _on_correlation_computed(self, key, exception, result=None):
+        """Cache the correlation result and show it."""
+        self._correlation_task = None
+        if exception is not None:
+            QMessageBox.critical(
+                self.dlg,
+                "Correlation Error",
+                f"Error computing the correlation:\n{str(exception)}",
+            )
+            return
+        if result is None:
+            self.dlg.statusLabel.setText("Correlation analysis cancelled")
+            return
+        self._correlation_cache.put(key, result)
+        self._show_correlation(result)
+
+    def _show_correlation(self, result):
+        """Show the correlation table and heatmap in a non-modal dialog."""
+        from .correlation_view import CorrelationDialog
+
+        if self._correlation_dialog is not None:
+            self._correlation_dialog.close()
+        self._correlation_dialog = CorrelationDialog(
+            result,
+            "Correlation between wells",
+            on_pair_activated=lambda a, b: self._plot_wells([a, b]),
+            parent=self.dlg,
+        )
+        self._correlation_dialog.show()
+        self.dlg.statusLabel.setText(f"Correlation of {len(result)} wells")
+
+    def toggle_level_animation(self, enabled):
+        """Start or stop animating groundwater levels with the Temporal Controller."""
+        if not enabled:
+            self._stop_level_animation()
+            self.dlg.statusLabel.setText("Level animation stopped")
+            return
 
-            # Toolbar
-            toolbar = QHBoxLayout()
-            toolbar.setSpacing(4)
+        if self.wells_layer is None or not self._downloaded_measurements:
+            QMessageBox.warning(
+                self.dlg,
+                "No Data",
+                "Please retrieve wells and download measurements first.",
+            )
+            self.dlg.btnAnimateLevels.setChecked(False)
+            return
 
-            vb = plot_widget.getViewBox()
+        import numpy as np
 
-            btn_pan = QToolButton()
-            btn_pan.setText("Pan")
-            btn_pan.setToolTip("Pan mode: drag to scroll")
-            btn_pan.setCheckable(True)
-            btn_pan.setChecked(True)
+        from .plotting import series_arrays
+        from .time_index import LevelAnimation, TimeSliceIndex
+
+        series = {}
+        for cache_key in self._downloaded_measurements:
+            series_data = self._series_data(cache_key)
+            if series_data and series_data.get("dates"):
+                timestamps, values = series_arrays(series_data)
+                order = np.argsort(timestamps, kind="stable")
+                series[cache_key] = (timestamps[order], values[order])
+
+        self._level_animation = LevelAnimation(
+            TimeSliceIndex(series),
+            interpolate=self.dlg.chkInterpolateLevels.isChecked(),
+            relative=QSettings().value("BROGrondwater/animate_relative", True, type=bool),
+        )
+        self._level_animation.register()
 
-            btn_zoom = QToolButton()
-            btn_zoom.setText("Zoom")
-            btn_zoom.setToolTip("Zoom mode: drag to draw zoom box")
-            btn_zoom.setCheckable(True)
+        canvas = self.iface.mapCanvas()
+        self._level_animation.apply(self.wells_layer, canvas.temporalController())
+        canvas.temporalRangeChanged.connect(self._on_temporal_range_changed)
+        self.dlg.statusLabel.setText(
+            f"Animating levels of {len(series)} wells, use the Temporal Controller"
+        )
 
-            mode_group = QButtonGroup()
-            mode_group.addButton(btn_pan)
-            mode_group.addButton(btn_zoom)
-            mode_group.setExclusive(True)
+    def _on_temporal_range_changed(self):
+        """Compute the levels of all wells once for the new frame."""
+        if self._level_animation is not None:
+            self._level_animation.prepare_frame(self.iface.mapCanvas().temporalRange())
 
-            btn_pan.clicked.connect(lambda: vb.setMouseMode(vb.PanMode))
-            btn_zoom.clicked.connect(lambda: vb.setMouseMode(vb.RectMode))
+    def _stop_level_animation(self):
+        """Remove the level animation and restore the wells layer style."""
+        if self._level_animation is None:
+            return
+        self.iface.mapCanvas().temporalRangeChanged.disconnect(
+            self._on_temporal_range_changed
+        )
+        self._level_animation.unregister()
+        self._level_animation = None
 
-            btn_reset = QPushButton("Reset view")
-            btn_reset.setToolTip("Zoom to fit all data")
-            btn_reset.clicked.connect(lambda: plot_widget.autoRange())
+        if self.wells_layer is not None:
+            self.wells_layer.temporalProperties().setIsActive(False)
+            self._apply_wells_style(self.wells_layer)
 
-            btn_zoom_in = QPushButton("＋")
-            btn_zoom_in.setToolTip("Zoom in")
-            btn_zoom_in.setFixedWidth(32)
-            btn_zoom_in.clicked.connect(lambda: vb.scaleBy((0.7, 0.7)))
+    def interpolate_level_surface(self):
+        """Interpolate the levels of the filtered wells into a raster layer.
 
-            btn_zoom_out = QPushButton("－")
-            btn_zoom_out.setToolTip("Zoom out")
-            btn_zoom_out.setFixedWidth(32)
-            btn_zoom_out.clicked.connect(lambda: vb.scaleBy((1.4, 1.4)))
+        The value per well (level at a date, GHG, GLG or GVG) and the raster
+        are computed in a background task; the raster covers the map extent.
+        """
+        if self._surface_task is not None:
+            self.dlg.statusLabel.setText("Level surface is already being computed...")
+            return
+        if self.wells_layer is None or not self._downloaded_measurements:
+            QMessageBox.warning(
+                self.dlg,
+                "No Data",
+                "Please retrieve wells and download measurements first.",
+            )
+            return
 
-            toolbar.addWidget(btn_pan)
-            toolbar.addWidget(btn_zoom)
-            toolbar.addWidget(btn_zoom_in)
-            toolbar.addWidget(btn_zoom_out)
-            toolbar.addWidget(btn_reset)
-            toolbar.addStretch()
+        import numpy as np
 
-            btn_save = QPushButton("Save as PNG")
-            btn_save.clicked.connect(lambda: self._save_plot(plot_widget))
-            toolbar.addWidget(btn_save)
+        from .head_surface import AT_DATE, GHG, GLG, GVG, IDW, NEAREST
+        from .plotting import series_arrays
+
+        # Wells within the same screen_top range as the depth filter
+        request = QgsFeatureRequest().setFilterExpression(self._depth_filter_expression())
+        request.setSubsetOfAttributes(["bro_id", "tube_nr", "name"], self.wells_layer.fields())
+        series, xs, ys = {}, [], []
+        for feature in self.wells_layer.getFeatures(request):
+            geometry = feature.geometry()
+            if geometry is None or geometry.isEmpty():
+                continue
+            cache_key = self._feature_cache_key(
+                {"bro_id": feature["bro_id"], "tube_nr": feature["tube_nr"], "name": feature["name"]}
+            )
+            if cache_key not in self._downloaded_measurements or cache_key in series:
+                continue
+            series_data = self._series_data(cache_key)
+            if not series_data or not series_data.get("dates"):
+                continue
+            timestamps, values = series_arrays(series_data)
+            order = np.argsort(timestamps, kind="stable")
+            series[cache_key] = (timestamps[order], values[order])
+            point = geometry.asPoint()
+            xs.append(point.x())
+            ys.append(point.y())
+
+        if not series:
+            QMessageBox.warning(
+                self.dlg,
+                "No Data",
+                "None of the wells within the depth filter have downloaded measurements.",
+            )
+            return
 
-            layout.addLayout(toolbar)
-            layout.addWidget(plot_widget)
+        value = (AT_DATE, GHG, GLG, GVG)[self.dlg.cmbSurfaceValue.currentIndex()]
+        method = (IDW, NEAREST)[self.dlg.cmbSurfaceMethod.currentIndex()]
+        date = self.dlg.dateSurface.date()
+        label = date.toString("yyyy-MM-dd") if value == AT_DATE else value
 
-            plot_dialog.setLayout(layout)
+        project_dir = QgsProject.instance().absolutePath() or os.path.expanduser("~")
+        default_path = os.path.join(project_dir, f"BRO_level_{label}.tif")
+        file_path, _ = QFileDialog.getSaveFileName(
+            self.dlg, "Save Level Surface", default_path, "GeoTIFF (*.tif)"
+        )
+        if not file_path:
+            return
 
-            self.dlg.progressBar.setValue(100)
-            self.dlg.statusLabel.setText(f"Plot created ({plotted_count} wells)")
-            plot_dialog.exec()
+        # The wells layer is in RD, so is the raster
+        extent = self._canvas_extent_rd()
+        cell_size = self.dlg.spinSurfaceCellSize.value()
+        radius = self.dlg.spinSurfaceRadius.value()
+        date_seconds = float(
+            np.datetime64(date.toString("yyyy-MM-dd"), "s").astype(np.int64)
+        )
 
-        except Exception as e:
+        self._surface_task = QgsTask.fromFunction(
+            f"Interpolating groundwater level surface ({label})",
+            lambda task: self._compute_level_surface(
+                task,
+                series,
+                xs,
+                ys,
+                value,
+                date_seconds,
+                method,
+                radius,
+                extent,
+                cell_size,
+                file_path,
+            ),
+            on_finished=lambda exception, result=None: self._on_level_surface_computed(
+                file_path, f"Groundwater level {label}", exception, result
+            ),
+        )
+        QgsApplication.taskManager().addTask(self._surface_task)
+        self.dlg.statusLabel.setText(
+            f"Interpolating the {label} level of {len(series)} wells..."
+        )
+
+    def _compute_level_surface(
+        self, task, series, xs, ys, value, date_seconds, method, radius, extent, cell_size, path
+    ):
+        """Compute the values per well and write the raster (runs in a QgsTask)."""
+        from .head_surface import SurfaceInterpolator, well_values, write_surface
+
+        values = well_values(series, value, date_seconds)
+        levels = [values[key] for key in series]
+        interpolator = SurfaceInterpolator(xs, ys, levels, method=method, radius=radius)
+        if len(interpolator) == 0:
+            return None
+        size = write_surface(
+            path,
+            interpolator,
+            extent,
+            cell_size,
+            progress=task.setProgress,
+            is_cancelled=task.isCanceled,
+        )
+        if size is None:
+            return None
+        return len(interpolator), size
+
+    def _on_level_surface_computed(self, path, name, exception, result=None):
+        """Add the level surface raster to the project."""
+        self._surface_task = None
+        if exception is not None:
             QMessageBox.critical(
-                self.dlg, "Plot Error", f"Error creating plot:\n{str(e)}"
+                self.dlg,
+                "Interpolation Error",
+                f"Error interpolating the level surface:\n{str(exception)}",
             )
-        finally:
-            self._end_operation()
+            return
+        if result is None:
+            self.dlg.statusLabel.setText(
+                "Level surface cancelled or no wells with a level for this value"
+            )
+            return
+
+        wells, (cols, rows) = result
+        layer = QgsRasterLayer(path, name, "gdal")
+        if not layer.isValid():
+            QMessageBox.warning(self.dlg, "Interpolation Error", f"Could not load {path}")
+            return
+        QgsProject.instance().addMapLayer(layer)
+        QgsMessageLog.logMessage(
+            f"Level surface {path}: {cols} x {rows} cells from {wells} wells",
+            "BRO Grondwater",
+            Qgis.Info,
+        )
+        self.dlg.statusLabel.setText(f"Level surface from {wells} wells added")
 
     def export_to_excel(self):
-        """Export downloaded measurements to Excel using xlsxwriter for proper chart support."""
+        """Export downloaded measurements to Excel using xlsxwriter for proper chart support.
+
+        Exports beyond the Excel row limit or with many wells are split over
+        several workbooks, written in parallel worker processes.
+        """
         if len(self._downloaded_measurements) == 0:
             QMessageBox.warning(
                 self.dlg, "No Data", "Please download measurements first (step 4)."
             )
             return
+        if self._export_task is not None:
+            self.dlg.statusLabel.setText("Export already running...")
+            return
+
+        try:
+            import xlsxwriter  # noqa: F401
+        except ImportError:
+            QMessageBox.critical(
+                self.dlg,
+                "Import Error",
+                "xlsxwriter is required for Excel export. Please install it using:\n"
+                "pip install xlsxwriter",
+            )
+            return
 
         # Generate default filename with date and time to avoid overwriting
         from datetime import datetime
@@ -1258,261 +3091,282 @@ class BROGrondwaterPlugin:
         if not file_path:
             return
 
-        self._start_operation()
-        try:
-            # Fix stdout/stderr for QGIS
-            import io
+        from .excel_export import MAX_SERIES
 
-            if sys.stdout is None:
-                sys.stdout = io.StringIO()
-            if sys.stderr is None:
-                sys.stderr = io.StringIO()
+        measurements = list(self._downloaded_measurements.items())
+        load = self._series_loader()
+        max_series = min(
+            int(QSettings().value("BROGrondwater/excel_series_per_workbook", MAX_SERIES)), 255
+        )
+        retrieval_date = datetime.now().strftime("%Y-%m-%d %H:%M")
+        self._export_task = QgsTask.fromFunction(
+            f"Exporting {len(measurements)} wells to Excel",
+            lambda task: self._write_excel(
+                task, file_path, measurements, load, max_series, retrieval_date
+            ),
+            on_finished=lambda exception, result=None: self._on_excel_export_finished(
+                file_path, exception, result
+            ),
+        )
+        QgsApplication.taskManager().addTask(self._export_task)
+        self.dlg.statusLabel.setText("Exporting to Excel...")
+
+    @staticmethod
+    def _write_excel(task, file_path, measurements, load, max_series, retrieval_date):
+        """Plan the workbooks of an Excel export and write them (background task)."""
+        from .excel_export import (
+            excel_wells,
+            plan_shards,
+            shard_jobs,
+            shard_paths,
+            write_shards,
+        )
 
-            import re
-            import xlsxwriter
-            from datetime import datetime as dt
+        wells = excel_wells(measurements, load)
+        task.setProgress(5)
+        shards = plan_shards(wells, max_series=max_series)
+        jobs = shard_jobs(wells, shards, shard_paths(file_path, len(shards)), retrieval_date)
+        paths = write_shards(
+            jobs,
+            progress=lambda percent: task.setProgress(5 + 0.95 * percent),
+            is_cancelled=task.isCanceled,
+        )
+        if paths is None:
+            return None
+        return {"paths": paths, "wells": sum(1 for w in wells if len(w["times"]))}
 
-            self.dlg.statusLabel.setText("Exporting to Excel...")
+    def _on_excel_export_finished(self, file_path, exception, result=None):
+        """Report an Excel export and open the workbook (or its folder if split)."""
+        self._export_task = None
+        if exception is not None:
+            QMessageBox.critical(
+                self.dlg, "Export Error", f"Error exporting to Excel:\n{str(exception)}"
+            )
+            return
+        if result is None:
+            self.dlg.statusLabel.setText("Export cancelled")
+            return
 
-            import math
+        paths, exported_count = result["paths"], result["wells"]
+        self.dlg.progressBar.setValue(100)
+        if len(paths) == 1:
+            self.dlg.statusLabel.setText(
+                f"Exported {exported_count} wells to {os.path.basename(file_path)}"
+            )
+            QMessageBox.information(
+                self.dlg,
+                "Success",
+                f"Data successfully exported to:\n{file_path}\n\n"
+                f"Exported measurements for {exported_count} wells.",
+            )
+            to_open = file_path
+        else:
+            QgsMessageLog.logMessage(
+                f"Excel export split over {len(paths)} workbooks: " + ", ".join(paths),
+                "BRO Grondwater",
+                Qgis.Info,
+            )
+            self.dlg.statusLabel.setText(
+                f"Exported {exported_count} wells to {len(paths)} workbooks"
+            )
+            QMessageBox.information(
+                self.dlg,
+                "Success",
+                f"Data successfully exported to {len(paths)} workbooks:\n"
+                f"{os.path.basename(paths[0])} ... {os.path.basename(paths[-1])}\n\n"
+                f"Exported measurements for {exported_count} wells. The export was split "
+                "to stay within the Excel limits of rows per sheet and series per chart.",
+            )
+            to_open = os.path.dirname(file_path)
 
-            # Create workbook with xlsxwriter
-            workbook = xlsxwriter.Workbook(file_path)
+        # Open the Excel file
+        try:
+            import subprocess
+
+            if sys.platform == "win32":
+                os.startfile(to_open)
+            elif sys.platform == "darwin":  # macOS
+                subprocess.run(["open", to_open])
+            else:  # Linux
+                subprocess.run(["xdg-open", to_open])
+        except Exception as open_error:
+            # Don't fail if we can't open the file
+            print(f"Could not open file: {open_error}")
+
+    def _export_wells(self):
+        """Return the downloaded wells as dicts with cache key and identifiers, for exports."""
+        wells = []
+        for cache_key, measurement in self._downloaded_measurements.items():
+            name, bro_id = measurement["name"], measurement["bro_id"]
+            gmw_match = re.search(r"GMW\d+", str(name) + str(bro_id))
+            wells.append(
+                {
+                    "cache_key": cache_key,
+                    "gmw_id": gmw_match.group(0) if gmw_match else bro_id,
+                    "name": name,
+                    "bro_id": bro_id,
+                    "tube_nr": measurement["tube_nr"],
+                }
+            )
+        return wells
 
-            # Add formats
-            header_format = workbook.add_format({"bold": True, "bg_color": "#D9E1F2"})
-            date_format = workbook.add_format({"num_format": "yyyy-mm-dd hh:mm:ss"})
+    def export_to_geopackage(self):
+        """Export wells, measurements and a per-well summary to one GeoPackage."""
+        if len(self._downloaded_measurements) == 0:
+            QMessageBox.warning(
+                self.dlg, "No Data", "Please download measurements first (step 4)."
+            )
+            return
+        if self._export_task is not None:
+            self.dlg.statusLabel.setText("Export already running...")
+            return
 
-            # Collect all series data first
-            all_series_data = {}  # For chart: {gmw_id: (dates, values)}
-            metadata_list = []
+        from datetime import datetime
 
-            for cache_key, measurement in self._downloaded_measurements.items():
-                series_data = measurement.get("data", {})
-                metadata = series_data.get("metadata", {})
-                name = measurement["name"]
-                bro_id = measurement["bro_id"]
+        from .gpkg_export import export_geopackage
 
-                # Extract GMW id
-                gmw_match = re.search(r"GMW\d+", str(name) + str(bro_id))
-                gmw_id = gmw_match.group(0) if gmw_match else bro_id
+        default_filename = f"BRO_GMW_{datetime.now().strftime('%y%m%d_%H%M%S')}.gpkg"
+        downloads_folder = os.path.join(os.path.expanduser("~"), "Downloads")
+        if not os.path.exists(downloads_folder):
+            downloads_folder = os.path.expanduser("~")
+        file_path, _ = QFileDialog.getSaveFileName(
+            self.dlg,
+            "Save GeoPackage",
+            os.path.join(downloads_folder, default_filename),
+            "GeoPackage (*.gpkg)",
+        )
+        if not file_path:
+            return
 
-                # Get metadata
-                measurements_count = (
-                    len(series_data.get("dates", [])) if series_data else 0
-                )
-                metadata_list.append(
-                    {
-                        "GMW ID": gmw_id,
-                        "Name": name,
-                        "BRO ID": bro_id,
-                        "Tube Nr": metadata.get("tube_nr", measurement["tube_nr"]),
-                        "X (RD)": metadata.get("x"),
-                        "Y (RD)": metadata.get("y"),
-                        "Surface Level (m NAP)": metadata.get("ground_level"),
-                        "Filter Top (m NAP)": metadata.get("screen_top"),
-                        "Filter Bottom (m NAP)": metadata.get("screen_bottom"),
-                        "Tube Top (m NAP)": metadata.get("tube_top"),
-                        "Source": metadata.get("source", "BRO"),
-                        "Unit": metadata.get("unit", "m NAP"),
-                        "Measurements Count": measurements_count,
-                    }
-                )
+        wells = self._export_wells()
+        load = self._series_loader()
+        transform_context = QgsProject.instance().transformContext()
+        self._export_task = QgsTask.fromFunction(
+            f"Exporting {len(wells)} wells to GeoPackage",
+            lambda task: export_geopackage(
+                file_path,
+                wells,
+                load,
+                transform_context,
+                progress=task.setProgress,
+                is_cancelled=task.isCanceled,
+            ),
+            on_finished=lambda exception, result=None: self._on_export_finished(
+                file_path, len(wells), exception, result
+            ),
+        )
+        QgsApplication.taskManager().addTask(self._export_task)
+        self.dlg.statusLabel.setText(f"Exporting {len(wells)} wells to GeoPackage...")
 
-                # Collect series data for chart (use 'name' as series identifier)
-                if (
-                    series_data
-                    and series_data.get("dates")
-                    and series_data.get("values")
-                ):
-                    # Use name as identifier, fall back to GMW ID
-                    series_name = name if name else gmw_id
-                    series_name = series_name[:31]  # Excel sheet name limit
-                    dates = [dt.fromisoformat(d) for d in series_data["dates"]]
-                    values = series_data["values"]
-                    if dates and values:
-                        all_series_data[series_name] = (dates, values)
-
-            exported_count = len(all_series_data)
-
-            # Write Metadata sheet
-            meta_ws = workbook.add_worksheet("Metadata")
-            meta_headers = [
-                "GMW ID",
-                "Name",
-                "BRO ID",
-                "Tube Nr",
-                "X (RD)",
-                "Y (RD)",
-                "Surface Level (m NAP)",
-                "Filter Top (m NAP)",
-                "Filter Bottom (m NAP)",
-                "Tube Top (m NAP)",
-                "Source",
-                "Unit",
-                "Measurements Count",
-            ]
+    def _on_export_finished(self, file_path, well_count, exception, result=None):
+        """Report the result of a background export."""
+        self._export_task = None
+        if exception is not None:
+            QMessageBox.critical(
+                self.dlg, "Export Error", f"Error exporting measurements:\n{str(exception)}"
+            )
+            return
+        if result is None:
+            self.dlg.statusLabel.setText("Export cancelled")
+            return
+        QgsMessageLog.logMessage(
+            f"Exported {well_count} wells and {result} measurements to {file_path}",
+            "BRO Grondwater",
+            Qgis.Info,
+        )
+        self.dlg.statusLabel.setText(
+            f"Exported {well_count} wells ({result} measurements) to "
+            f"{os.path.basename(file_path)}"
+        )
 
-            # Track max width for each column (start with header lengths)
-            col_widths = [len(header) for header in meta_headers]
-
-            # Write headers
-            for col, header in enumerate(meta_headers):
-                meta_ws.write(0, col, header, header_format)
-
-            # Write data and track max widths
-            for row, meta in enumerate(metadata_list, 1):
-                for col, header in enumerate(meta_headers):
-                    value = meta.get(header)
-                    # Skip NaN values to avoid #GETAL errors in Dutch Excel
-                    if value is not None and not (
-                        isinstance(value, float) and math.isnan(value)
-                    ):
-                        meta_ws.write(row, col, value)
-                        col_widths[col] = max(col_widths[col], len(str(value)))
-
-            # Apply column widths (add small padding, cap at 50)
-            for col, width in enumerate(col_widths):
-                meta_ws.set_column(col, col, min(width + 2, 50))
-
-            # Write Chart Data sheet and create chart
-            if all_series_data:
-                # Build combined data with common datetime column
-                all_dates = set()
-                for dates, values in all_series_data.values():
-                    all_dates.update(dates)
-                all_dates = sorted(all_dates)
-
-                # Pre-compute lookup dictionaries for fast access
-                gmw_ids = list(all_series_data.keys())
-                series_dicts = {}
-                for gmw_id in gmw_ids:
-                    dates_list, values_list = all_series_data[gmw_id]
-                    series_dicts[gmw_id] = dict(zip(dates_list, values_list))
-
-                # Create chart data worksheet
-                data_ws = workbook.add_worksheet("Chart Data")
-
-                # Write headers as a row
-                headers = ["datetime"] + gmw_ids
-                data_ws.write_row(0, 0, headers, header_format)
-
-                # Build and write data rows efficiently
-                for row, date in enumerate(all_dates, 1):
-                    # Write date with explicit format (write_row doesn't apply formats)
-                    data_ws.write_datetime(row, 0, date, date_format)
-                    # Write values for each series
-                    for col, gmw_id in enumerate(gmw_ids, 1):
-                        value = series_dicts[gmw_id].get(date)
-                        if value is not None:
-                            data_ws.write_number(row, col, value)
-
-                # Set column width for date column
-                data_ws.set_column(0, 0, 20)
-                # Set data column widths based on header length (names can be long)
-                for col, series_id in enumerate(gmw_ids, 1):
-                    data_ws.set_column(col, col, max(len(series_id) + 2, 18))
-
-                # Create chart with show_blanks_as='span' to connect across gaps
-                chart = workbook.add_chart({"type": "line"})
-                chart.show_blanks_as(
-                    "span"
-                )  # This properly connects lines across empty cells
-
-                # Add data series
-                num_rows = len(all_dates)
-                for col, gmw_id in enumerate(gmw_ids, 1):
-                    chart.add_series(
-                        {
-                            "name": ["Chart Data", 0, col],
-                            "categories": ["Chart Data", 1, 0, num_rows, 0],
-                            "values": ["Chart Data", 1, col, num_rows, col],
-                        }
-                    )
+    def _series_loader(self):
+        """Return a function loading series data by cache key, for background tasks.
 
-                # Style the chart (Dutch labels)
-                chart.set_title({"name": "Grondwaterstand"})
-                chart.set_x_axis(
-                    {
-                        "name": "Datum",
-                        "date_axis": True,
-                        "label_position": "low",  # Labels at bottom of plot area
-                        "num_format": "dd-mm-yyyy",
-                    }
-                )
-                chart.set_y_axis(
-                    {
-                        "name": "Stijghoogte (m NAP)",
-                        "crossing": "min",  # X-axis crosses at y-minimum, not at y=0
-                    }
-                )
-                chart.set_legend({"position": "bottom"})  # Legend below chart
-                chart.set_size({"width": 800, "height": 480})
-
-                # Create a dedicated chart sheet
-                chart_ws = workbook.add_chartsheet("Chart")
-                chart_ws.set_chart(chart)
-
-            # Write Credits & Disclaimer sheet
-            credits_ws = workbook.add_worksheet("Credits & Disclaimer")
-            retrieval_date = datetime.now().strftime("%Y-%m-%d %H:%M")
-            credits_text = [
-                'Data retrieved with the QGIS plugin "BRO Grondwater"',
-                f"Date of retrieval: {retrieval_date}",
-                "",
-                "Developed by: CWG Ingenieurs b.v. (https://www.cwgi.nl)",
-                "Powered by the Python packages Hydropandas and Brodata",
-                "Data source: BRO (Basisregistratie Ondergrond)",
-                "",
-                "DISCLAIMER",
-                'This software is provided "as is", without warranty of any kind, express or implied,',
-                "including but not limited to the warranties of merchantability, fitness for a particular",
-                "purpose and noninfringement. In no event shall the authors or copyright holders be liable",
-                "for any claim, damages or other liability, whether in an action of contract, tort or otherwise,",
-                "arising from, out of or in connection with the software or the use or other dealings in the software.",
-            ]
-            for row, text in enumerate(credits_text):
-                credits_ws.write(row, 0, text)
-            credits_ws.set_column(0, 0, 80)
+        Series that are not in memory are read from the series store on each
+        call without keeping them, so a streaming export stays flat in memory.
+        """
+        in_memory = {
+            cache_key: measurement.get("data")
+            for cache_key, measurement in self._downloaded_measurements.items()
+        }
+        store = self._series_store
 
-            # Close the workbook
-            workbook.close()
+        def load(cache_key):
+            data = in_memory.get(cache_key)
+            if data is None and store is not None:
+                data = store.load(cache_key)
+            return data
 
-            self.dlg.progressBar.setValue(100)
-            self.dlg.statusLabel.setText(
-                f"Exported {exported_count} wells to {os.path.basename(file_path)}"
-            )
-            QMessageBox.information(
-                self.dlg,
-                "Success",
-                f"Data successfully exported to:\n{file_path}\n\n"
-                f"Exported measurements for {exported_count} wells.",
+        return load
+
+    def export_streaming(self, kind):
+        """Stream all downloaded series to a Parquet dataset or a gzip CSV file.
+
+        Parquet is partitioned by GMW and needs pyarrow. The series are read
+        one at a time and written in chunks in a background task.
+        """
+        if len(self._downloaded_measurements) == 0:
+            QMessageBox.warning(
+                self.dlg, "No Data", "Please download measurements first (step 4)."
             )
+            return
+        if self._export_task is not None:
+            self.dlg.statusLabel.setText("Export already running...")
+            return
+
+        from datetime import datetime
+
+        from .stream_export import export_csv_gz, export_parquet
 
-            # Open the Excel file
+        if kind == "parquet":
             try:
-                import subprocess
-
-                if sys.platform == "win32":
-                    os.startfile(file_path)
-                elif sys.platform == "darwin":  # macOS
-                    subprocess.run(["open", file_path])
-                else:  # Linux
-                    subprocess.run(["xdg-open", file_path])
-            except Exception as open_error:
-                # Don't fail if we can't open the file
-                print(f"Could not open file: {open_error}")
+                import pyarrow  # noqa: F401
+            except ImportError:
+                QMessageBox.critical(
+                    self.dlg,
+                    "Missing Dependency",
+                    "pyarrow is not installed.\n\n"
+                    "Install via OSGeo4W Shell:\n"
+                    "  pip install pyarrow",
+                )
+                return
+            extension, file_filter = ".parquet", "Parquet dataset (*.parquet)"
+            export = export_parquet
+        else:
+            extension, file_filter = ".csv.gz", "Gzip CSV (*.csv.gz)"
+            export = export_csv_gz
 
-        except ImportError:
-            QMessageBox.critical(
-                self.dlg,
-                "Import Error",
-                "xlsxwriter is required for Excel export. Please install it using:\n"
-                "pip install xlsxwriter",
-            )
-        except Exception as e:
-            QMessageBox.critical(
-                self.dlg, "Export Error", f"Error exporting to Excel:\n{str(e)}"
-            )
-        finally:
-            self._end_operation()
+        default_filename = f"BRO_GMW_{datetime.now().strftime('%y%m%d_%H%M%S')}{extension}"
+        downloads_folder = os.path.join(os.path.expanduser("~"), "Downloads")
+        if not os.path.exists(downloads_folder):
+            downloads_folder = os.path.expanduser("~")
+        file_path, _ = QFileDialog.getSaveFileName(
+            self.dlg,
+            "Export Measurements",
+            os.path.join(downloads_folder, default_filename),
+            file_filter,
+        )
+        if not file_path:
+            return
+        if not file_path.endswith(extension):
+            file_path += extension
+
+        wells = self._export_wells()
+        load = self._series_loader()
+        self._export_task = QgsTask.fromFunction(
+            f"Exporting {len(wells)} wells to {os.path.basename(file_path)}",
+            lambda task: export(
+                file_path,
+                wells,
+                load,
+                progress=task.setProgress,
+                is_cancelled=task.isCanceled,
+            ),
+            on_finished=lambda exception, result=None: self._on_export_finished(
+                file_path, len(wells), exception, result
+            ),
+        )
+        QgsApplication.taskManager().addTask(self._export_task)
+        self.dlg.statusLabel.setText(
+            f"Exporting {len(wells)} wells to {os.path.basename(file_path)}..."
+        )
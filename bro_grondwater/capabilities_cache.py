@@ -0,0 +1,88 @@
+"""
+BRO Grondwater Plugin - Disk cache for WMS/WMTS capabilities documents
+"""
+
+import hashlib
+import os
+import tempfile
+import time
+import xml.etree.ElementTree as ET
+from urllib.parse import parse_qsl, urlsplit
+
+
+def capabilities_key(url):
+    """Return a normalized GetCapabilities URL.
+
+    Parameter names and values compare case-insensitively and repeated
+    parameters count once: the QGIS WMS provider appends its own
+    SERVICE/REQUEST to the URL of a layer, which must match the same request.
+    """
+    parts = urlsplit(url)
+    query = sorted({(key.lower(), value.lower()) for key, value in parse_qsl(parts.query)})
+    return (
+        f"{parts.scheme.lower()}://{parts.netloc.lower()}{parts.path}?"
+        + "&".join(f"{key}={value}" for key, value in query)
+    )
+
+
+class CapabilitiesCache:
+    """Keep GetCapabilities documents on disk so they are reused across sessions.
+
+    Documents older than ``max_age_hours`` are considered stale: they are
+    refreshed, but can still be used when the service cannot be reached.
+    """
+
+    def __init__(self, directory, max_age_hours=168):
+        self.directory = directory
+        self.max_age = max_age_hours * 3600
+
+    def _path(self, url):
+        digest = hashlib.sha1(capabilities_key(url).encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, f"{digest}.xml")
+
+    def path(self, url):
+        """Return the file with the cached document (fresh or not), or None."""
+        path = self._path(url)
+        return path if os.path.exists(path) else None
+
+    def is_fresh(self, url):
+        """Return True if a cached document exists and has not expired."""
+        path = self._path(url)
+        return os.path.exists(path) and time.time() - os.path.getmtime(path) < self.max_age
+
+    def get(self, url, allow_stale=False):
+        """Return the cached document, or None if missing (or expired)."""
+        path = self._path(url)
+        if not os.path.exists(path):
+            return None
+        if not allow_stale and not self.is_fresh(url):
+            return None
+        with open(path, "rb") as f:
+            return f.read()
+
+    def put(self, url, content):
+        """Store a document; written to a temporary file and renamed into place."""
+        os.makedirs(self.directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(content)
+            os.replace(tmp_path, self._path(url))
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+
+def has_layer(content, layer_name):
+    """Return True if a WMS/WMTS capabilities document advertises the layer."""
+    try:
+        root = ET.fromstring(content)
+    except ET.ParseError:
+        return False
+
+    for element in root.iter():
+        tag = element.tag.rsplit("}", 1)[-1]
+        if tag in ("Name", "Identifier") and (element.text or "").strip() == layer_name:
+            return True
+    return False
@@ -0,0 +1,231 @@
+"""
+BRO Grondwater Plugin - Hierarchical grid clusters of wells for small map scales
+
+The wells are aggregated once into a pyramid of square grid cells that
+double in size per level. Every cell holds the number of wells and tubes,
+the screen_top range and the number of tubes with downloaded measurements.
+All levels are stored in one point layer whose rule-based renderer shows
+one level per scale band, so QGIS picks the level while rendering without
+any work in Python; below DETAIL_SCALE the clusters hide and the wells
+layer shows the individual wells.
+"""
+
+import numpy as np
+from qgis.core import (
+    QgsFeature,
+    QgsField,
+    QgsGeometry,
+    QgsPalLayerSettings,
+    QgsPointXY,
+    QgsProperty,
+    QgsRuleBasedRenderer,
+    QgsSymbol,
+    QgsSymbolLayer,
+    QgsTextFormat,
+    QgsVectorLayer,
+    QgsVectorLayerSimpleLabeling,
+)
+from qgis.PyQt.QtCore import QVariant
+from qgis.PyQt.QtGui import QColor
+
+# Scale denominator from which the wells are shown as clusters
+DETAIL_SCALE = 50000
+
+# Number of pyramid levels; cells double in size per level
+LEVELS = 8
+
+# Cluster size on screen (m per 1:1 scale): 40 px of 0.28 mm
+CELL_SCREEN_SIZE = 40 * 0.00028
+
+CLUSTER_FIELDS = [
+    ("level", QVariant.Int),
+    ("cell_size", QVariant.Double),
+    ("n_wells", QVariant.Int),
+    ("n_tubes", QVariant.Int),
+    ("screen_min", QVariant.Double),
+    ("screen_max", QVariant.Double),
+    ("n_with_data", QVariant.Int),
+]
+
+
+class GridPyramid:
+    """Counts and screen_top range of the wells per grid cell, for all levels.
+
+    The finest level is aggregated from the wells, every coarser level from
+    the level below it, so building is a few ``bincount`` calls per level.
+    Tubes of one GMW share a location, so their well is counted once.
+    """
+
+    def __init__(self, xs, ys, screen_tops, well_ids, detail_scale=DETAIL_SCALE, levels=LEVELS):
+        self.x = np.asarray(xs, dtype=np.float64)
+        self.y = np.asarray(ys, dtype=np.float64)
+        self.detail_scale = detail_scale
+        self.base_cell = CELL_SCREEN_SIZE * detail_scale
+        self.levels = []
+        self._tube_cells = []  # Cell index of every tube, per level
+        if len(self.x) == 0:
+            return
+
+        screen = np.asarray(screen_tops, dtype=np.float64)
+        _, wells = np.unique(np.asarray(well_ids, dtype=object).astype(str), return_inverse=True)
+        x0 = np.floor(self.x.min() / self.base_cell) * self.base_cell
+        y0 = np.floor(self.y.min() / self.base_cell) * self.base_cell
+        col = ((self.x - x0) // self.base_cell).astype(np.int64)
+        row = ((self.y - y0) // self.base_cell).astype(np.int64)
+
+        # The first tube of each well, so wells are counted once per cell
+        first_tube = np.zeros(len(wells), dtype=bool)
+        first_tube[np.unique(wells, return_index=True)[1]] = True
+
+        for level in range(levels):
+            size = self.base_cell * 2**level
+            ids = (row >> level) * ((col.max() >> level) + 1) + (col >> level)
+            cells, inverse = np.unique(ids, return_inverse=True)
+            n = len(cells)
+            n_tubes = np.bincount(inverse, minlength=n)
+            # Centroid of the tubes, so a cluster sits where its wells are
+            cx = np.bincount(inverse, weights=self.x, minlength=n) / n_tubes
+            cy = np.bincount(inverse, weights=self.y, minlength=n) / n_tubes
+
+            screen_min = np.full(n, np.inf)
+            screen_max = np.full(n, -np.inf)
+            finite = np.isfinite(screen)
+            np.minimum.at(screen_min, inverse[finite], screen[finite])
+            np.maximum.at(screen_max, inverse[finite], screen[finite])
+            screen_min[np.isinf(screen_min)] = np.nan
+            screen_max[np.isinf(screen_max)] = np.nan
+
+            self.levels.append(
+                {
+                    "cell_size": size,
+                    "x": cx,
+                    "y": cy,
+                    "n_wells": np.bincount(inverse[first_tube], minlength=n),
+                    "n_tubes": n_tubes,
+                    "screen_min": screen_min,
+                    "screen_max": screen_max,
+                    "n_with_data": np.zeros(n, dtype=np.int64),
+                }
+            )
+            self._tube_cells.append(inverse)
+            if n == 1:
+                break
+
+    def scale_range(self, level):
+        """Return the (most zoomed in, most zoomed out) scale of a level; 0 = no limit."""
+        zoomed_in = self.detail_scale * 2**level
+        zoomed_out = 0 if level == len(self.levels) - 1 else zoomed_in * 2
+        return zoomed_in, zoomed_out
+
+    def set_with_data(self, has_data):
+        """Count the tubes with downloaded measurements per cell (bool per tube)."""
+        has_data = np.asarray(has_data, dtype=np.float64)
+        for level, cells in zip(self.levels, self._tube_cells):
+            level["n_with_data"] = np.rint(
+                np.bincount(cells, weights=has_data, minlength=len(level["x"]))
+            ).astype(np.int64)
+
+
+def _optional(value):
+    return None if np.isnan(value) else float(value)
+
+
+def create_cluster_layer(pyramid, name="BRO Well Clusters"):
+    """Return a memory layer with the cells of all levels and its styling."""
+    layer = QgsVectorLayer("Point?crs=EPSG:28992", name, "memory")
+    provider = layer.dataProvider()
+    provider.addAttributes([QgsField(field, field_type) for field, field_type in CLUSTER_FIELDS])
+    layer.updateFields()
+
+    features = []
+    for number, level in enumerate(pyramid.levels):
+        for i in range(len(level["x"])):
+            feature = QgsFeature(layer.fields())
+            feature.setGeometry(
+                QgsGeometry.fromPointXY(QgsPointXY(level["x"][i], level["y"][i]))
+            )
+            feature.setAttributes(
+                [
+                    number,
+                    level["cell_size"],
+                    int(level["n_wells"][i]),
+                    int(level["n_tubes"][i]),
+                    _optional(level["screen_min"][i]),
+                    _optional(level["screen_max"][i]),
+                    int(level["n_with_data"][i]),
+                ]
+            )
+            features.append(feature)
+    provider.addFeatures(features)
+    layer.updateExtents()
+
+    layer.setRenderer(cluster_renderer(layer, pyramid))
+    layer.setLabeling(QgsVectorLayerSimpleLabeling(_count_labels()))
+    layer.setLabelsEnabled(True)
+    # Shown from DETAIL_SCALE outwards; the wells layer takes over below it
+    layer.setScaleBasedVisibility(True)
+    layer.setMaximumScale(pyramid.detail_scale)
+    layer.setMinimumScale(0)
+    return layer
+
+
+def update_with_data(layer, pyramid):
+    """Write the n_with_data counts of the pyramid to the cluster layer."""
+    field = layer.fields().indexOf("n_with_data")
+    changes = {}
+    offset = 0
+    fids = sorted(f.id() for f in layer.getFeatures())
+    for level in pyramid.levels:
+        for i, count in enumerate(level["n_with_data"]):
+            changes[fids[offset + i]] = {field: int(count)}
+        offset += len(level["n_with_data"])
+    layer.dataProvider().changeAttributeValues(changes)
+    layer.triggerRepaint()
+
+
+def cluster_renderer(layer, pyramid):
+    """Return a rule-based renderer showing one pyramid level per scale band.
+
+    Circles grow with the number of tubes; cells with downloaded
+    measurements are green.
+    """
+    symbol = QgsSymbol.defaultSymbol(layer.geometryType())
+    symbol.setColor(QColor("#1f77b4"))
+    symbol.setOpacity(0.8)
+    marker = symbol.symbolLayer(0)
+    marker.setDataDefinedProperty(
+        QgsSymbolLayer.Property.Size,
+        QgsProperty.fromExpression('min(2 + 1.2 * ln(1 + "n_tubes"), 14)'),
+    )
+    marker.setDataDefinedProperty(
+        QgsSymbolLayer.Property.FillColor,
+        QgsProperty.fromExpression(
+            "CASE WHEN \"n_with_data\" > 0 THEN '#2ca02c' ELSE '#1f77b4' END"
+        ),
+    )
+
+    root = QgsRuleBasedRenderer.Rule(None)
+    for level in range(len(pyramid.levels)):
+        zoomed_in, zoomed_out = pyramid.scale_range(level)
+        cell_size = pyramid.levels[level]["cell_size"]
+        root.appendChild(
+            QgsRuleBasedRenderer.Rule(
+                symbol.clone(),
+                zoomed_in,
+                zoomed_out,
+                f'"level" = {level}',
+                f"Cells of {cell_size / 1000:g} km",
+            )
+        )
+    return QgsRuleBasedRenderer(root)
+
+
+def _count_labels():
+    settings = QgsPalLayerSettings()
+    settings.fieldName = "n_tubes"
+    settings.placement = QgsPalLayerSettings.Placement.OverPoint
+    text_format = QgsTextFormat()
+    text_format.setSize(7)
+    text_format.setColor(QColor("white"))
+    settings.setFormat(text_format)
+    return settings
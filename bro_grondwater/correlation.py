@@ -0,0 +1,239 @@
+"""
+BRO Grondwater Plugin - Pairwise correlation and lag analysis of level series
+"""
+
+from collections import OrderedDict
+
+import numpy as np
+
+DAY = 86400
+
+# Pairs need at least this many common grid steps to get a correlation
+MIN_OVERLAP = 30
+
+# Rows of the series matrix multiplied at once; bounds the memory of a block
+BLOCK_ROWS = 256
+
+# Number of analyses kept in memory
+CACHE_SIZE = 4
+
+
+def resample(series, step=DAY):
+    """Align series on a common grid of mean values per step.
+
+    ``series`` is {key: (timestamps, values)}. Returns (start, matrix) with
+    one row per key and NaN in steps without measurements.
+    """
+    keys = list(series)
+    lengths = np.array([len(series[k][0]) for k in keys], dtype=np.int64)
+    if not lengths.sum():
+        return 0.0, np.full((len(keys), 0), np.nan)
+
+    times = np.concatenate([series[k][0] for k in keys])
+    values = np.concatenate([series[k][1] for k in keys])
+    start = np.floor(times.min() / step) * step
+    steps = int((times.max() - start) // step) + 1
+
+    # Mean per (series, step) cell with one bincount over flat cell ids
+    rows = np.repeat(np.arange(len(keys)), lengths)
+    cells = rows * steps + ((times - start) // step).astype(np.int64)
+    sums = np.bincount(cells, weights=values, minlength=len(keys) * steps)
+    counts = np.bincount(cells, minlength=len(keys) * steps)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        matrix = (sums / counts).reshape(len(keys), steps)
+    return start, matrix
+
+
+def _moments(x):
+    """Stack [x, x**2, mask] with NaN replaced by 0, for NaN-aware products."""
+    mask = np.isfinite(x)
+    x0 = np.where(mask, x, 0.0)
+    return np.concatenate([x0, x0 * x0, mask.astype(np.float64)])
+
+
+def correlation(x, y=None, min_overlap=MIN_OVERLAP, is_cancelled=None):
+    """Pearson correlation between all rows of x and y over common steps.
+
+    Every pair uses only the steps where both series have a value. All sums
+    come from one matrix product per block of rows, so there is no loop over
+    pairs. Returns (corr, overlap); corr is NaN for pairs with less than
+    ``min_overlap`` common steps.
+    """
+    if y is None:
+        y = x
+    n, m = len(x), len(y)
+    corr = np.full((n, m), np.nan)
+    overlap = np.zeros((n, m), dtype=np.int64)
+    if x.shape[1] == 0:
+        return corr, overlap
+
+    right = _moments(y).T
+    for row in range(0, n, BLOCK_ROWS):
+        if is_cancelled is not None and is_cancelled():
+            return None
+        block = x[row : row + BLOCK_ROWS]
+        b = len(block)
+        # All sums over common steps in one product: blocks of
+        # [x, x**2, mask_x] @ [y, y**2, mask_y].T
+        p = _moments(block) @ right
+        sxy = p[:b, :m]
+        sx = p[:b, 2 * m :]
+        sxx = p[b : 2 * b, 2 * m :]
+        sy = p[2 * b :, :m]
+        syy = p[2 * b :, m : 2 * m]
+        cnt = p[2 * b :, 2 * m :]
+
+        with np.errstate(invalid="ignore", divide="ignore"):
+            cov = cnt * sxy - sx * sy
+            var = (cnt * sxx - sx * sx) * (cnt * syy - sy * sy)
+            r = cov / np.sqrt(var)
+        r[(cnt < min_overlap) | ~(var > 0)] = np.nan
+        corr[row : row + b] = np.clip(r, -1.0, 1.0)
+        overlap[row : row + b] = np.rint(cnt).astype(np.int64)
+    return corr, overlap
+
+
+def lagged_correlation(
+    matrix, max_lag, min_overlap=MIN_OVERLAP, is_cancelled=None, zero_lag=None
+):
+    """Return the strongest correlation over lags and the lag it occurs at.
+
+    ``lag[i, j] = l > 0`` means series j follows series i by l steps.
+    ``zero_lag`` is the correlation without lag, if already computed.
+    """
+    if zero_lag is None:
+        result = correlation(matrix, min_overlap=min_overlap, is_cancelled=is_cancelled)
+        if result is None:
+            return None
+        zero_lag = result[0]
+    best = zero_lag.copy()
+    lag = np.zeros(best.shape, dtype=np.int64)
+    strength = np.nan_to_num(np.abs(best), nan=-1.0)
+
+    for shift in range(1, max_lag + 1):
+        if shift >= matrix.shape[1]:
+            break
+        result = correlation(
+            matrix[:, :-shift], matrix[:, shift:], min_overlap, is_cancelled
+        )
+        if result is None:
+            return None
+        # corr(x_i(t), x_j(t + shift)): j follows i; the transpose is the reverse
+        for r, sign in ((result[0], 1), (result[0].T, -1)):
+            candidate = np.nan_to_num(np.abs(r), nan=-1.0)
+            better = candidate > strength
+            best[better] = r[better]
+            lag[better] = sign * shift
+            strength[better] = candidate[better]
+    return best, lag
+
+
+class CorrelationResult:
+    """Correlation, overlap and lag matrices of a set of series."""
+
+    def __init__(self, keys, labels, corr, overlap, lag_corr=None, lag=None, step=DAY):
+        self.keys = keys
+        self.labels = labels
+        self.corr = corr
+        self.overlap = overlap
+        self.lag_corr = lag_corr
+        self.lag = lag
+        self.step = step
+
+    def __len__(self):
+        return len(self.keys)
+
+    def pairs(self):
+        """Return the pairs with a correlation as arrays (i, j), i < j."""
+        i, j = np.triu_indices(len(self.keys), k=1)
+        valid = np.isfinite(self.corr[i, j])
+        return i[valid], j[valid]
+
+    def order(self):
+        """Return an order of the series that puts similar series together.
+
+        Greedy chain over correlation: start at the series with the most
+        correlated partners and repeatedly append the most correlated
+        remaining series. Used to make clusters visible in the heatmap.
+        """
+        n = len(self.keys)
+        if n < 3:
+            return np.arange(n)
+        similarity = np.nan_to_num(self.corr, nan=-2.0)
+        np.fill_diagonal(similarity, -2.0)
+        remaining = np.ones(n, dtype=bool)
+        current = int(np.argmax((similarity > 0.5).sum(axis=1)))
+        order = [current]
+        remaining[current] = False
+        for _ in range(n - 1):
+            candidates = np.where(remaining, similarity[current], -np.inf)
+            current = int(np.argmax(candidates))
+            order.append(current)
+            remaining[current] = False
+        return np.array(order)
+
+
+def analyze(
+    series,
+    labels,
+    step=DAY,
+    max_lag=0,
+    changes=False,
+    min_overlap=MIN_OVERLAP,
+    is_cancelled=None,
+):
+    """Resample the series and compute their correlation (and lag) matrices.
+
+    With ``changes`` the step to step changes are correlated instead of the
+    levels, so the common seasonal cycle does not dominate and wells that
+    respond to the same pumping or drainage stand out.
+    """
+    keys = list(series)
+    _, matrix = resample(series, step)
+    if changes:
+        matrix = np.diff(matrix, axis=1)
+
+    result = correlation(matrix, min_overlap=min_overlap, is_cancelled=is_cancelled)
+    if result is None:
+        return None
+    corr, overlap = result
+
+    lag_corr = lag = None
+    if max_lag:
+        result = lagged_correlation(matrix, max_lag, min_overlap, is_cancelled, corr)
+        if result is None:
+            return None
+        lag_corr, lag = result
+    return CorrelationResult(keys, [labels[k] for k in keys], corr, overlap, lag_corr, lag, step)
+
+
+def fingerprint(series, **parameters):
+    """Return a cache key for a set of series and analysis parameters."""
+    shape = tuple(
+        (key, len(t), float(t[-1]) if len(t) else None, float(np.sum(v)) if len(v) else None)
+        for key, (t, v) in series.items()
+    )
+    return shape, tuple(sorted(parameters.items()))
+
+
+class CorrelationCache:
+    """Keep the most recent analyses, keyed by ``fingerprint``."""
+
+    def __init__(self, size=CACHE_SIZE):
+        self.size = size
+        self._results = OrderedDict()
+
+    def get(self, key):
+        result = self._results.get(key)
+        if result is not None:
+            self._results.move_to_end(key)
+        return result
+
+    def put(self, key, result):
+        self._results[key] = result
+        self._results.move_to_end(key)
+        while len(self._results) > self.size:
+            self._results.popitem(last=False)
+
+    def clear(self):
+        self._results.clear()
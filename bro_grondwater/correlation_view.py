@@ -0,0 +1,201 @@
+"""
+BRO Grondwater Plugin - Table and heatmap of the correlation between wells
+"""
+
+import numpy as np
+import pyqtgraph as pg
+from qgis.PyQt.QtCore import QAbstractTableModel, QModelIndex, Qt
+from qgis.PyQt.QtWidgets import (
+    QDialog,
+    QHBoxLayout,
+    QLabel,
+    QPushButton,
+    QTableView,
+    QTabWidget,
+    QVBoxLayout,
+)
+
+# Dry (negative) to wet (positive) correlation colours
+HEATMAP_COLORS = [(33, 102, 172), (247, 247, 247), (178, 24, 43)]
+
+
+class PairsTableModel(QAbstractTableModel):
+    """All well pairs of a CorrelationResult, backed by numpy arrays.
+
+    Rows are only formatted when the view asks for them, and sorting is an
+    ``argsort`` of the column, so the table stays responsive with the half a
+    million pairs of 1000 wells.
+    """
+
+    def __init__(self, result, parent=None):
+        super().__init__(parent)
+        self.result = result
+        self.i, self.j = result.pairs()
+        self.columns = ["Well A", "Well B", "Correlation", "Common steps"]
+        self.data_columns = [
+            None,
+            None,
+            result.corr[self.i, self.j],
+            result.overlap[self.i, self.j],
+        ]
+        if result.lag is not None:
+            self.columns += ["Lagged correlation", "Lag (days)"]
+            self.data_columns += [
+                result.lag_corr[self.i, self.j],
+                result.lag[self.i, self.j] * result.step / 86400,
+            ]
+        self.order = np.argsort(-np.abs(self.data_columns[2]), kind="stable")
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.order)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.columns)
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if role == Qt.ItemDataRole.DisplayRole and orientation == Qt.Orientation.Horizontal:
+            return self.columns[section]
+        return None
+
+    def pair(self, row):
+        """Return the indices (i, j) of the series of a table row."""
+        position = self.order[row]
+        return int(self.i[position]), int(self.j[position])
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid() or role != Qt.ItemDataRole.DisplayRole:
+            return None
+        i, j = self.pair(index.row())
+        column = index.column()
+        if column == 0:
+            return self.result.labels[i]
+        if column == 1:
+            return self.result.labels[j]
+        value = self.data_columns[column][self.order[index.row()]]
+        if column == 3:
+            return str(int(value))
+        if column == 5:
+            return f"{value:+g}"
+        return f"{value:.3f}"
+
+    def sort(self, column, order=Qt.SortOrder.AscendingOrder):
+        self.layoutAboutToBeChanged.emit()
+        if column < 2:
+            labels = np.asarray(self.result.labels, dtype=object)
+            values = labels[self.i if column == 0 else self.j]
+        elif column in (2, 4):
+            # Strongest first, whether the wells move together or opposite
+            values = np.abs(self.data_columns[column])
+        else:
+            values = self.data_columns[column]
+        self.order = np.argsort(values, kind="stable")
+        if order == Qt.SortOrder.DescendingOrder:
+            self.order = self.order[::-1]
+        self.layoutChanged.emit()
+
+
+class CorrelationDialog(QDialog):
+    """Sortable pair table and heatmap of a CorrelationResult.
+
+    Double-clicking a pair calls ``on_pair_activated(key_a, key_b)``, used to
+    plot the two series together.
+    """
+
+    def __init__(self, result, title, on_pair_activated=None, parent=None):
+        super().__init__(parent)
+        self.result = result
+        self.on_pair_activated = on_pair_activated
+        self.setWindowTitle(title)
+        self.resize(800, 600)
+
+        layout = QVBoxLayout()
+        tabs = QTabWidget()
+        tabs.addTab(self._create_table(), "Pairs")
+        tabs.addTab(self._create_heatmap(), "Heatmap")
+        layout.addWidget(tabs)
+
+        footer = QHBoxLayout()
+        self.info_label = QLabel(
+            f"{len(result)} wells, {len(self.model.order)} pairs with enough common data"
+        )
+        footer.addWidget(self.info_label, 1)
+        btn_close = QPushButton("Close")
+        btn_close.clicked.connect(self.close)
+        footer.addWidget(btn_close)
+        layout.addLayout(footer)
+        self.setLayout(layout)
+
+    def _create_table(self):
+        self.model = PairsTableModel(self.result, self)
+        view = QTableView()
+        view.setModel(self.model)
+        view.setSortingEnabled(True)
+        view.setSelectionBehavior(QTableView.SelectionBehavior.SelectRows)
+        view.horizontalHeader().setSortIndicator(2, Qt.SortOrder.DescendingOrder)
+        view.doubleClicked.connect(self._on_row_activated)
+        view.setToolTip("Double-click a pair to plot both wells")
+        return view
+
+    def _create_heatmap(self):
+        self.heatmap_order = self.result.order()
+        ordered = self.result.corr[np.ix_(self.heatmap_order, self.heatmap_order)]
+
+        plot_widget = pg.PlotWidget()
+        plot_widget.setBackground("w")
+        plot_widget.setAspectLocked(True)
+        plot_widget.invertY(True)
+        plot_widget.hideAxis("bottom")
+        plot_widget.hideAxis("left")
+
+        image = pg.ImageItem(np.nan_to_num(ordered, nan=0.0).T)
+        colormap = pg.ColorMap([0.0, 0.5, 1.0], HEATMAP_COLORS)
+        image.setLookupTable(colormap.getLookupTable(nPts=256))
+        image.setLevels((-1.0, 1.0))
+        plot_widget.addItem(image)
+
+        self.hover_label = pg.TextItem(color="k", anchor=(0, 1), fill=(255, 255, 255, 200))
+        self.hover_label.setZValue(100)
+        self.hover_label.hide()
+        plot_widget.addItem(self.hover_label, ignoreBounds=True)
+        self._heatmap = (plot_widget, ordered)
+        plot_widget.scene().sigMouseMoved.connect(self._on_heatmap_hover)
+        plot_widget.scene().sigMouseClicked.connect(self._on_heatmap_clicked)
+        plot_widget.setToolTip("Wells are ordered so correlated wells are next to each other")
+        return plot_widget
+
+    def _heatmap_cell(self, scene_pos):
+        plot_widget, ordered = self._heatmap
+        point = plot_widget.getViewBox().mapSceneToView(scene_pos)
+        col, row = int(np.floor(point.x())), int(np.floor(point.y()))
+        if 0 <= row < len(ordered) and 0 <= col < len(ordered):
+            return row, col, point
+        return None
+
+    def _on_heatmap_hover(self, scene_pos):
+        cell = self._heatmap_cell(scene_pos)
+        if cell is None:
+            self.hover_label.hide()
+            return
+        row, col, point = cell
+        value = self._heatmap[1][row, col]
+        a = self.result.labels[self.heatmap_order[row]]
+        b = self.result.labels[self.heatmap_order[col]]
+        text = f"{a} - {b}: " + ("no common data" if np.isnan(value) else f"{value:.3f}")
+        self.hover_label.setText(text)
+        self.hover_label.setPos(point)
+        self.hover_label.show()
+
+    def _on_heatmap_clicked(self, event):
+        if not event.double():
+            return
+        cell = self._heatmap_cell(event.scenePos())
+        if cell is not None:
+            row, col, _ = cell
+            self._activate(self.heatmap_order[row], self.heatmap_order[col])
+
+    def _on_row_activated(self, index):
+        self._activate(*self.model.pair(index.row()))
+
+    def _activate(self, i, j):
+        if self.on_pair_activated is not None and i != j:
+            self.on_pair_activated(self.result.keys[i], self.result.keys[j])
@@ -0,0 +1,118 @@
+"""
+BRO Grondwater Plugin - Journal for crash-safe, resumable download sessions
+"""
+
+import json
+import os
+import shutil
+from datetime import datetime
+
+from .series_store import SeriesStore
+
+JOURNAL_FILE = "journal.jsonl"
+RESULTS_FILE = "results.sqlite"
+
+
+class DownloadJournal:
+    """Record a download session on disk while it progresses.
+
+    The session directory holds an append-only ``journal.jsonl`` with the
+    planned wells and the completed spans, and a ``results.sqlite`` series
+    store with the downloaded measurements. A well can be planned as two
+    spans (before and after a cached period), so completion is recorded per
+    (cache_key, tmin, tmax). Results are committed to the store before their
+    journal line is written, so every completed span can be restored after a
+    crash.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.journal_path = os.path.join(directory, JOURNAL_FILE)
+        self.store = SeriesStore(os.path.join(directory, RESULTS_FILE))
+
+    @classmethod
+    def start(cls, directory, planned_wells):
+        """Start a new session for a list of feature data dicts."""
+        if os.path.exists(directory):
+            shutil.rmtree(directory, ignore_errors=True)
+        os.makedirs(directory, exist_ok=True)
+
+        journal = cls(directory)
+        journal._append(
+            {
+                "type": "plan",
+                "started": datetime.now().isoformat(timespec="seconds"),
+                "wells": planned_wells,
+            }
+        )
+        return journal
+
+    @classmethod
+    def find_unfinished(cls, directory):
+        """Return the journal of an interrupted session, or None."""
+        journal = cls(directory)
+        if not os.path.exists(journal.journal_path):
+            return None
+        if not journal.read()[0]:
+            return None
+        return journal
+
+    def _append(self, record):
+        line = json.dumps(record, default=str) + "\n"
+        with open(self.journal_path, "a", encoding="utf-8") as f:
+            f.write(line)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def read(self):
+        """Return (planned wells, set of completed (cache_key, tmin, tmax) spans)."""
+        planned = []
+        completed = set()
+        with open(self.journal_path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # Last line may be incomplete after a crash
+                    continue
+                if record.get("type") == "plan":
+                    planned.extend(record.get("wells", []))
+                elif record.get("type") == "done":
+                    completed.update(tuple(span) for span in record.get("spans", []))
+        return planned, completed
+
+    def add_planned(self, planned_wells):
+        """Add wells to the plan of a running session."""
+        self._append({"type": "plan", "wells": planned_wells})
+
+    def record_completed(self, measurements, spans):
+        """Store {cache_key: measurement} entries and mark their spans as done.
+
+        ``spans`` are the (cache_key, tmin, tmax) spans the measurements
+        complete; the stored measurement of a key holds all its spans so far.
+        """
+        if not measurements:
+            return
+        self.store.write(measurements)
+        self._append({"type": "done", "spans": [list(span) for span in spans]})
+
+    def load_completed(self):
+        """Return the stored {cache_key: measurement} entries with a completed span."""
+        _, completed = self.read()
+        completed_keys = {cache_key for cache_key, _, _ in completed}
+        measurements = {}
+        for entry in self.store.read_index():
+            cache_key = entry["cache_key"]
+            if cache_key not in completed_keys:
+                continue
+            measurements[cache_key] = {
+                "data": self.store.load(cache_key),
+                "name": entry["name"],
+                "bro_id": entry["bro_id"],
+                "tube_nr": entry["tube_nr"],
+            }
+        return measurements
+
+    def discard(self):
+        """Remove the session from disk."""
+        shutil.rmtree(self.directory, ignore_errors=True)
@@ -0,0 +1,182 @@
+"""
+BRO Grondwater Plugin - Error classification, retries and circuit breaker for downloads
+
+This module does not import QGIS, so tools/load_test.py runs the same
+policy as the plugin.
+"""
+
+import re
+import threading
+import time
+
+# Error kinds
+THROTTLED = "throttled"  # HTTP 429, retry after backing off
+TRANSIENT = "transient"  # Network errors and 5xx responses, retry later
+PERMANENT = "permanent"  # Bad request, unknown well or no data, do not retry
+NO_GMW_ID = "no_gmw_id"  # Feature has no GMW id, cannot be requested at all
+
+RETRYABLE = (THROTTLED, TRANSIENT)
+
+# Attempts per download and the backoff before the first retry (seconds)
+MAX_RETRIES = 3
+BACKOFF = 1.0
+
+_TRANSIENT_PATTERNS = (
+    "timed out",
+    "timeout",
+    "connection",
+    "temporarily unavailable",
+    "max retries exceeded",
+    "remote end closed",
+    "bad gateway",
+    "service unavailable",
+    "gateway time-out",
+    "gateway timeout",
+)
+
+
+def _status_code(error):
+    """Return the HTTP status code carried by an exception, if any."""
+    response = getattr(error, "response", None)
+    status = getattr(response, "status_code", None)
+    if status is None:
+        status = getattr(error, "code", None)
+    if isinstance(status, int):
+        return status
+
+    match = re.search(r"\b([45]\d\d)\b", str(error))
+    return int(match.group(1)) if match else None
+
+
+def classify_error(error):
+    """Classify a download exception (or error message) into an error kind."""
+    if isinstance(error, BaseException):
+        if isinstance(error, (TimeoutError, ConnectionError)):
+            return TRANSIENT
+        text = f"{type(error).__name__}: {error}"
+    else:
+        text = str(error)
+
+    status = _status_code(error)
+    if status == 429 or "too many requests" in text.lower():
+        return THROTTLED
+    if status is not None and status >= 500:
+        return TRANSIENT
+    if status is not None and status >= 400:
+        return PERMANENT
+
+    lowered = text.lower()
+    if any(pattern in lowered for pattern in _TRANSIENT_PATTERNS):
+        return TRANSIENT
+    return PERMANENT
+
+
+class CircuitBreaker:
+    """Pause all download workers while the BRO service is failing.
+
+    After ``threshold`` consecutive throttled/transient failures the breaker
+    opens and workers wait in :meth:`wait` until the cooldown has passed.
+    One worker is then let through as a probe; if it fails again the cooldown
+    doubles (up to ``max_cooldown``), if it succeeds the breaker closes.
+    """
+
+    def __init__(self, threshold=5, cooldown=15.0, max_cooldown=240.0):
+        self.threshold = threshold
+        self.base_cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._cooldown = cooldown
+        self._open_until = 0.0
+        self._probing = False
+
+    @property
+    def is_open(self):
+        with self._lock:
+            return self._open_until > 0
+
+    def seconds_until_retry(self):
+        """Return the remaining pause in seconds (0 when closed)."""
+        with self._lock:
+            if self._open_until == 0:
+                return 0
+            return max(0.0, self._open_until - time.monotonic())
+
+    def wait(self, is_cancelled=None, poll_interval=0.5):
+        """Block until a request may be made. Returns False if cancelled."""
+        while True:
+            if is_cancelled is not None and is_cancelled():
+                return False
+            with self._lock:
+                if self._open_until == 0:
+                    return True
+                if not self._probing and time.monotonic() >= self._open_until:
+                    # Half-open: let a single request probe the service
+                    self._probing = True
+                    return True
+            time.sleep(poll_interval)
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._cooldown = self.base_cooldown
+            self._open_until = 0.0
+            self._probing = False
+
+    def record_failure(self, kind):
+        """Register a failed request; only service-side failures count."""
+        with self._lock:
+            if kind not in RETRYABLE:
+                if self._probing:
+                    # The service answered, so it is up again
+                    self._failures = 0
+                    self._cooldown = self.base_cooldown
+                    self._open_until = 0.0
+                    self._probing = False
+                return
+
+            self._failures += 1
+            if self._probing:
+                self._probing = False
+                self._cooldown = min(self._cooldown * 2, self.max_cooldown)
+                self._open_until = time.monotonic() + self._cooldown
+            elif self._failures >= self.threshold and self._open_until == 0:
+                self._open_until = time.monotonic() + self._cooldown
+
+
+def fetch_with_retries(
+    fetch, breaker, max_retries=MAX_RETRIES, backoff=BACKOFF, is_cancelled=None, on_attempt=None
+):
+    """Call ``fetch()`` with retries, exponential backoff and the circuit breaker.
+
+    Every attempt first waits for ``breaker``. Throttled and transient errors
+    are retried after ``backoff * 2**attempt`` seconds, up to ``max_retries``
+    attempts in total. ``on_attempt(waited, seconds, error_kind)`` is called
+    after each attempt, with error_kind None on success. Returns (result,
+    None, None) on success and (None, message, error_kind) on failure or
+    cancellation.
+    """
+    for attempt in range(max_retries):
+        # Pause here while the circuit breaker is open (BRO outage)
+        waited = time.perf_counter()
+        if not breaker.wait(is_cancelled):
+            return None, "Cancelled", TRANSIENT
+        waited = time.perf_counter() - waited
+
+        start = time.perf_counter()
+        try:
+            result = fetch()
+        except Exception as e:
+            error_kind = classify_error(e)
+            breaker.record_failure(error_kind)
+            if on_attempt is not None:
+                on_attempt(waited, time.perf_counter() - start, error_kind)
+            if error_kind in RETRYABLE and attempt < max_retries - 1:
+                time.sleep(backoff * 2**attempt)
+                continue
+            return None, str(e), error_kind
+
+        breaker.record_success()
+        if on_attempt is not None:
+            on_attempt(waited, time.perf_counter() - start, None)
+        return result, None, None
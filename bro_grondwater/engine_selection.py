@@ -0,0 +1,306 @@
+"""
+BRO Grondwater Plugin - Engine selection and benchmarking for hpd.read_bro
+"""
+
+import base64
+import bisect
+import hashlib
+import importlib.util
+import inspect
+import io
+import json
+import multiprocessing
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+BRODATA_ENGINE = "brodata"
+DEFAULT_ENGINE = "default"
+
+# Engines in order of preference when nothing has been measured yet
+ENGINE_PREFERENCE = (BRODATA_ENGINE, DEFAULT_ENGINE)
+
+# One in this many retrievals of a bucket uses the engine with the fewest live
+# timings, so live comparisons do not stay limited to the preferred engine
+EXPLORE_EVERY = 10
+
+# Upper bounds (km2) of the extent size buckets timings are kept for
+AREA_BUCKETS_KM2 = (1, 10, 100, 1000)
+
+
+def detect_engines(read_bro):
+    """Return the engines the installed hydropandas supports.
+
+    Returns None if it cannot be told from the signature, in which case the
+    first retrieval finds out.
+    """
+    try:
+        parameters = inspect.signature(read_bro).parameters
+    except (TypeError, ValueError):
+        return None
+
+    if "engine" in parameters:
+        if importlib.util.find_spec("brodata") is None:
+            return [DEFAULT_ENGINE]
+        return list(ENGINE_PREFERENCE)
+    if any(p.kind == inspect.Parameter.VAR_KEYWORD for p in parameters.values()):
+        return None
+    return [DEFAULT_ENGINE]
+
+
+def engine_kwargs(engine):
+    """Return the keyword arguments selecting ``engine`` in hpd.read_bro."""
+    return {} if engine == DEFAULT_ENGINE else {"engine": engine}
+
+
+def _bucket_labels():
+    labels = []
+    lower = 0
+    for upper in AREA_BUCKETS_KM2:
+        labels.append(f"{lower}-{upper} km2")
+        lower = upper
+    labels.append(f">{lower} km2")
+    return labels
+
+
+BUCKET_LABELS = _bucket_labels()
+
+
+def workload_bucket(extent):
+    """Return the size bucket label for an RD extent (xmin, xmax, ymin, ymax)."""
+    xmin, xmax, ymin, ymax = extent
+    area_km2 = (xmax - xmin) * (ymax - ymin) / 1e6
+    return BUCKET_LABELS[bisect.bisect_right(AREA_BUCKETS_KM2, area_km2)]
+
+
+class EnginePolicy:
+    """Pick the fastest measured engine per extent size bucket.
+
+    ``timings`` (live retrievals, including the network) and ``benchmarks``
+    (parsing recorded responses) both map bucket -> engine -> [runs, mean
+    seconds]. They are never mixed: engines are compared on live timings
+    when all have them, otherwise on benchmark timings. Buckets without
+    measurements for an engine borrow them from the nearest measured bucket;
+    without any measurements the engine preference order applies.
+
+    Every ``EXPLORE_EVERY``-th choice in a bucket goes to the engine with the
+    fewest live runs there instead, so each engine keeps getting live timings.
+    """
+
+    def __init__(self, engines, timings=None, benchmarks=None):
+        self.engines = list(engines)
+        self.timings = timings or {}
+        self.benchmarks = benchmarks or {}
+        self._choices = {}
+
+    def _mean(self, series, bucket, engine):
+        if bucket not in BUCKET_LABELS:
+            return None
+        position = BUCKET_LABELS.index(bucket)
+        nearest_first = sorted(
+            range(len(BUCKET_LABELS)), key=lambda i: abs(i - position)
+        )
+        for i in nearest_first:
+            entry = series.get(BUCKET_LABELS[i], {}).get(engine)
+            if entry:
+                return entry[1]
+        return None
+
+    def choose(self, bucket):
+        """Return the engine to use for a retrieval in a workload bucket."""
+        fastest = self.fastest(bucket)
+        count = self._choices[bucket] = self._choices.get(bucket, 0) + 1
+        if len(self.engines) > 1 and count % EXPLORE_EVERY == 0:
+            others = [e for e in self.engines if e != fastest]
+            return min(others, key=lambda e: self._runs(bucket, e))
+        return fastest
+
+    def _runs(self, bucket, engine):
+        entry = self.timings.get(bucket, {}).get(engine)
+        return entry[0] if entry else 0
+
+    def fastest(self, bucket):
+        """Return the engine measured (or preferred) to be fastest for a bucket."""
+        for series in (self.timings, self.benchmarks):
+            means = {e: self._mean(series, bucket, e) for e in self.engines}
+            measured = {e: m for e, m in means.items() if m is not None}
+            if len(measured) == len(self.engines) and measured:
+                return min(measured, key=measured.get)
+        for engine in ENGINE_PREFERENCE:
+            if engine in self.engines:
+                return engine
+        return self.engines[0] if self.engines else DEFAULT_ENGINE
+
+    def record(self, bucket, engine, seconds, benchmark=False):
+        """Add a live (or benchmark) timing to its running mean; returns (runs, mean)."""
+        series = self.benchmarks if benchmark else self.timings
+        runs, mean = series.setdefault(bucket, {}).get(engine, (0, 0.0))
+        runs += 1
+        mean += (seconds - mean) / runs
+        series[bucket][engine] = [runs, mean]
+        return runs, mean
+
+
+# Fixture directory replayed by recorded_responses
+_patch_lock = threading.Lock()
+_patch_users = 0
+_fixture_dir = None
+_original_send = None
+
+
+def _fixture_path(fixture_dir, request):
+    body = request.body or b""
+    if isinstance(body, str):
+        body = body.encode("utf-8")
+    digest = hashlib.sha1(
+        request.method.encode("utf-8") + request.url.encode("utf-8") + body
+    ).hexdigest()
+    return os.path.join(fixture_dir, f"{digest}.json")
+
+
+def _replaying_send(adapter, request, **kwargs):
+    """HTTPAdapter.send that replays (or records) fixtures."""
+    import requests
+    from requests.structures import CaseInsensitiveDict
+    from requests.utils import get_encoding_from_headers
+
+    path = _fixture_path(_fixture_dir, request)
+    if not os.path.exists(path):
+        response = _original_send(adapter, request, **kwargs)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "url": request.url,
+                    "status": response.status_code,
+                    "reason": response.reason,
+                    "headers": dict(response.headers),
+                    "content": base64.b64encode(response.content).decode("ascii"),
+                },
+                f,
+            )
+        # Reading the content drained the stream; hand streaming readers a copy
+        response.raw = io.BytesIO(response.content)
+        return response
+
+    with open(path, encoding="utf-8") as f:
+        fixture = json.load(f)
+    response = requests.Response()
+    response.status_code = fixture["status"]
+    response.reason = fixture["reason"]
+    response.headers = CaseInsensitiveDict(fixture["headers"])
+    # The stored content is already decoded
+    response.headers.pop("Content-Encoding", None)
+    response._content = base64.b64decode(fixture["content"])
+    response.raw = io.BytesIO(response._content)
+    response.encoding = get_encoding_from_headers(response.headers)
+    response.url = fixture["url"]
+    response.request = request
+    return response
+
+
+@contextmanager
+def recorded_responses(fixture_dir):
+    """Serve HTTP responses from ``fixture_dir``, recording any that are missing.
+
+    Patches the requests transport adapter for the whole process, so
+    requests from any thread are replayed, including engines that fetch on
+    worker threads of their own. Run it in a separate process (see
+    :func:`benchmark_engines`) when other downloads are going on.
+    """
+    global _fixture_dir, _original_send, _patch_users
+    from requests.adapters import HTTPAdapter
+
+    fixture_dir = os.path.abspath(fixture_dir)
+    os.makedirs(fixture_dir, exist_ok=True)
+    with _patch_lock:
+        if _patch_users and fixture_dir != _fixture_dir:
+            raise RuntimeError(f"Already replaying responses from {_fixture_dir}")
+        if _patch_users == 0:
+            _original_send = HTTPAdapter.send
+            _fixture_dir = fixture_dir
+            HTTPAdapter.send = _replaying_send
+        _patch_users += 1
+    try:
+        yield
+    finally:
+        with _patch_lock:
+            _patch_users -= 1
+            if _patch_users == 0:
+                HTTPAdapter.send = _original_send
+                _fixture_dir = None
+
+
+def _time_engine(read_bro, extent, engine, fixture_dir, repeats):
+    """Return ``repeats`` timings of one engine on recorded responses, or None."""
+    kwargs = engine_kwargs(engine)
+    with recorded_responses(fixture_dir):
+        try:
+            # Records the responses the timed runs replay
+            read_bro(extent=extent, tmin=None, tmax=None, only_metadata=True, **kwargs)
+        except Exception:
+            return None
+
+        timings = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            read_bro(extent=extent, tmin=None, tmax=None, only_metadata=True, **kwargs)
+            timings.append(time.perf_counter() - start)
+    return timings
+
+
+def _time_hydropandas_engine(extent, engine, fixture_dir, repeats):
+    """Time hpd.read_bro for one engine (runs in the benchmark process)."""
+    import hydropandas as hpd
+
+    return _time_engine(hpd.read_bro, extent, engine, fixture_dir, repeats)
+
+
+def benchmark_engines(extent, engines, fixture_dir, repeats=3, is_cancelled=None):
+    """Time hpd.read_bro for each engine on recorded responses for an extent.
+
+    The first run of each engine records the responses it needs; the timed
+    runs replay them. The engines run in a separate Python process, where
+    the replay covers every thread and downloads in this process are left
+    alone. Without a usable interpreter they run in this process instead.
+    Returns {engine: [seconds, ...]} and skips engines that fail.
+    """
+    from concurrent.futures import ProcessPoolExecutor
+    from concurrent.futures.process import BrokenProcessPool
+
+    from .excel_export import python_executable
+
+    def cancelled():
+        return is_cancelled is not None and is_cancelled()
+
+    results = {}
+    executable = python_executable()
+    if executable is not None:
+        context = multiprocessing.get_context("spawn")
+        context.set_executable(executable)
+        try:
+            with ProcessPoolExecutor(1, mp_context=context) as pool:
+                for engine in engines:
+                    if cancelled():
+                        return results
+                    timings = pool.submit(
+                        _time_hydropandas_engine, extent, engine, fixture_dir, repeats
+                    ).result()
+                    if timings is not None:
+                        results[engine] = timings
+            return results
+        except (BrokenProcessPool, OSError):
+            # The process could not be started (or died): time the rest here
+            pass
+
+    import hydropandas as hpd
+
+    for engine in engines:
+        if engine in results:
+            continue
+        if cancelled():
+            return results
+        timings = _time_engine(hpd.read_bro, extent, engine, fixture_dir, repeats)
+        if timings is not None:
+            results[engine] = timings
+    return results
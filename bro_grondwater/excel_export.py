@@ -0,0 +1,417 @@
+"""
+BRO Grondwater Plugin - Excel export split over several workbooks
+
+A worksheet holds at most 1,048,576 rows and an Excel chart at most 255
+series, and workbooks with a few hundred series in one chart hardly open.
+Large exports are therefore planned as shards: groups of at most
+``max_series`` wells, each split further by time range when the common
+timestamps do not fit on one sheet. Every shard is a complete workbook with
+its own metadata, chart data and chart, written in a separate process.
+
+This module does not import QGIS, so it can be imported in the worker
+processes.
+"""
+
+import math
+import multiprocessing
+import os
+import re
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+
+# Data rows on the "Chart Data" sheet: Excel's row limit minus the header
+MAX_ROWS = 1048576 - 1
+
+# Series per workbook; Excel charts take at most 255
+MAX_SERIES = 100
+
+# Rows of the chart data table built at once
+TABLE_BLOCK_ROWS = 16384
+
+# Worker processes used for writing shards
+MAX_WORKERS = 4
+
+EXCEL_EPOCH = np.datetime64("1899-12-30T00:00:00", "s")
+
+METADATA_HEADERS = [
+    "GMW ID",
+    "Name",
+    "BRO ID",
+    "Tube Nr",
+    "X (RD)",
+    "Y (RD)",
+    "Surface Level (m NAP)",
+    "Filter Top (m NAP)",
+    "Filter Bottom (m NAP)",
+    "Tube Top (m NAP)",
+    "Source",
+    "Unit",
+    "Measurements Count",
+]
+
+CREDITS_TEXT = [
+    'Data retrieved with the QGIS plugin "BRO Grondwater"',
+    "Date of retrieval: {retrieval_date}",
+    "",
+    "Developed by: CWG Ingenieurs b.v. (https://www.cwgi.nl)",
+    "Powered by the Python packages Hydropandas and Brodata",
+    "Data source: BRO (Basisregistratie Ondergrond)",
+    "",
+    "DISCLAIMER",
+    'This software is provided "as is", without warranty of any kind, express or implied,',
+    "including but not limited to the warranties of merchantability, fitness for a particular",
+    "purpose and noninfringement. In no event shall the authors or copyright holders be liable",
+    "for any claim, damages or other liability, whether in an action of contract, tort or otherwise,",
+    "arising from, out of or in connection with the software or the use or other dealings in the software.",
+]
+
+
+def excel_times(dates):
+    """Convert ISO date strings to Excel serial day numbers.
+
+    The local wall-clock time of the strings is kept (a UTC offset is
+    dropped), as Excel has no time zones.
+    """
+    moments = np.array([d[:19] for d in dates], dtype="datetime64[s]").reshape(-1)
+    return (moments - EXCEL_EPOCH) / np.timedelta64(86400, "s")
+
+
+def excel_wells(measurements, load):
+    """Collect metadata and series of the downloaded wells for the export.
+
+    ``measurements`` is a list of (cache_key, measurement) with ``name``,
+    ``bro_id`` and ``tube_nr``; ``load(cache_key)`` returns the series data.
+    """
+    wells = []
+    for cache_key, measurement in measurements:
+        series_data = load(cache_key) or {}
+        metadata = series_data.get("metadata", {})
+        name = measurement["name"]
+        bro_id = measurement["bro_id"]
+        gmw_match = re.search(r"GMW\d+", str(name) + str(bro_id))
+        gmw_id = gmw_match.group(0) if gmw_match else bro_id
+
+        dates = series_data.get("dates") or []
+        values = series_data.get("values") or []
+        if not (dates and values):
+            dates, values = [], []
+        wells.append(
+            {
+                "gmw_id": gmw_id,
+                # Use name as identifier, fall back to GMW ID
+                "series_name": (name if name else gmw_id)[:31],
+                "times": excel_times(dates),
+                "values": np.asarray(values, dtype=np.float64),
+                "metadata": {
+                    "GMW ID": gmw_id,
+                    "Name": name,
+                    "BRO ID": bro_id,
+                    "Tube Nr": metadata.get("tube_nr", measurement["tube_nr"]),
+                    "X (RD)": metadata.get("x"),
+                    "Y (RD)": metadata.get("y"),
+                    "Surface Level (m NAP)": metadata.get("ground_level"),
+                    "Filter Top (m NAP)": metadata.get("screen_top"),
+                    "Filter Bottom (m NAP)": metadata.get("screen_bottom"),
+                    "Tube Top (m NAP)": metadata.get("tube_top"),
+                    "Source": metadata.get("source", "BRO"),
+                    "Unit": metadata.get("unit", "m NAP"),
+                    "Measurements Count": len(series_data.get("dates", [])),
+                },
+            }
+        )
+    return wells
+
+
+class Shard:
+    """One workbook of an export: a group of wells within a time range."""
+
+    def __init__(self, wells, start=None, end=None, rows=0):
+        self.wells = wells  # Indices into the list of wells
+        self.start = start  # Excel serial, inclusive; None = unbounded
+        self.end = end  # Excel serial, exclusive; None = unbounded
+        self.rows = rows
+
+    def __repr__(self):
+        return f"Shard({len(self.wells)} wells, {self.start}-{self.end}, {self.rows} rows)"
+
+
+def _well_groups(wells, max_series):
+    """Split the wells in order into groups of at most ``max_series``.
+
+    The tubes of one GMW stay in the same group unless the GMW alone has
+    more than ``max_series`` tubes.
+    """
+    groups = []
+    current = []
+    i = 0
+    while i < len(wells):
+        j = i
+        while j < len(wells) and wells[j]["gmw_id"] == wells[i]["gmw_id"]:
+            j += 1
+        gmw = list(range(i, j))
+        if current and len(current) + len(gmw) > max_series:
+            groups.append(current)
+            current = []
+        while len(gmw) > max_series:
+            groups.append(gmw[:max_series])
+            gmw = gmw[max_series:]
+        current += gmw
+        i = j
+    if current:
+        groups.append(current)
+    return groups
+
+
+def plan_shards(wells, max_series=MAX_SERIES, max_rows=MAX_ROWS):
+    """Plan the workbooks of an export.
+
+    ``wells`` is a list of dicts with ``gmw_id`` and ``times`` (Excel
+    serials). Wells are grouped by ``max_series``; a group whose distinct
+    timestamps exceed ``max_rows`` is split into consecutive time ranges of
+    at most ``max_rows`` rows. Returns a list of Shard.
+    """
+    shards = []
+    for group in _well_groups(wells, max_series):
+        times = [wells[i]["times"] for i in group]
+        common = np.unique(np.concatenate(times)) if times else np.empty(0)
+        if len(common) <= max_rows:
+            shards.append(Shard(group, rows=len(common)))
+            continue
+        for first in range(0, len(common), max_rows):
+            last = first + max_rows
+            start = float(common[first]) if first else None
+            end = float(common[last]) if last < len(common) else None
+            shards.append(Shard(group, start, end, min(max_rows, len(common) - first)))
+    return shards
+
+
+def shard_paths(file_path, count):
+    """Return the file names of ``count`` shards: the chosen name if only one."""
+    if count == 1:
+        return [file_path]
+    base, extension = os.path.splitext(file_path)
+    digits = len(str(count))
+    return [f"{base}_{i:0{digits}d}{extension}" for i in range(1, count + 1)]
+
+
+def shard_jobs(wells, shards, paths, retrieval_date):
+    """Return the arguments of ``write_workbook`` per shard.
+
+    Only the data of the shard is included, so little is sent to a worker.
+    """
+    jobs = []
+    for number, (shard, path) in enumerate(zip(shards, paths), 1):
+        shard_wells = []
+        for i in shard.wells:
+            well = wells[i]
+            times, values = well["times"], well["values"]
+            if shard.start is not None or shard.end is not None:
+                keep = np.ones(len(times), dtype=bool)
+                if shard.start is not None:
+                    keep &= times >= shard.start
+                if shard.end is not None:
+                    keep &= times < shard.end
+                times, values = times[keep], values[keep]
+                metadata = dict(well["metadata"], **{"Measurements Count": len(times)})
+                well = dict(well, metadata=metadata)
+            shard_wells.append(dict(well, times=times, values=values))
+        if len(shards) > 1:
+            title = f"Grondwaterstand ({number}/{len(shards)})"
+        else:
+            title = "Grondwaterstand"
+        jobs.append((path, shard_wells, title, retrieval_date))
+    return jobs
+
+
+def _write_metadata(workbook, wells, header_format):
+    meta_ws = workbook.add_worksheet("Metadata")
+    # Track max width for each column (start with header lengths)
+    col_widths = [len(header) for header in METADATA_HEADERS]
+    rows = [
+        [well["metadata"].get(header) for header in METADATA_HEADERS] for well in wells
+    ]
+    for row in rows:
+        for col, value in enumerate(row):
+            if value is not None:
+                col_widths[col] = max(col_widths[col], len(str(value)))
+    # Widths are set first: constant memory mode writes rows in order
+    for col, width in enumerate(col_widths):
+        meta_ws.set_column(col, col, min(width + 2, 50))
+
+    meta_ws.write_row(0, 0, METADATA_HEADERS, header_format)
+    for row, values in enumerate(rows, 1):
+        for col, value in enumerate(values):
+            # Skip NaN values to avoid #GETAL errors in Dutch Excel
+            if value is not None and not (isinstance(value, float) and math.isnan(value)):
+                meta_ws.write(row, col, value)
+
+
+def _write_chart(workbook, wells, title, header_format, date_format):
+    """Write the common timestamps and the series side by side, and chart them."""
+    series = [w for w in wells if len(w["times"])]
+    if not series:
+        return
+    common = np.unique(np.concatenate([w["times"] for w in series]))
+    ordered = []
+    for well in series:
+        order = np.argsort(well["times"], kind="stable")
+        ordered.append((well["times"][order], well["values"][order]))
+
+    data_ws = workbook.add_worksheet("Chart Data")
+    data_ws.set_column(0, 0, 20)
+    # Set data column widths based on header length (names can be long)
+    for col, well in enumerate(series, 1):
+        data_ws.set_column(col, col, max(len(well["series_name"]) + 2, 18))
+    data_ws.write_row(0, 0, ["datetime"] + [w["series_name"] for w in series], header_format)
+
+    # The table of rows x series is filled block by block to bound memory;
+    # empty cells are skipped, so the chart spans the gaps
+    for first in range(0, len(common), TABLE_BLOCK_ROWS):
+        block = common[first : first + TABLE_BLOCK_ROWS]
+        table = np.full((len(block), len(series)), np.nan)
+        for col, (times, values) in enumerate(ordered):
+            lo = np.searchsorted(times, block[0], side="left")
+            hi = np.searchsorted(times, block[-1], side="right")
+            table[np.searchsorted(block, times[lo:hi]), col] = values[lo:hi]
+        filled = ~np.isnan(table)
+        for row, (moment, values, mask) in enumerate(
+            zip(block.tolist(), table.tolist(), filled.tolist()), first + 1
+        ):
+            data_ws.write_number(row, 0, moment, date_format)
+            for col, (value, present) in enumerate(zip(values, mask), 1):
+                if present:
+                    data_ws.write_number(row, col, value)
+
+    # Create chart with show_blanks_as='span' to connect across gaps
+    chart = workbook.add_chart({"type": "line"})
+    chart.show_blanks_as("span")
+    num_rows = len(common)
+    for col in range(1, len(series) + 1):
+        chart.add_series(
+            {
+                "name": ["Chart Data", 0, col],
+                "categories": ["Chart Data", 1, 0, num_rows, 0],
+                "values": ["Chart Data", 1, col, num_rows, col],
+            }
+        )
+
+    # Style the chart (Dutch labels)
+    chart.set_title({"name": title})
+    chart.set_x_axis(
+        {
+            "name": "Datum",
+            "date_axis": True,
+            "label_position": "low",  # Labels at bottom of plot area
+            "num_format": "dd-mm-yyyy",
+        }
+    )
+    chart.set_y_axis(
+        {
+            "name": "Stijghoogte (m NAP)",
+            "crossing": "min",  # X-axis crosses at y-minimum, not at y=0
+        }
+    )
+    chart.set_legend({"position": "bottom"})
+    chart.set_size({"width": 800, "height": 480})
+
+    chart_ws = workbook.add_chartsheet("Chart")
+    chart_ws.set_chart(chart)
+
+
+def write_workbook(path, wells, title, retrieval_date):
+    """Write one workbook with metadata, chart data, chart and credits.
+
+    ``wells`` are dicts with ``metadata`` (METADATA_HEADERS keys),
+    ``series_name``, ``times`` (Excel serials) and ``values``. Returns the
+    path.
+    """
+    import xlsxwriter
+
+    # Constant memory: rows are flushed to disk as they are written
+    workbook = xlsxwriter.Workbook(path, {"constant_memory": True})
+    try:
+        header_format = workbook.add_format({"bold": True, "bg_color": "#D9E1F2"})
+        date_format = workbook.add_format({"num_format": "yyyy-mm-dd hh:mm:ss"})
+        _write_metadata(workbook, wells, header_format)
+        _write_chart(workbook, wells, title, header_format, date_format)
+
+        credits_ws = workbook.add_worksheet("Credits & Disclaimer")
+        credits_ws.set_column(0, 0, 80)
+        for row, text in enumerate(CREDITS_TEXT):
+            credits_ws.write(row, 0, text.format(retrieval_date=retrieval_date))
+    finally:
+        workbook.close()
+    return path
+
+
+def python_executable():
+    """Return the Python interpreter for worker processes, or None.
+
+    Inside QGIS ``sys.executable`` is often the QGIS program itself, which
+    cannot run a worker; look for the interpreter next to the library.
+    """
+    if os.path.basename(sys.executable).lower().startswith("python"):
+        return sys.executable
+    names = ["pythonw.exe", "python.exe"] if sys.platform == "win32" else ["python3", "python"]
+    for folder in (sys.exec_prefix, os.path.join(sys.exec_prefix, "bin")):
+        for name in names:
+            candidate = os.path.join(folder, name)
+            if os.path.isfile(candidate):
+                return candidate
+    return None
+
+
+def write_shards(jobs, progress=None, is_cancelled=None, max_workers=MAX_WORKERS):
+    """Write the workbooks of ``shard_jobs`` in parallel worker processes.
+
+    Falls back to writing them one by one in this thread when there is a
+    single shard, a single CPU, or no worker process can be started.
+    Returns the written paths, or None if cancelled.
+    """
+    written = []
+
+    def report():
+        if progress is not None:
+            progress(100.0 * len(written) / len(jobs))
+
+    workers = min(max_workers, len(jobs), os.cpu_count() or 1)
+    executable = python_executable() if workers > 1 else None
+    if executable is not None:
+        context = multiprocessing.get_context("spawn")
+        context.set_executable(executable)
+        cancelled = False
+        try:
+            with ProcessPoolExecutor(workers, mp_context=context) as pool:
+                futures = [pool.submit(write_workbook, *job) for job in jobs]
+                for future in as_completed(futures):
+                    if is_cancelled is not None and is_cancelled():
+                        cancelled = True
+                        pool.shutdown(wait=True, cancel_futures=True)
+                        break
+                    written.append(future.result())
+                    report()
+        except (BrokenProcessPool, OSError):
+            # Workers could not be started (or died): write the rest here
+            pass
+        else:
+            if not cancelled:
+                return sorted(written)
+            # Remove the shards finished before the workers stopped
+            for future in futures:
+                if future.done() and not future.cancelled() and future.exception() is None:
+                    os.remove(future.result())
+            return None
+
+    for job in jobs:
+        if job[0] in written:
+            continue
+        if is_cancelled is not None and is_cancelled():
+            for path in written:
+                os.remove(path)
+            return None
+        written.append(write_workbook(*job))
+        report()
+    return sorted(written)
@@ -0,0 +1,334 @@
+"""
+BRO Grondwater Plugin - Streaming parser for BRO GLD (groundwater level) documents
+
+Reads WaterML 2.0 measurement points from a GLD response incrementally and
+writes them straight into numpy arrays, so memory stays bounded by the
+arrays rather than the document tree.
+"""
+
+import math
+from datetime import datetime, timezone
+import xml.etree.ElementTree as ET
+
+import numpy as np
+
+DEFAULT_BASE_URL = "https://publiek.broservices.nl"
+
+# Initial capacity of the measurement buffers; they double when full
+INITIAL_CAPACITY = 4096
+
+REQUEST_TIMEOUT = 60
+
+# Stored series use hydropandas' time base: naive Dutch winter time (UTC+1)
+WINTERTIME_OFFSET = 3600
+
+
+def _local_name(tag):
+    return tag.rsplit("}", 1)[-1]
+
+
+def _parse_time(text):
+    """Return seconds since the epoch (UTC) for an ISO 8601 timestamp."""
+    text = text.strip()
+    if text.endswith("Z"):
+        text = text[:-1] + "+00:00"
+    moment = datetime.fromisoformat(text)
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return int(moment.timestamp())
+
+
+def _parse_value(element):
+    text = (element.text or "").strip() if element is not None else ""
+    if not text:
+        return math.nan
+    try:
+        return float(text)
+    except ValueError:
+        return math.nan
+
+
+class GLDSeries:
+    """Measurements of one tube: UTC epoch seconds, values and quality labels.
+
+    ``qualifiers`` holds an index into ``qualifier_labels`` per measurement.
+    """
+
+    def __init__(self, times, values, qualifiers, qualifier_labels):
+        self.times = times
+        self.values = values
+        self.qualifiers = qualifiers
+        self.qualifier_labels = qualifier_labels
+
+    def __len__(self):
+        return len(self.times)
+
+    def wintertimes(self):
+        """Return the timestamps as epoch seconds of Dutch winter time (UTC+1)."""
+        return self.times + WINTERTIME_OFFSET
+
+    def iso_dates(self):
+        """Return the timestamps as naive ISO strings in Dutch winter time.
+
+        This matches the series read by hydropandas (``to_wintertime=True``),
+        so series from both readers can be merged and cached together.
+        """
+        return np.datetime_as_string(self.wintertimes().astype("datetime64[s]"), unit="s")
+
+    @classmethod
+    def concatenate(cls, parts):
+        """Combine series (e.g. several GLDs of one tube), sorted by time.
+
+        Of measurements sharing a timestamp the first one is kept, as
+        hydropandas does.
+        """
+        parts = [p for p in parts if len(p)]
+        if not parts:
+            return cls.empty()
+
+        labels = []
+        codes = []
+        for part in parts:
+            mapping = np.array(
+                [_label_code(labels, label) for label in part.qualifier_labels] or [0],
+                dtype=np.uint8,
+            )
+            codes.append(mapping[part.qualifiers])
+
+        times = np.concatenate([p.times for p in parts])
+        values = np.concatenate([p.values for p in parts])
+        qualifiers = np.concatenate(codes)
+
+        # A stable sort keeps the first occurrence of a time first
+        order = np.argsort(times, kind="stable")
+        times = times[order]
+        keep = np.ones(len(times), dtype=bool)
+        keep[1:] = times[1:] != times[:-1]
+        return cls(times[keep], values[order][keep], qualifiers[order][keep], labels)
+
+    @classmethod
+    def empty(cls):
+        return cls(
+            np.zeros(0, dtype=np.int64),
+            np.zeros(0, dtype=np.float64),
+            np.zeros(0, dtype=np.uint8),
+            [],
+        )
+
+
+def _label_code(labels, label):
+    if label not in labels:
+        labels.append(label)
+    return labels.index(label)
+
+
+class _Buffers:
+    """Growable numpy buffers for measurement points."""
+
+    def __init__(self, capacity=INITIAL_CAPACITY):
+        self.size = 0
+        self.times = np.empty(capacity, dtype=np.int64)
+        self.values = np.empty(capacity, dtype=np.float64)
+        self.qualifiers = np.empty(capacity, dtype=np.uint8)
+        self.labels = []
+        self._codes = {}
+
+    def append(self, time, value, qualifier):
+        if self.size == len(self.times):
+            capacity = 2 * len(self.times)
+            self.times = np.resize(self.times, capacity)
+            self.values = np.resize(self.values, capacity)
+            self.qualifiers = np.resize(self.qualifiers, capacity)
+        self.times[self.size] = time
+        self.values[self.size] = value
+        code = self._codes.get(qualifier)
+        if code is None:
+            code = self._codes[qualifier] = _label_code(self.labels, qualifier)
+        self.qualifiers[self.size] = code
+        self.size += 1
+
+    def series(self):
+        n = self.size
+        return GLDSeries(
+            self.times[:n].copy(),
+            self.values[:n].copy(),
+            self.qualifiers[:n].copy(),
+            self.labels,
+        )
+
+
+def parse_gld(source):
+    """Parse a GLD document from a file path or binary file object.
+
+    Measurement points are read as their elements complete; finished points
+    are dropped from the tree in batches, so memory does not grow with the
+    document. Returns a :class:`GLDSeries` sorted by time.
+    """
+    buffers = _Buffers()
+    local_names = {}
+    series_element = None
+    time_text = value = None
+    qualifier = ""
+    in_category = False
+    pending = 0
+
+    for event, element in ET.iterparse(source, events=("start", "end")):
+        tag = element.tag
+        name = local_names.get(tag)
+        if name is None:
+            name = local_names[tag] = _local_name(tag)
+
+        if event == "start":
+            if name == "MeasurementTimeseries":
+                series_element = element
+            elif name == "Category":
+                in_category = True
+            continue
+
+        if name == "time":
+            time_text = element.text
+        elif name == "value":
+            if in_category:
+                # Quality qualifier, e.g. goedgekeurd / afgekeurd / onbeslist
+                qualifier = (element.text or "").strip()
+            elif value is None:
+                value = _parse_value(element)
+        elif name == "Category":
+            in_category = False
+        elif name == "point":
+            if time_text:
+                buffers.append(
+                    _parse_time(time_text),
+                    math.nan if value is None else value,
+                    qualifier,
+                )
+            time_text = value = None
+            qualifier = ""
+
+            # Drop finished points so the tree does not grow with the document
+            element.clear()
+            pending += 1
+            if series_element is not None and pending >= 1000:
+                del series_element[:]
+                pending = 0
+
+    return GLDSeries.concatenate([buffers.series()])
+
+
+def gld_ids_per_tube(gmw_id, base_url=DEFAULT_BASE_URL, session=None):
+    """Return {tube_nr: [gld_id, ...]} from the BRO gmw-relations service."""
+    import requests
+
+    http = session or requests
+    response = http.get(
+        f"{base_url.rstrip('/')}/gm/v1/gmw-relations/{gmw_id}", timeout=REQUEST_TIMEOUT
+    )
+    response.raise_for_status()
+
+    tubes = {}
+    for tube in response.json().get("monitoringTubeReferences", []):
+        gld_ids = [ref["broId"] for ref in tube.get("gldReferences", []) if ref.get("broId")]
+        tubes[int(tube["tubeNumber"])] = gld_ids
+    return tubes
+
+
+def fetch_gld(gld_id, tmin=None, tmax=None, base_url=DEFAULT_BASE_URL, session=None):
+    """Download and stream-parse one GLD document for an optional period."""
+    import requests
+
+    params = {}
+    if tmin is not None:
+        params["observationPeriodBeginDate"] = tmin
+    if tmax is not None:
+        params["observationPeriodEndDate"] = tmax
+
+    http = session or requests
+    response = http.get(
+        f"{base_url.rstrip('/')}/gm/gld/v1/objects/{gld_id}",
+        params=params,
+        stream=True,
+        timeout=REQUEST_TIMEOUT,
+    )
+    try:
+        response.raise_for_status()
+        response.raw.decode_content = True
+        return parse_gld(response.raw)
+    finally:
+        response.close()
+
+
+def fetch_gmw_series(gmw_id, tube_nrs, tmin=None, tmax=None, base_url=DEFAULT_BASE_URL):
+    """Return {tube_nr: GLDSeries} for the requested tubes of one GMW."""
+    import requests
+
+    with requests.Session() as session:
+        gld_ids = gld_ids_per_tube(gmw_id, base_url, session)
+        return {
+            tube_nr: GLDSeries.concatenate(
+                [
+                    fetch_gld(gld_id, tmin, tmax, base_url, session)
+                    for gld_id in gld_ids.get(tube_nr, [])
+                ]
+            )
+            for tube_nr in tube_nrs
+        }
+
+
+def compare_with_hydropandas(series, obs, tolerance=1e-6):
+    """Compare a parsed series with a hydropandas observation of the same tube.
+
+    Returns a dict with the point counts, the number of timestamps only one
+    of them has and the largest value difference on shared timestamps. Both
+    are compared in Dutch winter time: a naive hydropandas index already is,
+    a timezone-aware one is converted.
+    """
+    import pandas as pd
+
+    index = pd.DatetimeIndex(obs.index)
+    offset = 0
+    if index.tz is not None:
+        index = index.tz_convert("UTC").tz_localize(None)
+        offset = WINTERTIME_OFFSET
+    obs_times = index.values.astype("datetime64[s]").astype(np.int64) + offset
+    obs_values = np.asarray(obs.iloc[:, 0], dtype=np.float64)
+
+    shared, ours, theirs = np.intersect1d(
+        series.wintertimes(), obs_times, return_indices=True
+    )
+    a = series.values[ours]
+    b = obs_values[theirs]
+    both = np.isfinite(a) & np.isfinite(b)
+    max_diff = float(np.max(np.abs(a[both] - b[both]))) if both.any() else 0.0
+    nan_mismatch = int(np.count_nonzero(np.isfinite(a) != np.isfinite(b)))
+
+    report = {
+        "parser_points": len(series),
+        "hydropandas_points": len(obs_times),
+        "only_parser": len(series) - len(shared),
+        "only_hydropandas": len(obs_times) - len(shared),
+        "max_value_difference": max_diff,
+        "nan_mismatches": nan_mismatch,
+    }
+    report["matches"] = (
+        report["only_parser"] == 0
+        and report["only_hydropandas"] == 0
+        and nan_mismatch == 0
+        and max_diff <= tolerance
+    )
+    return report
+
+
+def validate_against_hydropandas(gmw_id, tube_nr, fixture_dir, base_url=DEFAULT_BASE_URL):
+    """Parse a tube with both hydropandas and this parser on recorded responses.
+
+    Responses are recorded into ``fixture_dir`` on the first run and replayed
+    afterwards, so both readers see identical documents.
+    """
+    import hydropandas as hpd
+
+    from .engine_selection import recorded_responses
+
+    with recorded_responses(fixture_dir):
+        obs = hpd.GroundwaterObs.from_bro(gmw_id, tube_nr)
+        series = fetch_gmw_series(gmw_id, [tube_nr], base_url=base_url)[tube_nr]
+    return compare_with_hydropandas(series, obs)
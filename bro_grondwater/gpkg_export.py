@@ -0,0 +1,277 @@
+"""
+BRO Grondwater Plugin - Export of wells and measurements to one GeoPackage
+"""
+
+import math
+import os
+import sqlite3
+from itertools import repeat
+
+import numpy as np
+from qgis.core import (
+    Qgis,
+    QgsCoordinateReferenceSystem,
+    QgsFeature,
+    QgsField,
+    QgsFields,
+    QgsGeometry,
+    QgsPointXY,
+    QgsVectorFileWriter,
+)
+from qgis.PyQt.QtCore import QVariant
+
+from .series_store import utc_times
+
+WELLS_TABLE = "wells"
+MEASUREMENTS_TABLE = "measurements"
+SUMMARY_VIEW = "well_summary"
+
+# Rows inserted per transaction
+ROWS_PER_TRANSACTION = 500000
+
+# Well attributes in the order of the wells table; (name, type)
+WELL_FIELDS = [
+    ("gmw_id", QVariant.String),
+    ("name", QVariant.String),
+    ("bro_id", QVariant.String),
+    ("tube_nr", QVariant.Int),
+    ("x", QVariant.Double),
+    ("y", QVariant.Double),
+    ("ground_level", QVariant.Double),
+    ("screen_top", QVariant.Double),
+    ("screen_bottom", QVariant.Double),
+    ("tube_top", QVariant.Double),
+    ("source", QVariant.String),
+    ("unit", QVariant.String),
+]
+
+SUMMARY_SQL = f"""
+CREATE VIEW {SUMMARY_VIEW} AS
+SELECT
+    w.fid AS fid,
+    w.geom AS geom,
+    w.gmw_id AS gmw_id,
+    w.name AS name,
+    w.tube_nr AS tube_nr,
+    w.screen_top AS screen_top,
+    w.screen_bottom AS screen_bottom,
+    COUNT(m.value) AS n_measurements,
+    MIN(m.time) AS first_time,
+    MAX(m.time) AS last_time,
+    MIN(m.value) AS min_level,
+    AVG(m.value) AS mean_level,
+    MAX(m.value) AS max_level
+FROM {WELLS_TABLE} w
+LEFT JOIN {MEASUREMENTS_TABLE} m ON m.well_fid = w.fid
+GROUP BY w.fid
+"""
+
+
+def _number(value):
+    """Return a float, or None for missing/NaN values."""
+    if isinstance(value, (int, float)) and not (isinstance(value, float) and math.isnan(value)):
+        return float(value)
+    return None
+
+
+def _well_attributes(well, series_data):
+    """Return a well dict completed with the WELL_FIELDS from its series metadata."""
+    metadata = series_data.get("metadata", {})
+    attributes = {name: metadata.get(name) for name, _ in WELL_FIELDS}
+    attributes.update(well)
+    attributes["tube_nr"] = metadata.get("tube_nr", well.get("tube_nr"))
+    attributes["source"] = metadata.get("source", "BRO")
+    attributes["unit"] = metadata.get("unit", "m NAP")
+    return attributes
+
+
+def gpkg_times(dates):
+    """Convert stored ISO date strings to GeoPackage DATETIME strings (UTC)."""
+    return np.char.add(np.datetime_as_string(utc_times(dates), unit="s"), "Z")
+
+
+def _write_wells(path, wells, transform_context):
+    """Write the wells point table and return its extent (xmin, ymin, xmax, ymax)."""
+    fields = QgsFields()
+    for name, field_type in WELL_FIELDS:
+        fields.append(QgsField(name, field_type))
+
+    options = QgsVectorFileWriter.SaveVectorOptions()
+    options.driverName = "GPKG"
+    options.layerName = WELLS_TABLE
+    options.layerOptions = ["SPATIAL_INDEX=YES", "FID=fid", "GEOMETRY_NAME=geom"]
+    options.actionOnExistingFile = QgsVectorFileWriter.ActionOnExistingFile.CreateOrOverwriteFile
+    writer = QgsVectorFileWriter.create(
+        path,
+        fields,
+        Qgis.WkbType.Point,
+        QgsCoordinateReferenceSystem("EPSG:28992"),
+        transform_context,
+        options,
+    )
+    if writer.hasError() != QgsVectorFileWriter.WriterError.NoError:
+        message = writer.errorMessage()
+        del writer
+        raise IOError(f"Could not create GeoPackage {path}: {message}")
+
+    xs, ys = [], []
+    features = []
+    for fid, well in enumerate(wells, 1):
+        feature = QgsFeature(fields, fid)
+        x, y = _number(well.get("x")), _number(well.get("y"))
+        if x is not None and y is not None:
+            feature.setGeometry(QgsGeometry.fromPointXY(QgsPointXY(x, y)))
+            xs.append(x)
+            ys.append(y)
+        feature.setAttributes(
+            [
+                _number(well.get(name)) if field_type == QVariant.Double else well.get(name)
+                for name, field_type in WELL_FIELDS
+            ]
+        )
+        features.append(feature)
+    if not writer.addFeatures(features):
+        message = writer.errorMessage()
+        del writer
+        raise IOError(f"Could not write wells to {path}: {message}")
+
+    # Deleting the writer flushes and closes the data source
+    del writer
+    if not xs:
+        return None
+    return min(xs), min(ys), max(xs), max(ys)
+
+
+def _register(conn, table_name, data_type, description, extent=None):
+    """List a table or view in gpkg_contents, so GIS tools show it as a layer."""
+    srs_id = 28992 if data_type == "features" else None
+    xmin, ymin, xmax, ymax = extent or (None, None, None, None)
+    conn.execute("DELETE FROM gpkg_contents WHERE table_name = ?", (table_name,))
+    conn.execute(
+        "INSERT INTO gpkg_contents "
+        "(table_name, data_type, identifier, description, min_x, min_y, max_x, max_y, srs_id) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        (table_name, data_type, table_name, description, xmin, ymin, xmax, ymax, srs_id),
+    )
+
+
+def _write_measurements(conn, wells, load, progress=None, is_cancelled=None):
+    """Bulk insert the measurements of all wells in large transactions.
+
+    Series are loaded one at a time with ``load(cache_key)``.
+
+    Returns the number of rows, or None if cancelled.
+    """
+    conn.execute(f"DROP TABLE IF EXISTS {MEASUREMENTS_TABLE}")
+    # Without AUTOINCREMENT: it halves the load time and GDAL/QGIS only need
+    # an integer primary key
+    conn.execute(
+        f"CREATE TABLE {MEASUREMENTS_TABLE} ("
+        "fid INTEGER PRIMARY KEY, "
+        f"well_fid INTEGER NOT NULL REFERENCES {WELLS_TABLE}(fid), "
+        "gmw_id TEXT, "
+        "tube_nr INTEGER, "
+        "time DATETIME NOT NULL, "
+        "value DOUBLE)"
+    )
+    insert = (
+        f"INSERT INTO {MEASUREMENTS_TABLE} (well_fid, gmw_id, tube_nr, time, value) "
+        "VALUES (?, ?, ?, ?, ?)"
+    )
+
+    total = 0
+    pending = 0
+    conn.execute("BEGIN")
+    for fid, well in enumerate(wells, 1):
+        if is_cancelled is not None and is_cancelled():
+            conn.rollback()
+            return None
+        series_data = load(well["cache_key"]) or {}
+        dates = series_data.get("dates") or []
+        if dates:
+            times = gpkg_times(dates).tolist()
+            # SQLite stores NaN as NULL
+            values = np.asarray(series_data["values"], dtype=np.float64).tolist()
+            gmw_id, tube_nr = well.get("gmw_id"), well.get("tube_nr")
+            conn.executemany(
+                insert, zip(repeat(fid), repeat(gmw_id), repeat(tube_nr), times, values)
+            )
+            total += len(times)
+            pending += len(times)
+            if pending >= ROWS_PER_TRANSACTION:
+                conn.commit()
+                conn.execute("BEGIN")
+                pending = 0
+        if progress is not None:
+            progress(10 + 80 * fid / len(wells))
+    conn.commit()
+
+    # The index is built once after loading, which is much faster than per row
+    conn.execute(
+        f"CREATE INDEX idx_{MEASUREMENTS_TABLE}_well_time "
+        f"ON {MEASUREMENTS_TABLE} (well_fid, time)"
+    )
+    return total
+
+
+def export_geopackage(path, wells, load, transform_context, progress=None, is_cancelled=None):
+    """Write wells, measurements and a per-well summary view to a GeoPackage.
+
+    ``wells`` is a list of dicts with ``cache_key``, ``gmw_id``, ``name``,
+    ``bro_id`` and ``tube_nr``; ``load(cache_key)`` returns the series data
+    of a well, whose metadata fills the other WELL_FIELDS. The summary view
+    is a point layer of the wells with the measurement count, period and
+    level statistics. The file is written next to ``path`` and moved into
+    place when complete. Returns the number of measurement rows, or None if
+    cancelled.
+    """
+    # GDAL wants a .gpkg extension, so the partial file keeps one
+    tmp_path = f"{os.path.splitext(path)[0]}.part.gpkg"
+    try:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+        # Metadata only: series are loaded again one by one for the measurements
+        attributes = []
+        for well in wells:
+            if is_cancelled is not None and is_cancelled():
+                return None
+            attributes.append(_well_attributes(well, load(well["cache_key"]) or {}))
+        extent = _write_wells(tmp_path, attributes, transform_context)
+        if progress is not None:
+            progress(10)
+
+        conn = sqlite3.connect(tmp_path, isolation_level=None)
+        try:
+            # A fresh file: no need to survive a crash halfway, so skip the syncs
+            conn.execute("PRAGMA synchronous = OFF")
+            conn.execute("PRAGMA journal_mode = MEMORY")
+            rows = _write_measurements(conn, attributes, load, progress, is_cancelled)
+            if rows is None:
+                return None
+
+            conn.execute("BEGIN")
+            _register(conn, MEASUREMENTS_TABLE, "attributes", "Groundwater levels (m NAP)")
+            conn.execute(f"DROP VIEW IF EXISTS {SUMMARY_VIEW}")
+            conn.execute(SUMMARY_SQL)
+            _register(conn, SUMMARY_VIEW, "features", "Measurements per well", extent)
+            conn.execute(
+                "DELETE FROM gpkg_geometry_columns WHERE table_name = ?", (SUMMARY_VIEW,)
+            )
+            conn.execute(
+                "INSERT INTO gpkg_geometry_columns "
+                "(table_name, column_name, geometry_type_name, srs_id, z, m) "
+                "VALUES (?, 'geom', 'POINT', 28992, 0, 0)",
+                (SUMMARY_VIEW,),
+            )
+            conn.commit()
+            conn.execute("ANALYZE")
+        finally:
+            conn.close()
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    if progress is not None:
+        progress(100)
+    return rows
@@ -0,0 +1,231 @@
+"""
+BRO Grondwater Plugin - Groundwater level surface interpolation to GeoTIFF
+"""
+
+import numpy as np
+
+from .spatial_index import WellIndex
+
+NODATA = -9999.0
+
+# Grid cells per tile side; the output raster is written tile by tile
+TILE_SIZE = 256
+
+# Cells per side of the blocks the distances are computed for; small blocks
+# keep the number of candidate wells per block low
+BLOCK_SIZE = 32
+
+# Value per well: the level at a date or a long term statistic
+AT_DATE = "date"
+GHG = "GHG"  # Mean highest level: 3 highest of 24 samples per hydrological year
+GLG = "GLG"  # Mean lowest level: 3 lowest of 24 samples per hydrological year
+GVG = "GVG"  # Mean spring level: samples on 14 and 28 March and 14 April
+
+IDW = "idw"
+NEAREST = "nearest"
+
+
+def _day_seconds(year, month, day):
+    return float(np.datetime64(f"{year:04d}-{month:02d}-{day:02d}", "s").astype(np.int64))
+
+
+def _sample_at(times, values, sample_times, tolerance, max_gap):
+    """Return the level of a series at sample times (NaN where unknown).
+
+    The measurement nearest to a sample time is used when it is at most
+    ``tolerance`` away; otherwise the level is interpolated between the
+    measurements around it if they are at most ``max_gap`` apart.
+    """
+    sampled = np.full(len(sample_times), np.nan)
+    if len(times) == 0:
+        return sampled
+
+    right = np.clip(np.searchsorted(times, sample_times), 1, len(times) - 1)
+    left = right - 1
+    nearest = np.where(
+        np.abs(times[left] - sample_times) <= np.abs(times[right] - sample_times), left, right
+    )
+    close = np.abs(times[nearest] - sample_times) <= tolerance
+    sampled[close] = values[nearest[close]]
+
+    inside = (sample_times >= times[0]) & (sample_times <= times[-1])
+    between = ~close & inside & (times[right] - times[left] <= max_gap)
+    sampled[between] = np.interp(sample_times[between], times, values)
+    return sampled
+
+
+def series_statistic(
+    times, values, statistic, min_years=1, tolerance=3 * 86400, max_gap=31 * 86400
+):
+    """Return GHG, GLG or GVG of one series (NaN if not enough data).
+
+    Levels are sampled on the 14th and 28th of every month, from the nearest
+    measurement within ``tolerance`` or interpolated between measurements at
+    most ``max_gap`` apart. GHG/GLG average the three highest/lowest samples
+    of each complete hydrological year (April to March), GVG the spring
+    samples of each year; the yearly values are then averaged.
+    """
+    if len(times) == 0:
+        return np.nan
+    first = int(str(np.datetime64(int(times[0]), "s"))[:4])
+    last = int(str(np.datetime64(int(times[-1]), "s"))[:4])
+
+    yearly = []
+    for year in range(first - 1, last + 1):
+        if statistic == GVG:
+            samples = [(year, 3, 14), (year, 3, 28), (year, 4, 14)]
+        else:
+            samples = [
+                (year + (month < 4), month, day)
+                for month in (4, 5, 6, 7, 8, 9, 10, 11, 12, 1, 2, 3)
+                for day in (14, 28)
+            ]
+        sample_times = np.array([_day_seconds(*s) for s in samples])
+        sampled = _sample_at(times, values, sample_times, tolerance, max_gap)
+        if np.isnan(sampled).any():
+            continue
+        if statistic == GHG:
+            yearly.append(np.sort(sampled)[-3:].mean())
+        elif statistic == GLG:
+            yearly.append(np.sort(sampled)[:3].mean())
+        else:
+            yearly.append(sampled.mean())
+
+    if len(yearly) < min_years:
+        return np.nan
+    return float(np.mean(yearly))
+
+
+def well_values(series, value, date_seconds=None, max_gap_days=30):
+    """Return one value per series key.
+
+    ``series`` is {key: (timestamps, values)} with sorted timestamps. For
+    ``AT_DATE`` the level is interpolated at ``date_seconds`` between
+    measurements at most ``max_gap_days`` apart.
+    """
+    if value == AT_DATE:
+        from .time_index import TimeSliceIndex
+
+        index = TimeSliceIndex(series)
+        levels = index.values_at(date_seconds, interpolate=True, max_gap=max_gap_days * 86400)
+        return dict(zip(index.keys, levels))
+    return {key: series_statistic(t, v, value) for key, (t, v) in series.items()}
+
+
+class SurfaceInterpolator:
+    """IDW or nearest-well interpolation of point values on a regular grid.
+
+    The grid is handled in blocks of cells. Candidate wells per block come
+    from a :class:`WellIndex` query on the block expanded by the search
+    radius, so every block only computes distances to nearby wells; all
+    cells of a block are handled at once with numpy.
+    """
+
+    def __init__(self, xs, ys, values, method=IDW, power=2.0, neighbours=8, radius=2000.0):
+        xs = np.asarray(xs, dtype=np.float64)
+        ys = np.asarray(ys, dtype=np.float64)
+        values = np.asarray(values, dtype=np.float64)
+        valid = np.isfinite(xs) & np.isfinite(ys) & np.isfinite(values)
+        self.x, self.y, self.values = xs[valid], ys[valid], values[valid]
+        self.index = WellIndex(self.x, self.y, range(len(self.x)))
+        self.method = method
+        self.power = power
+        self.neighbours = 1 if method == NEAREST else neighbours
+        self.radius = radius
+
+    def __len__(self):
+        return len(self.x)
+
+    def interpolate(self, centres_x, centres_y):
+        """Return a (rows, columns) array for the cell centres along both axes."""
+        result = np.full((len(centres_y), len(centres_x)), NODATA, dtype=np.float32)
+        if len(self.x) == 0:
+            return result
+        for row in range(0, len(centres_y), BLOCK_SIZE):
+            for col in range(0, len(centres_x), BLOCK_SIZE):
+                block_x = centres_x[col : col + BLOCK_SIZE]
+                block_y = centres_y[row : row + BLOCK_SIZE]
+                result[row : row + len(block_y), col : col + len(block_x)] = self._block(
+                    block_x, block_y
+                )
+        return result
+
+    def _block(self, block_x, block_y):
+        r = self.radius
+        candidates = self.index.query_box(
+            block_x.min() - r, block_y.min() - r, block_x.max() + r, block_y.max() + r
+        )
+        shape = (len(block_y), len(block_x))
+        if len(candidates) == 0:
+            return np.full(shape, NODATA)
+
+        # Squared distances of all cells to all candidates, (cells, candidates)
+        dx2 = (block_x[np.newaxis, :, np.newaxis] - self.x[candidates]) ** 2
+        dy2 = (block_y[:, np.newaxis, np.newaxis] - self.y[candidates]) ** 2
+        dist2 = (dx2 + dy2).reshape(-1, len(candidates))
+
+        k = min(self.neighbours, len(candidates))
+        nearest = np.argpartition(dist2, k - 1, axis=1)[:, :k]
+        d2 = np.take_along_axis(dist2, nearest, axis=1)
+        v = self.values[candidates][nearest]
+        in_range = d2 <= r * r
+
+        if self.method == NEAREST:
+            out = np.where(in_range[:, 0], v[:, 0], NODATA)
+        else:
+            weights = np.where(in_range, 1.0 / np.maximum(d2, 1e-12) ** (self.power / 2), 0.0)
+            total = weights.sum(axis=1)
+            with np.errstate(invalid="ignore", divide="ignore"):
+                out = np.where(total > 0, (weights * v).sum(axis=1) / total, NODATA)
+        return out.reshape(shape)
+
+
+def write_surface(path, interpolator, extent, cell_size, progress=None, is_cancelled=None):
+    """Interpolate over an RD extent (xmin, xmax, ymin, ymax) into a GeoTIFF.
+
+    The raster is written tile by tile, so memory stays bounded by one tile.
+    Returns the raster size (columns, rows), or None if cancelled.
+    """
+    from osgeo import gdal, osr
+
+    xmin, xmax, ymin, ymax = extent
+    cols = max(int(np.ceil((xmax - xmin) / cell_size)), 1)
+    rows = max(int(np.ceil((ymax - ymin) / cell_size)), 1)
+
+    driver = gdal.GetDriverByName("GTiff")
+    dataset = driver.Create(
+        path,
+        cols,
+        rows,
+        1,
+        gdal.GDT_Float32,
+        options=["TILED=YES", "COMPRESS=DEFLATE", "PREDICTOR=3", "BIGTIFF=IF_SAFER"],
+    )
+    dataset.SetGeoTransform((xmin, cell_size, 0, ymax, 0, -cell_size))
+    srs = osr.SpatialReference()
+    srs.ImportFromEPSG(28992)
+    dataset.SetProjection(srs.ExportToWkt())
+    band = dataset.GetRasterBand(1)
+    band.SetNoDataValue(NODATA)
+
+    tiles = [
+        (row, col)
+        for row in range(0, rows, TILE_SIZE)
+        for col in range(0, cols, TILE_SIZE)
+    ]
+    try:
+        for done, (row, col) in enumerate(tiles):
+            if is_cancelled is not None and is_cancelled():
+                return None
+            n_rows = min(TILE_SIZE, rows - row)
+            n_cols = min(TILE_SIZE, cols - col)
+            centres_x = xmin + (col + np.arange(n_cols) + 0.5) * cell_size
+            centres_y = ymax - (row + np.arange(n_rows) + 0.5) * cell_size
+            band.WriteArray(interpolator.interpolate(centres_x, centres_y), col, row)
+            if progress is not None:
+                progress(100.0 * (done + 1) / len(tiles))
+        band.ComputeStatistics(False)
+    finally:
+        band = None
+        dataset = None
+    return cols, rows
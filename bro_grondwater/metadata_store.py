@@ -0,0 +1,247 @@
+"""
+BRO Grondwater Plugin - Local indexed store for a bulk BRO GMW metadata snapshot
+"""
+
+import csv
+import io
+import os
+import sqlite3
+from datetime import datetime
+
+SCHEMA = """
+CREATE TABLE wells (
+    id INTEGER PRIMARY KEY,
+    bro_id TEXT NOT NULL,
+    tube_nr INTEGER NOT NULL,
+    name TEXT,
+    x REAL NOT NULL,
+    y REAL NOT NULL,
+    ground_level REAL,
+    screen_top REAL,
+    screen_bottom REAL,
+    tube_top REAL
+);
+CREATE TABLE snapshot_info (key TEXT PRIMARY KEY, value TEXT);
+"""
+
+INDEXES = """
+CREATE UNIQUE INDEX wells_key ON wells (bro_id, tube_nr);
+CREATE VIRTUAL TABLE wells_rtree USING rtree (id, xmin, xmax, ymin, ymax);
+INSERT INTO wells_rtree SELECT id, x, x, y, y FROM wells;
+"""
+
+WELL_COLUMNS = (
+    "bro_id",
+    "tube_nr",
+    "name",
+    "x",
+    "y",
+    "ground_level",
+    "screen_top",
+    "screen_bottom",
+    "tube_top",
+)
+
+# Column names used in BRO exports, mapped to the plugin field names
+COLUMN_ALIASES = {
+    "bro_id": ("bro_id", "broid", "gmw_bro_id", "gmw_id", "well_id"),
+    "tube_nr": ("tube_nr", "tubenumber", "tube_number", "buisnummer", "filternummer"),
+    "name": ("name", "well_code", "wellcode", "nitg_code", "putcode"),
+    "x": ("x", "x_rd", "xcoordinaat", "x_coordinate"),
+    "y": ("y", "y_rd", "ycoordinaat", "y_coordinate"),
+    "ground_level": ("ground_level", "groundlevelposition", "maaiveldhoogte"),
+    "screen_top": ("screen_top", "screentopposition", "bovenkant_filter"),
+    "screen_bottom": ("screen_bottom", "screenbottomposition", "onderkant_filter"),
+    "tube_top": ("tube_top", "tubetopposition", "bovenkant_buis"),
+}
+
+BATCH_SIZE = 50000
+
+# Rows read between progress reports
+PROGRESS_ROWS = 10000
+
+
+def _to_float(value):
+    if value is None or value == "":
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        try:
+            # Decimal comma in Dutch exports
+            return float(str(value).replace(",", "."))
+        except ValueError:
+            return None
+
+
+def column_mapping(columns):
+    """Return {field: column} for the snapshot columns that match a known alias."""
+    lowered = {str(c).strip().lower(): c for c in columns if c is not None}
+    mapping = {}
+    for field, aliases in COLUMN_ALIASES.items():
+        column = next((lowered[a] for a in aliases if a in lowered), None)
+        if column is not None:
+            mapping[field] = column
+    return mapping
+
+
+def normalize_rows(rows):
+    """Map snapshot rows with BRO column names to well records.
+
+    The column mapping is resolved from the first row, so every further row
+    costs only direct lookups. Rows without id or coordinates are skipped.
+    """
+    mapping = None
+    for row in rows:
+        if mapping is None:
+            mapping = column_mapping(row.keys())
+            get = {field: mapping.get(field) for field in COLUMN_ALIASES}
+
+        bro_id = row.get(get["bro_id"]) if get["bro_id"] else None
+        x = _to_float(row.get(get["x"])) if get["x"] else None
+        y = _to_float(row.get(get["y"])) if get["y"] else None
+        if not bro_id or x is None or y is None:
+            continue
+
+        tube_nr = _to_float(row.get(get["tube_nr"])) if get["tube_nr"] else None
+        tube_nr = int(tube_nr) if tube_nr is not None else 1
+        name = row.get(get["name"]) if get["name"] else None
+        yield (
+            str(bro_id),
+            tube_nr,
+            name or f"{bro_id}_{tube_nr}",
+            x,
+            y,
+            _to_float(row.get(get["ground_level"])) if get["ground_level"] else None,
+            _to_float(row.get(get["screen_top"])) if get["screen_top"] else None,
+            _to_float(row.get(get["screen_bottom"])) if get["screen_bottom"] else None,
+            _to_float(row.get(get["tube_top"])) if get["tube_top"] else None,
+        )
+
+
+def read_csv_snapshot(path, progress=None):
+    """Stream well rows from a CSV export (RD coordinates), one dict per tube.
+
+    ``progress`` is called with the fraction of the file read so far.
+    """
+    size = os.path.getsize(path)
+    with open(path, "rb") as raw:
+        f = io.TextIOWrapper(raw, encoding="utf-8-sig", newline="")
+        sample = f.read(65536)
+        f.seek(0)
+        try:
+            dialect = csv.Sniffer().sniff(sample, delimiters=",;\t")
+        except csv.Error:
+            dialect = csv.excel
+        for count, row in enumerate(csv.DictReader(f, dialect=dialect), 1):
+            yield row
+            if progress is not None and count % PROGRESS_ROWS == 0:
+                # The text layer reads ahead in chunks, so this is approximate
+                progress(raw.tell() / size if size else 1.0)
+
+
+class MetadataStore:
+    """SQLite database with GMW tube metadata and an R-tree over the locations.
+
+    An import is written to a new database file with bulk inserts; the indexes
+    are built once after loading and the file then replaces the previous
+    snapshot, so queries keep working while a refresh runs.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def ingest(self, rows, source, progress=None, is_cancelled=None):
+        """Replace the snapshot with the given rows.
+
+        ``rows`` is any iterable of dicts with BRO column names. ``progress``
+        is called with the number of wells stored so far. Returns the number
+        of wells stored, or None if cancelled.
+        """
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = self.path + ".importing"
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+        try:
+            conn = sqlite3.connect(tmp_path)
+            try:
+                # The file is only used once complete, so durability is not needed here
+                conn.execute("PRAGMA journal_mode = OFF")
+                conn.execute("PRAGMA synchronous = OFF")
+                conn.execute("PRAGMA cache_size = -262144")  # 256 MB for the R-tree build
+                conn.executescript(SCHEMA)
+
+                insert = (
+                    f"INSERT INTO wells ({', '.join(WELL_COLUMNS)}) "
+                    f"VALUES ({', '.join('?' * len(WELL_COLUMNS))})"
+                )
+                seen = set()
+                batch = []
+                conn.execute("BEGIN")
+                for record in normalize_rows(rows):
+                    key = record[:2]
+                    if key in seen:
+                        continue
+                    seen.add(key)
+                    batch.append(record)
+
+                    if len(batch) >= BATCH_SIZE:
+                        conn.executemany(insert, batch)
+                        batch = []
+                        if progress is not None:
+                            progress(len(seen))
+                        if is_cancelled is not None and is_cancelled():
+                            conn.rollback()
+                            return None
+                conn.executemany(insert, batch)
+                if is_cancelled is not None and is_cancelled():
+                    conn.rollback()
+                    return None
+
+                conn.executescript(INDEXES)
+                conn.executemany(
+                    "INSERT INTO snapshot_info VALUES (?, ?)",
+                    [
+                        ("imported", datetime.now().isoformat(timespec="seconds")),
+                        ("source", os.path.basename(source)),
+                        ("count", str(len(seen))),
+                    ],
+                )
+                conn.commit()
+            finally:
+                conn.close()
+
+            os.replace(tmp_path, self.path)
+            return len(seen)
+        finally:
+            # Left over after a cancel or an error
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def info(self):
+        """Return snapshot information (imported, source, count) as a dict."""
+        if not self.exists():
+            return {}
+        conn = sqlite3.connect(self.path)
+        try:
+            return dict(conn.execute("SELECT key, value FROM snapshot_info").fetchall())
+        finally:
+            conn.close()
+
+    def query_extent(self, xmin, xmax, ymin, ymax):
+        """Return well records within an RD extent using the R-tree."""
+        conn = sqlite3.connect(self.path)
+        try:
+            rows = conn.execute(
+                f"SELECT {', '.join('w.' + c for c in WELL_COLUMNS)} "
+                "FROM wells_rtree r JOIN wells w ON w.id = r.id "
+                "WHERE r.xmin <= ? AND r.xmax >= ? AND r.ymin <= ? AND r.ymax >= ?",
+                (xmax, xmin, ymax, ymin),
+            ).fetchall()
+        finally:
+            conn.close()
+        return [dict(zip(WELL_COLUMNS, row)) for row in rows]
@@ -0,0 +1,174 @@
+"""
+BRO Grondwater Plugin - Non-modal plot window that adds series incrementally
+"""
+
+import pyqtgraph as pg
+from qgis.PyQt.QtWidgets import (
+    QButtonGroup,
+    QDialog,
+    QHBoxLayout,
+    QPushButton,
+    QToolButton,
+    QVBoxLayout,
+)
+
+from .plotting import MANY_SERIES_THRESHOLD, SERIES_COLORS, BatchedSeriesPlot
+
+
+class PlotWindow(QDialog):
+    """Time series plot that stays open next to the map.
+
+    ``add_series`` only draws series that are not plotted yet (or replaces
+    the curve of a series whose data changed), so a window following the
+    downloads does not redraw everything for every new well. Up to
+    MANY_SERIES_THRESHOLD series get their own curve and legend entry; above
+    that the window switches once to a BatchedSeriesPlot.
+    """
+
+    def __init__(self, title="Grondwaterstand", save_plot=None, parent=None):
+        super().__init__(parent)
+        self.title = title
+        self.setWindowTitle(title)
+        self.resize(800, 500)
+        self.keys = []
+        self._index = {}  # cache_key -> position in self.keys
+        self._series = []  # (label, timestamps, values) per key
+        self._curves = []
+        self._legend = None
+        self.batched_plot = None
+        self.stale = set()  # Plotted keys whose data changed while hidden
+
+        # Time series plot with date axis (timestamps are stored wall clock time)
+        date_axis = pg.DateAxisItem(orientation="bottom", utcOffset=0)
+        self.plot_widget = pg.PlotWidget(axisItems={"bottom": date_axis})
+        self.plot_widget.setBackground("w")
+        self.plot_widget.showGrid(x=True, y=True, alpha=0.3)
+        self.plot_widget.setLabel("left", "Stijghoogte (m NAP)")
+        self.plot_widget.setLabel("bottom", "Datum")
+        self.plot_widget.setTitle(title)
+
+        layout = QVBoxLayout()
+        layout.addLayout(self._create_toolbar(save_plot))
+        self.plot_layout = QHBoxLayout()
+        self.plot_layout.addWidget(self.plot_widget, 1)
+        layout.addLayout(self.plot_layout)
+        self.setLayout(layout)
+
+    def _create_toolbar(self, save_plot):
+        toolbar = QHBoxLayout()
+        toolbar.setSpacing(4)
+
+        vb = self.plot_widget.getViewBox()
+
+        btn_pan = QToolButton()
+        btn_pan.setText("Pan")
+        btn_pan.setToolTip("Pan mode: drag to scroll")
+        btn_pan.setCheckable(True)
+        btn_pan.setChecked(True)
+
+        btn_zoom = QToolButton()
+        btn_zoom.setText("Zoom")
+        btn_zoom.setToolTip("Zoom mode: drag to draw zoom box")
+        btn_zoom.setCheckable(True)
+
+        self.mode_group = QButtonGroup(self)
+        self.mode_group.addButton(btn_pan)
+        self.mode_group.addButton(btn_zoom)
+        self.mode_group.setExclusive(True)
+
+        btn_pan.clicked.connect(lambda: vb.setMouseMode(vb.PanMode))
+        btn_zoom.clicked.connect(lambda: vb.setMouseMode(vb.RectMode))
+
+        btn_reset = QPushButton("Reset view")
+        btn_reset.setToolTip("Zoom to fit all data")
+        btn_reset.clicked.connect(lambda: self.plot_widget.autoRange())
+
+        btn_zoom_in = QPushButton("＋")
+        btn_zoom_in.setToolTip("Zoom in")
+        btn_zoom_in.setFixedWidth(32)
+        btn_zoom_in.clicked.connect(lambda: vb.scaleBy((0.7, 0.7)))
+
+        btn_zoom_out = QPushButton("－")
+        btn_zoom_out.setToolTip("Zoom out")
+        btn_zoom_out.setFixedWidth(32)
+        btn_zoom_out.clicked.connect(lambda: vb.scaleBy((1.4, 1.4)))
+
+        toolbar.addWidget(btn_pan)
+        toolbar.addWidget(btn_zoom)
+        toolbar.addWidget(btn_zoom_in)
+        toolbar.addWidget(btn_zoom_out)
+        toolbar.addWidget(btn_reset)
+        toolbar.addStretch()
+
+        if save_plot is not None:
+            btn_save = QPushButton("Save as PNG")
+            btn_save.clicked.connect(lambda: save_plot(self.plot_widget))
+            toolbar.addWidget(btn_save)
+        return toolbar
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __contains__(self, cache_key):
+        return cache_key in self._index
+
+    def add_series(self, series):
+        """Plot (cache_key, label, timestamps, values) tuples.
+
+        Keys that are already plotted have their curve replaced. Returns the
+        number of new series.
+        """
+        new, changed = [], False
+        for cache_key, label, timestamps, values in series:
+            self.stale.discard(cache_key)
+            position = self._index.get(cache_key)
+            if position is None:
+                self._index[cache_key] = len(self.keys)
+                self.keys.append(cache_key)
+                self._series.append((label, timestamps, values))
+                new.append(self._series[-1])
+                continue
+            self._series[position] = (label, timestamps, values)
+            changed = True
+            if self.batched_plot is None:
+                self._curves[position].setData(timestamps, values)
+
+        if self.batched_plot is None and len(self._series) > MANY_SERIES_THRESHOLD:
+            self._switch_to_batched()
+        elif self.batched_plot is not None:
+            if changed:
+                self.batched_plot.set_series(self._series)
+            elif new:
+                self.batched_plot.append_series(new)
+        else:
+            self._add_curves(new)
+
+        self.setWindowTitle(f"{self.title} ({len(self.keys)} wells)")
+        return len(new)
+
+    def _add_curves(self, series):
+        if self._legend is None:
+            self._legend = self.plot_widget.addLegend()
+        for label, timestamps, values in series:
+            color = SERIES_COLORS[len(self._curves) % len(SERIES_COLORS)]
+            self._curves.append(
+                self.plot_widget.plot(
+                    timestamps,
+                    values,
+                    name=label,
+                    pen=pg.mkPen(color=color, width=1.5),
+                )
+            )
+
+    def _switch_to_batched(self):
+        """Replace the single curves by batched curves and a searchable legend."""
+        for curve in self._curves:
+            self.plot_widget.removeItem(curve)
+        self._curves = []
+        if self._legend is not None:
+            self._legend.scene().removeItem(self._legend)
+            self.plot_widget.getPlotItem().legend = None
+            self._legend = None
+        self.batched_plot = BatchedSeriesPlot(self.plot_widget)
+        self.batched_plot.set_series(self._series)
+        self.plot_layout.addWidget(self.batched_plot.legend)
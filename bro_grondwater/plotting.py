@@ -0,0 +1,292 @@
+"""
+BRO Grondwater Plugin - Batched time series rendering for many-well plots
+"""
+
+import warnings
+
+import numpy as np
+import pyqtgraph as pg
+from qgis.PyQt.QtCore import Qt
+from qgis.PyQt.QtGui import QColor, QIcon, QPixmap
+from qgis.PyQt.QtWidgets import (
+    QLabel,
+    QLineEdit,
+    QListWidget,
+    QListWidgetItem,
+    QVBoxLayout,
+    QWidget,
+)
+
+SERIES_COLORS = [
+    "#1f77b4",
+    "#ff7f0e",
+    "#2ca02c",
+    "#d62728",
+    "#9467bd",
+    "#8c564b",
+    "#e377c2",
+    "#7f7f7f",
+    "#bcbd22",
+    "#17becf",
+]
+
+# Above this number of series the batched rendering mode is used
+MANY_SERIES_THRESHOLD = 20
+
+# Hover distance in pixels for picking a series under the mouse
+PICK_TOLERANCE_PX = 6
+
+
+def series_arrays(series_data):
+    """Convert stored series data to (timestamps, values) float arrays.
+
+    Timestamps are seconds since the epoch with the stored (local) wall clock
+    time taken as UTC; use a DateAxisItem with ``utcOffset=0`` to display them.
+    """
+    with warnings.catch_warnings():
+        # Timezone-aware strings are converted to UTC by numpy
+        warnings.simplefilter("ignore")
+        dates = np.array(series_data["dates"], dtype="datetime64[s]")
+    timestamps = dates.astype(np.int64).astype(np.float64)
+    values = np.asarray(series_data["values"], dtype=np.float64)
+
+    mask = np.isfinite(values)
+    return timestamps[mask], values[mask]
+
+
+class SeriesPickIndex:
+    """Index over all plotted points for finding the series under the mouse.
+
+    Points are sorted by time, so a hover query only inspects the points in a
+    narrow time window found with ``searchsorted``.
+    """
+
+    def __init__(self, xs, ys, series_ids):
+        order = np.argsort(xs, kind="stable")
+        self.x = xs[order]
+        self.y = ys[order]
+        self.ids = series_ids[order]
+
+    def merge(self, xs, ys, series_ids):
+        """Add points; only the new points are sorted."""
+        order = np.argsort(xs, kind="stable")
+        xs = xs[order]
+        # New points go after indexed points with the same time
+        positions = np.searchsorted(self.x, xs, side="right")
+        self.x = np.insert(self.x, positions, xs)
+        self.y = np.insert(self.y, positions, ys[order])
+        self.ids = np.insert(self.ids, positions, series_ids[order])
+
+    def nearest(self, x, y, x_tol, y_tol):
+        """Return the id of the series nearest to (x, y) within tolerance, or None."""
+        if len(self.x) == 0 or x_tol <= 0 or y_tol <= 0:
+            return None
+
+        lo = np.searchsorted(self.x, x - x_tol, side="left")
+        hi = np.searchsorted(self.x, x + x_tol, side="right")
+        if hi <= lo:
+            return None
+
+        dx = (self.x[lo:hi] - x) / x_tol
+        dy = (self.y[lo:hi] - y) / y_tol
+        dist = dx * dx + dy * dy
+        i = int(np.argmin(dist))
+        if dist[i] > 1.0:
+            return None
+        return int(self.ids[lo + i])
+
+
+class BatchedSeriesPlot:
+    """Draw many series as one path item per colour.
+
+    Series that share a colour are concatenated into a single curve whose
+    ``connect`` array breaks the line between series. The legend is a
+    searchable list next to the plot, and hovering the plot shows the name of
+    the nearest series through a :class:`SeriesPickIndex`.
+    """
+
+    def __init__(self, plot_widget):
+        self.plot_widget = plot_widget
+        self.labels = []
+        self.series = []
+        # Colour index -> curve and the (x, y, connect) arrays it draws
+        self.curves = {}
+        self._curve_data = {}
+        self.pick_index = None
+        self._highlight = None
+
+        self.hover_label = pg.TextItem(color="k", anchor=(0, 1), fill=(255, 255, 255, 200))
+        self.hover_label.setZValue(100)
+        self.hover_label.hide()
+        self.plot_widget.addItem(self.hover_label, ignoreBounds=True)
+        self.plot_widget.scene().sigMouseMoved.connect(self._on_mouse_moved)
+
+        self.legend = self._create_legend()
+
+    def set_series(self, series):
+        """Plot a list of (label, timestamps, values) tuples."""
+        for curve in self.curves.values():
+            self.plot_widget.removeItem(curve)
+        self.curves = {}
+        self._curve_data = {}
+        self.labels = []
+        self.series = []
+        self.pick_index = None
+        self.append_series(series)
+
+    def append_series(self, series):
+        """Add (label, timestamps, values) tuples to the plot.
+
+        The new points are appended to the existing curve of their colour,
+        so the plot keeps one curve per colour however often it is extended.
+        """
+        first_id = len(self.series)
+        self.labels += [label for label, _, _ in series]
+        self.series += [(x, y) for _, x, y in series]
+
+        all_x, all_y, all_ids = [], [], []
+        for color_index, color in enumerate(SERIES_COLORS):
+            xs, ys, connects = [], [], []
+            for series_id in range(first_id, len(self.series)):
+                if series_id % len(SERIES_COLORS) != color_index:
+                    continue
+                x, y = self.series[series_id]
+                if len(x) == 0:
+                    continue
+                connect = np.ones(len(x), dtype=np.int32)
+                connect[-1] = 0  # Do not connect to the next series
+                xs.append(x)
+                ys.append(y)
+                connects.append(connect)
+                all_x.append(x)
+                all_y.append(y)
+                all_ids.append(np.full(len(x), series_id, dtype=np.int32))
+
+            if not xs:
+                continue
+
+            if color_index in self._curve_data:
+                old_x, old_y, old_connect = self._curve_data[color_index]
+                xs.insert(0, old_x)
+                ys.insert(0, old_y)
+                connects.insert(0, old_connect)
+            x = np.concatenate(xs)
+            y = np.concatenate(ys)
+            connect = np.concatenate(connects)
+            self._curve_data[color_index] = (x, y, connect)
+
+            curve = self.curves.get(color_index)
+            if curve is None:
+                curve = pg.PlotCurveItem(
+                    pen=pg.mkPen(color=color, width=1), skipFiniteCheck=True
+                )
+                self.plot_widget.addItem(curve)
+                self.curves[color_index] = curve
+            curve.setData(x, y, connect=connect, skipFiniteCheck=True)
+
+        if all_x:
+            x = np.concatenate(all_x)
+            y = np.concatenate(all_y)
+            ids = np.concatenate(all_ids)
+            if self.pick_index is None:
+                self.pick_index = SeriesPickIndex(x, y, ids)
+            else:
+                self.pick_index.merge(x, y, ids)
+        self._fill_legend(first_id)
+
+    def _create_legend(self):
+        widget = QWidget()
+        layout = QVBoxLayout()
+        layout.setContentsMargins(0, 0, 0, 0)
+
+        self.legend_filter = QLineEdit()
+        self.legend_filter.setPlaceholderText("Search wells...")
+        self.legend_filter.textChanged.connect(self._filter_legend)
+
+        self.legend_list = QListWidget()
+        self.legend_list.setUniformItemSizes(True)
+        self.legend_list.currentRowChanged.connect(self._on_legend_row_changed)
+
+        self.legend_count = QLabel()
+
+        layout.addWidget(self.legend_filter)
+        layout.addWidget(self.legend_list)
+        layout.addWidget(self.legend_count)
+        widget.setLayout(layout)
+        widget.setMaximumWidth(220)
+        return widget
+
+    def _fill_legend(self, first_id=0):
+        icons = []
+        for color in SERIES_COLORS:
+            pixmap = QPixmap(12, 12)
+            pixmap.fill(QColor(color))
+            icons.append(QIcon(pixmap))
+
+        self.legend_list.setUpdatesEnabled(False)
+        if first_id == 0:
+            self.legend_list.clear()
+        text = self.legend_filter.text().strip().lower()
+        for series_id in range(first_id, len(self.labels)):
+            label = self.labels[series_id]
+            item = QListWidgetItem(icons[series_id % len(icons)], label)
+            item.setData(Qt.ItemDataRole.UserRole, series_id)
+            self.legend_list.addItem(item)
+            item.setHidden(bool(text) and text not in label.lower())
+        self.legend_list.setUpdatesEnabled(True)
+        self.legend_count.setText(f"{len(self.labels)} series")
+
+    def _filter_legend(self, text):
+        text = text.strip().lower()
+        self.legend_list.setUpdatesEnabled(False)
+        for row in range(self.legend_list.count()):
+            item = self.legend_list.item(row)
+            item.setHidden(bool(text) and text not in item.text().lower())
+        self.legend_list.setUpdatesEnabled(True)
+
+    def _on_legend_row_changed(self, row):
+        item = self.legend_list.item(row)
+        if item is None:
+            self.highlight(None)
+            return
+        self.highlight(item.data(Qt.ItemDataRole.UserRole))
+
+    def highlight(self, series_id):
+        """Draw one series on top in a thick pen, or clear the highlight."""
+        if self._highlight is not None:
+            self.plot_widget.removeItem(self._highlight)
+            self._highlight = None
+        if series_id is None:
+            return
+
+        x, y = self.series[series_id]
+        color = SERIES_COLORS[series_id % len(SERIES_COLORS)]
+        self._highlight = pg.PlotCurveItem(
+            x, y, pen=pg.mkPen(color=color, width=3), skipFiniteCheck=True
+        )
+        self._highlight.setZValue(50)
+        self.plot_widget.addItem(self._highlight)
+
+    def _on_mouse_moved(self, scene_pos):
+        view_box = self.plot_widget.getViewBox()
+        if self.pick_index is None or not view_box.sceneBoundingRect().contains(
+            scene_pos
+        ):
+            self.hover_label.hide()
+            return
+
+        point = view_box.mapSceneToView(scene_pos)
+        pixel_width, pixel_height = view_box.viewPixelSize()
+        series_id = self.pick_index.nearest(
+            point.x(),
+            point.y(),
+            PICK_TOLERANCE_PX * pixel_width,
+            PICK_TOLERANCE_PX * pixel_height,
+        )
+        if series_id is None:
+            self.hover_label.hide()
+            return
+
+        self.hover_label.setText(self.labels[series_id])
+        self.hover_label.setPos(point.x(), point.y())
+        self.hover_label.show()
@@ -0,0 +1,115 @@
+"""
+BRO Grondwater Plugin - Query boxes and clipping for polygon based retrieval
+"""
+
+import heapq
+
+from qgis.core import QgsGeometry, QgsPointXY, QgsRectangle
+
+# Upper limit on the number of boxes queried for one polygon
+MAX_BOXES = 32
+
+# Boxes smaller than this (m) are not split further
+MIN_BOX_SIZE = 250.0
+
+
+class PolygonQuery:
+    """Cover a polygon with tight query boxes and clip wells to it.
+
+    The polygon bounding box is split recursively, always splitting the box
+    with the most area outside the polygon first, until ``max_boxes`` is
+    reached. Boxes outside the polygon are dropped and the rest shrunk to
+    their part of the polygon. Elongated areas (dikes, pipelines) are then
+    queried with a few narrow boxes instead of one large bounding box.
+
+    All geometry tests go through one prepared geometry engine.
+    """
+
+    def __init__(self, geometry, buffer_distance=0.0):
+        if buffer_distance:
+            geometry = geometry.buffer(buffer_distance, 8)
+        self.geometry = geometry
+        self._engine = QgsGeometry.createGeometryEngine(geometry.constGet())
+        self._engine.prepareGeometry()
+        self._area = geometry.area()
+
+    def _outside_area(self, rect):
+        """Return the area of the box outside the polygon, or None if disjoint."""
+        box = QgsGeometry.fromRect(rect)
+        if not self._engine.intersects(box.constGet()):
+            return None
+        if self._engine.contains(box.constGet()):
+            return 0.0
+        return rect.area() - box.intersection(self.geometry).area()
+
+    def boxes(self, max_boxes=MAX_BOXES, min_size=MIN_BOX_SIZE):
+        """Return query boxes as (xmin, xmax, ymin, ymax) tuples."""
+        root = self.geometry.boundingBox()
+        outside = self._outside_area(root)
+        if outside is None:
+            return []
+
+        # Max-heap on the area outside the polygon; the counter keeps it stable
+        heap = [(-outside, 0, root)]
+        counter = 1
+        while heap and len(heap) < max_boxes:
+            waste, _, rect = heap[0]
+            if -waste <= 0 or max(rect.width(), rect.height()) < 2 * min_size:
+                break
+            heapq.heappop(heap)
+
+            # Split along the long side
+            if rect.width() >= rect.height():
+                middle = rect.xMinimum() + rect.width() / 2
+                halves = (
+                    QgsRectangle(rect.xMinimum(), rect.yMinimum(), middle, rect.yMaximum()),
+                    QgsRectangle(middle, rect.yMinimum(), rect.xMaximum(), rect.yMaximum()),
+                )
+            else:
+                middle = rect.yMinimum() + rect.height() / 2
+                halves = (
+                    QgsRectangle(rect.xMinimum(), rect.yMinimum(), rect.xMaximum(), middle),
+                    QgsRectangle(rect.xMinimum(), middle, rect.xMaximum(), rect.yMaximum()),
+                )
+            for half in halves:
+                # Shrink to the part of the polygon inside the half
+                part = QgsGeometry.fromRect(half).intersection(self.geometry)
+                if part.isEmpty():
+                    continue
+                tight = part.boundingBox()
+                outside = self._outside_area(tight)
+                if outside is not None:
+                    heapq.heappush(heap, (-outside, counter, tight))
+                    counter += 1
+
+        return [
+            (rect.xMinimum(), rect.xMaximum(), rect.yMinimum(), rect.yMaximum())
+            for _, _, rect in sorted(heap, key=lambda item: item[1])
+        ]
+
+    def contains(self, x, y):
+        """Return True if the point lies inside (or on the edge of) the polygon."""
+        point = QgsGeometry.fromPointXY(QgsPointXY(x, y))
+        return self._engine.intersects(point.constGet())
+
+    def clip(self, records):
+        """Return the records whose x/y lie inside the polygon."""
+        return [r for r in records if self.contains(r["x"], r["y"])]
+
+    def extent(self):
+        """Return the polygon bounding box as (xmin, xmax, ymin, ymax)."""
+        rect = self.geometry.boundingBox()
+        return (rect.xMinimum(), rect.xMaximum(), rect.yMinimum(), rect.yMaximum())
+
+
+def dedupe_records(records):
+    """Drop wells found by more than one query box (same bro_id and tube)."""
+    seen = set()
+    unique = []
+    for record in records:
+        key = (record.get("bro_id"), record.get("tube_nr"), record.get("name"))
+        if key in seen:
+            continue
+        seen.add(key)
+        unique.append(record)
+    return unique
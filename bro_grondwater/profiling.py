@@ -0,0 +1,219 @@
+"""
+BRO Grondwater Plugin - Opt-in cProfile/tracemalloc capture per operation
+"""
+
+import cProfile
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+from datetime import datetime
+
+# Number of allocation sites listed in the memory report
+MEMORY_TOP = 30
+
+# Stack depth recorded per allocation
+TRACEMALLOC_FRAMES = 10
+
+
+class ProfilingSession:
+    """cProfile and tracemalloc capture of one operation.
+
+    Worker threads get their own profiler through :meth:`wrap`; their stats
+    are merged into the report when the session stops. On Python 3.12 and
+    later the main profiler already sees every thread, so the worker
+    profilers are skipped there.
+
+    After :meth:`pause` the main profiler only records the calls made
+    through :meth:`span`, e.g. timer callbacks of an operation that goes on
+    in the background; the report lists their count and durations.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.started = datetime.now()
+        self._start_time = time.perf_counter()
+        self._profile = cProfile.Profile()
+        self._thread_profiles = []
+        self._spans = {}
+        self._recording = False
+        self._lock = threading.Lock()
+        self._owns_tracemalloc = not tracemalloc.is_tracing()
+
+        if self._owns_tracemalloc:
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+        tracemalloc.reset_peak()
+        self._snapshot = tracemalloc.take_snapshot()
+        self._profile.enable()
+        self._recording = True
+
+    def pause(self):
+        """Stop the main profiler until the next :meth:`span` call."""
+        if self._recording:
+            self._profile.disable()
+            self._recording = False
+
+    def span(self, function):
+        """Return ``function`` recorded by the main profiler, each call timed."""
+        name = function.__name__
+
+        def run(*args, **kwargs):
+            start = time.perf_counter()
+            recording = False
+            if not self._recording:
+                try:
+                    self._profile.enable()
+                    self._recording = recording = True
+                except ValueError:
+                    # Another profiler is active and covers this thread
+                    pass
+            try:
+                return function(*args, **kwargs)
+            finally:
+                if recording:
+                    self.pause()
+                seconds = time.perf_counter() - start
+                count, total, longest = self._spans.get(name, (0, 0.0, 0.0))
+                self._spans[name] = (count + 1, total + seconds, max(longest, seconds))
+
+        return run
+
+    def wrap(self, function):
+        """Return ``function`` profiled in the thread it runs in."""
+
+        def run(*args, **kwargs):
+            profile = cProfile.Profile()
+            try:
+                profile.enable()
+            except ValueError:
+                # Another profiler is active and covers this thread
+                return function(*args, **kwargs)
+            try:
+                return function(*args, **kwargs)
+            finally:
+                profile.disable()
+                with self._lock:
+                    self._thread_profiles.append(profile)
+
+        return run
+
+    def stop(self, output_dir):
+        """Stop capturing and write the reports; returns (prof_path, memory_path)."""
+        self.pause()
+        duration = time.perf_counter() - self._start_time
+        snapshot = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        if self._owns_tracemalloc:
+            tracemalloc.stop()
+
+        os.makedirs(output_dir, exist_ok=True)
+        base = os.path.join(
+            output_dir, f"{self.started.strftime('%Y%m%d_%H%M%S')}_{self.name}"
+        )
+
+        stats = pstats.Stats(self._profile)
+        with self._lock:
+            for profile in self._thread_profiles:
+                stats.add(profile)
+        prof_path = base + ".prof"
+        stats.dump_stats(prof_path)
+
+        memory_path = base + "_memory.txt"
+        ignore = [
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        ]
+        differences = snapshot.filter_traces(ignore).compare_to(
+            self._snapshot.filter_traces(ignore), "lineno"
+        )
+        with open(memory_path, "w", encoding="utf-8") as f:
+            f.write(f"Operation: {self.name}\n")
+            f.write(f"Started: {self.started.isoformat(timespec='seconds')}\n")
+            f.write(f"Duration: {duration:.2f} s\n")
+            f.write(f"Worker threads profiled: {len(self._thread_profiles)}\n")
+            f.write(f"Traced memory: {current / 1e6:.1f} MB (peak {peak / 1e6:.1f} MB)\n")
+            for span_name, (count, total, longest) in self._spans.items():
+                f.write(
+                    f"Span {span_name}: {count} calls, {total:.2f} s in total, "
+                    f"longest {longest * 1000:.0f} ms\n"
+                )
+            f.write("\n")
+            f.write(f"Top {MEMORY_TOP} allocation sites by growth:\n")
+            for difference in differences[:MEMORY_TOP]:
+                f.write(f"{difference}\n")
+            f.write("\nTop functions by cumulative time:\n")
+            stats.stream = f
+            stats.sort_stats("cumulative").print_stats(MEMORY_TOP)
+
+        return prof_path, memory_path
+
+
+class OperationProfiler:
+    """Profile top-level plugin operations when enabled.
+
+    Operations that continue in the background (downloads) call
+    :meth:`keep_running` and end the session themselves with :meth:`finish`.
+    Between the operation method and :meth:`finish` only worker threads
+    (:meth:`wrap`) and callbacks wrapped with :meth:`span` are recorded, not
+    whatever else the GUI thread does meanwhile.
+    ``on_report`` is called with the paths of the written reports.
+    """
+
+    def __init__(self, output_dir, on_report=None):
+        self.output_dir = output_dir
+        self.on_report = on_report
+        self.enabled = False
+        self.session = None
+        self._keep_running = False
+
+    def slot(self, method):
+        """Return a signal slot that runs ``method`` profiled (signal args are dropped)."""
+
+        def run(*_):
+            return self.run(method)
+
+        return run
+
+    def run(self, method, *args, **kwargs):
+        """Call ``method`` in a new session, unless disabled or one is running."""
+        if not self.enabled or self.session is not None:
+            return method(*args, **kwargs)
+
+        self.session = ProfilingSession(method.__name__)
+        self._keep_running = False
+        try:
+            return method(*args, **kwargs)
+        finally:
+            if not self._keep_running:
+                self.finish()
+            elif self.session is not None:
+                self.session.pause()
+
+    def keep_running(self):
+        """Keep the current session open after the operation method returns."""
+        if self.session is not None:
+            self._keep_running = True
+
+    def wrap(self, function):
+        """Return ``function`` profiled per worker thread when a session runs."""
+        if self.session is None:
+            return function
+        return self.session.wrap(function)
+
+    def span(self, function):
+        """Return ``function`` recorded as a span of the running session, if any."""
+        if self.session is None:
+            return function
+        return self.session.span(function)
+
+    def finish(self):
+        """End the running session and write its reports."""
+        session, self.session = self.session, None
+        self._keep_running = False
+        if session is None:
+            return None
+        paths = session.stop(self.output_dir)
+        if self.on_report is not None:
+            self.on_report(session.name, paths)
+        return paths
@@ -0,0 +1,162 @@
+"""
+BRO Grondwater Plugin - SQLite store for downloaded measurement series
+"""
+
+import json
+import os
+import re
+import sqlite3
+import warnings
+import zlib
+
+import numpy as np
+
+from .gld_parser import WINTERTIME_OFFSET
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS series (
+    cache_key TEXT PRIMARY KEY,
+    name TEXT,
+    bro_id TEXT,
+    tube_nr INTEGER,
+    metadata TEXT,
+    n INTEGER,
+    payload BLOB
+)
+"""
+
+
+# Timezone designator at the end of an ISO timestamp
+_TZ_SUFFIX = re.compile(r"T.*(Z|[+-]\d\d:?\d\d)$")
+
+
+def utc_times(dates):
+    """Return stored ISO date strings as datetime64[s] in UTC.
+
+    Stored series are naive Dutch winter time (UTC+1), as written by
+    hydropandas and the streaming parser; timezone-aware strings are
+    converted by their own offset.
+    """
+    with warnings.catch_warnings():
+        # Timezone-aware strings are converted to UTC by numpy
+        warnings.simplefilter("ignore")
+        moments = np.array(dates, dtype="datetime64[s]")
+    naive = np.fromiter(
+        (_TZ_SUFFIX.search(date) is None for date in dates), dtype=bool, count=len(moments)
+    )
+    moments[naive] -= np.timedelta64(WINTERTIME_OFFSET, "s")
+    return moments
+
+
+def sidecar_path(project_file):
+    """Return the series store that belongs next to a project file."""
+    base, _ = os.path.splitext(project_file)
+    return f"{base}_bro_series.sqlite"
+
+
+def _encode(dates, values):
+    return zlib.compress(json.dumps({"dates": dates, "values": values}).encode("utf-8"))
+
+
+def _decode(payload):
+    return json.loads(zlib.decompress(payload).decode("utf-8"))
+
+
+class SeriesStore:
+    """Persist measurement series outside of memory.
+
+    Series are kept as compressed blobs keyed by the plugin cache key, so the
+    index can be read quickly and individual series are only decoded on demand.
+    A new connection is opened per call, which keeps the store usable from
+    worker threads.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute(SCHEMA)
+        return conn
+
+    def write(self, measurements):
+        """Write {cache_key: measurement} entries that hold data, in one transaction.
+
+        Returns the number of series written.
+        """
+        rows = []
+        for cache_key, measurement in measurements.items():
+            data = measurement.get("data")
+            if not data:
+                continue
+            rows.append(
+                (
+                    cache_key,
+                    measurement.get("name"),
+                    measurement.get("bro_id"),
+                    measurement.get("tube_nr"),
+                    json.dumps(data.get("metadata", {}), default=str),
+                    len(data.get("dates", [])),
+                    _encode(data.get("dates", []), data.get("values", [])),
+                )
+            )
+
+        if not rows:
+            return 0
+
+        conn = self._connect()
+        try:
+            with conn:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO series VALUES (?, ?, ?, ?, ?, ?, ?)", rows
+                )
+        finally:
+            conn.close()
+        return len(rows)
+
+    def read_index(self):
+        """Return a list of stored series without their measurements."""
+        if not os.path.exists(self.path):
+            return []
+
+        conn = self._connect()
+        try:
+            rows = conn.execute(
+                "SELECT cache_key, name, bro_id, tube_nr, metadata, n FROM series"
+            ).fetchall()
+        finally:
+            conn.close()
+
+        return [
+            {
+                "cache_key": cache_key,
+                "name": name,
+                "bro_id": bro_id,
+                "tube_nr": tube_nr,
+                "metadata": json.loads(metadata or "{}"),
+                "count": n,
+            }
+            for cache_key, name, bro_id, tube_nr, metadata, n in rows
+        ]
+
+    def load(self, cache_key):
+        """Return the data dictionary of a stored series, or None."""
+        if not os.path.exists(self.path):
+            return None
+
+        conn = self._connect()
+        try:
+            row = conn.execute(
+                "SELECT metadata, payload FROM series WHERE cache_key = ?",
+                (cache_key,),
+            ).fetchone()
+        finally:
+            conn.close()
+
+        if row is None:
+            return None
+
+        metadata, payload = row
+        data = _decode(payload)
+        data["metadata"] = json.loads(metadata or "{}")
+        return data
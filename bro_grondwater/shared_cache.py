@@ -0,0 +1,211 @@
+"""
+BRO Grondwater Plugin - Measurement cache shared between QGIS processes
+
+Several QGIS sessions (e.g. on a terminal server) can point to the same
+cache directory. Entries are written to a temporary file and renamed into
+place, so readers never see a partly written file. A download of a GMW is
+claimed with a lock file created with O_EXCL; other processes that need the
+same GMW wait for the lock and then read the entry instead of downloading it
+again. Lock files of crashed sessions are removed once their heartbeat is
+older than ``stale_after`` seconds; only one session at a time may do so,
+guarded by a second ``.break`` lock file.
+"""
+
+import gzip
+import json
+import os
+import re
+import socket
+import tempfile
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+from .time_window import merge_series, missing_spans, series_coverage
+
+# A lock whose heartbeat is older than this (s) belongs to a crashed session
+STALE_LOCK_SECONDS = 120
+
+# Interval (s) for checking whether a lock held by another process is released
+POLL_SECONDS = 0.5
+
+
+def _safe_name(value):
+    return re.sub(r"[^\w.-]", "_", str(value))
+
+
+class SharedSeriesCache:
+    """Series per (GMW, tube) in a directory shared between processes."""
+
+    def __init__(self, directory, stale_after=STALE_LOCK_SECONDS, poll=POLL_SECONDS):
+        self.directory = directory
+        self.stale_after = stale_after
+        self.poll = poll
+        os.makedirs(directory, exist_ok=True)
+
+    def _entry_path(self, gmw_id, tube_nr):
+        return os.path.join(self.directory, _safe_name(gmw_id), f"{int(tube_nr)}.json.gz")
+
+    def _lock_path(self, gmw_id):
+        return os.path.join(self.directory, f"{_safe_name(gmw_id)}.lock")
+
+    def read(self, gmw_id, tube_nr):
+        """Return the cached series data of a tube, or None."""
+        try:
+            with gzip.open(self._entry_path(gmw_id, tube_nr), "rt", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            # Missing, or removed/replaced by another process while reading
+            return None
+
+    def lookup(self, gmw_id, tube_nrs, window):
+        """Return {tube_nr: series data} for the tubes cached for the whole window."""
+        found = {}
+        for tube_nr in tube_nrs:
+            data = self.read(gmw_id, tube_nr)
+            if data is not None and not missing_spans(series_coverage(data), window):
+                found[tube_nr] = data
+        return found
+
+    def write(self, gmw_id, tube_nr, data):
+        """Merge series data into the entry of a tube with an atomic rename.
+
+        Callers hold the lock of the GMW, so the read-merge-write does not
+        race with other writers of the same entry.
+        """
+        path = self._entry_path(gmw_id, tube_nr)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        stored = self.read(gmw_id, tube_nr)
+        if stored is not None:
+            data = merge_series(stored, data)
+
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as raw, gzip.GzipFile(fileobj=raw, mode="wb") as f:
+                f.write(json.dumps(data).encode("utf-8"))
+            os.replace(tmp_path, path)
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+
+    def _try_lock(self, path):
+        """Create a lock file; returns its owner token, or None if it exists."""
+        try:
+            fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            return None
+        token = uuid.uuid4().hex
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "host": socket.gethostname(),
+                    "pid": os.getpid(),
+                    "time": time.time(),
+                    "token": token,
+                },
+                f,
+            )
+        return token
+
+    def _owns(self, path, token):
+        """Return True if the lock file at ``path`` is still the one holding ``token``."""
+        try:
+            with open(path, encoding="utf-8") as f:
+                return json.load(f).get("token") == token
+        except (OSError, ValueError):
+            return False
+
+    def _release(self, path, token):
+        if self._owns(path, token):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def _age(self, path):
+        """Return the seconds since the heartbeat of a lock, or None if it is gone."""
+        try:
+            return time.time() - os.path.getmtime(path)
+        except OSError:
+            return None
+
+    def _break_if_stale(self, path):
+        """Remove a lock whose heartbeat stopped; returns True if it is gone.
+
+        The lock is removed while holding ``<lock>.break`` and only after its
+        age is checked again, so two sessions that both found it stale cannot
+        remove a fresh lock that a third one created in between.
+        """
+        age = self._age(path)
+        if age is None:
+            return True  # Released in the meantime
+        if age < self.stale_after:
+            return False
+
+        guard = f"{path}.break"
+        token = self._try_lock(guard)
+        if token is None:
+            # Another session is removing it. A guard is only held for a
+            # moment, so an old one was left by a crash
+            guard_age = self._age(guard)
+            if guard_age is not None and guard_age >= self.stale_after:
+                try:
+                    os.remove(guard)
+                except OSError:
+                    pass
+            return False
+        try:
+            age = self._age(path)
+            if age is not None and age >= self.stale_after:
+                os.remove(path)
+        except OSError:
+            pass
+        finally:
+            self._release(guard, token)
+        return True
+
+    def _heartbeat(self, path, token, stop):
+        while not stop.wait(self.stale_after / 4):
+            if not self._owns(path, token):
+                return
+            try:
+                os.utime(path)
+            except OSError:
+                return
+
+    @contextmanager
+    def claim(self, gmw_id, is_cancelled=None):
+        """Hold the download lock of a GMW, waiting while another process has it.
+
+        Yields True when waiting for another process was needed (the cache
+        should be checked again), False when the lock was free. Yields None
+        if cancelled while waiting, without holding the lock.
+        """
+        path = self._lock_path(gmw_id)
+        waited = False
+        while True:
+            token = self._try_lock(path)
+            if token is not None:
+                break
+            waited = True
+            if is_cancelled is not None and is_cancelled():
+                yield None
+                return
+            if not self._break_if_stale(path):
+                time.sleep(self.poll)
+
+        stop = threading.Event()
+        heartbeat = threading.Thread(
+            target=self._heartbeat, args=(path, token, stop), daemon=True
+        )
+        heartbeat.start()
+        try:
+            yield waited
+        finally:
+            stop.set()
+            # A lock taken over after a long stall belongs to another session now
+            self._release(path, token)
@@ -0,0 +1,94 @@
+"""
+BRO Grondwater Plugin - Single-flight registry of series requests
+
+Every (GMW id, tube) that is being requested is registered with the period
+it covers. A consumer that needs the same series for a period within an
+in-flight request joins it and waits for its result, instead of sending
+the same request again.
+"""
+
+import threading
+
+from .time_window import missing_spans
+
+# Interval (s) for checking cancellation while waiting for a joined flight
+POLL_SECONDS = 0.2
+
+
+class Flight:
+    """One in-flight request of a series; its result is shared by all waiters."""
+
+    def __init__(self, window):
+        self.window = tuple(window)
+        self.result = None
+        self._done = threading.Event()
+
+    def covers(self, window):
+        """Return True if this request covers the period ``window``."""
+        return not missing_spans(self.window, window)
+
+    def done(self):
+        return self._done.is_set()
+
+    def wait(self, is_cancelled=None):
+        """Wait for the result; returns None if cancelled while waiting."""
+        while not self._done.wait(POLL_SECONDS):
+            if is_cancelled is not None and is_cancelled():
+                return None
+        return self.result
+
+
+class SingleFlight:
+    """Thread-safe registry of in-flight series requests keyed by (GMW id, tube)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights = {}
+
+    def begin(self, keys, window):
+        """Register a request for ``keys`` over ``window``.
+
+        Returns (owned, joined), both {key: Flight}. The caller must fetch the
+        owned keys and ``finish`` them; joined keys are already in flight for
+        a covering period and only need to be waited for. A key in flight for
+        a shorter period is owned, but its registration is left in place.
+        """
+        owned, joined = {}, {}
+        with self._lock:
+            for key in keys:
+                flight = self._flights.get(key)
+                if flight is not None and flight.covers(window):
+                    joined[key] = flight
+                    continue
+                owned[key] = Flight(window)
+                if flight is None:
+                    self._flights[key] = owned[key]
+        return owned, joined
+
+    def finish(self, key, flight, result):
+        """Publish the result of an owned flight and release its key.
+
+        Only the first result of a flight counts, so finishing twice is safe.
+        """
+        with self._lock:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+            if not flight.done():
+                flight.result = result
+                flight._done.set()
+
+    def abandon(self, owned, result=None):
+        """Finish owned flights that did not get a result, e.g. after a cancel."""
+        for key, flight in owned.items():
+            if not flight.done():
+                self.finish(key, flight, result)
+
+    def in_flight(self, key, window):
+        """Return True if ``key`` is being requested for a period covering ``window``."""
+        with self._lock:
+            flight = self._flights.get(key)
+            return flight is not None and flight.covers(window)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._flights)
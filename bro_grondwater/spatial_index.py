@@ -0,0 +1,62 @@
+"""
+BRO Grondwater Plugin - k-d tree index over well coordinates
+"""
+
+import numpy as np
+
+
+class WellIndex:
+    """k-d tree over RD x/y coordinates for nearest and radius queries.
+
+    BRO wells are strongly clustered (well fields, city centres), so a tree
+    that splits on the points themselves keeps every query to a few leaves,
+    where a uniform grid sized on the average density puts thousands of
+    wells in one cell.
+    """
+
+    def __init__(self, xs, ys, keys):
+        from scipy.spatial import cKDTree
+
+        self.x = np.asarray(xs, dtype=np.float64)
+        self.y = np.asarray(ys, dtype=np.float64)
+        self.keys = list(keys)
+        self._tree = cKDTree(np.column_stack([self.x, self.y])) if len(self.x) else None
+
+    def __len__(self):
+        return len(self.x)
+
+    def query_box(self, xmin, ymin, xmax, ymax):
+        """Return indices of points inside a box."""
+        if self._tree is None:
+            return np.zeros(0, dtype=np.int64)
+
+        # Square around the box centre (Chebyshev distance), then trim to the box
+        center = ((xmin + xmax) / 2, (ymin + ymax) / 2)
+        half = max(xmax - xmin, ymax - ymin) / 2
+        idx = np.asarray(self._tree.query_ball_point(center, half, p=np.inf), dtype=np.int64)
+        mask = (
+            (self.x[idx] >= xmin)
+            & (self.x[idx] <= xmax)
+            & (self.y[idx] >= ymin)
+            & (self.y[idx] <= ymax)
+        )
+        return np.sort(idx[mask])
+
+    def within(self, x, y, radius):
+        """Return indices of points within ``radius`` of (x, y), nearest first."""
+        if self._tree is None:
+            return np.zeros(0, dtype=np.int64)
+
+        idx = np.asarray(self._tree.query_ball_point((x, y), radius), dtype=np.int64)
+        dist2 = (self.x[idx] - x) ** 2 + (self.y[idx] - y) ** 2
+        order = np.lexsort((idx, dist2))
+        return idx[order]
+
+    def nearest(self, x, y, n=1):
+        """Return indices of the ``n`` points nearest to (x, y), nearest first."""
+        n = min(n, len(self.x))
+        if n == 0:
+            return np.zeros(0, dtype=np.int64)
+
+        _, idx = self._tree.query((x, y), k=n)
+        return np.atleast_1d(np.asarray(idx, dtype=np.int64))
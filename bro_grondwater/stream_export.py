@@ -0,0 +1,154 @@
+"""
+BRO Grondwater Plugin - Streaming export of series to Parquet and gzip CSV
+
+Series are read one at a time from the plugin's storage and written in
+fixed-size chunks, so memory use does not grow with the number of points.
+Output is written under a temporary name and moved into place when complete;
+a cancelled export leaves nothing behind.
+"""
+
+import csv
+import gzip
+import io
+import os
+import re
+import shutil
+
+import numpy as np
+
+from .series_store import utc_times
+
+# Points per written chunk (CSV block or Parquet row group)
+CHUNK_ROWS = 100000
+
+# gzip level of the CSV export; higher levels cost more time than they save
+CSV_COMPRESS_LEVEL = 4
+
+CSV_COLUMNS = ["gmw_id", "tube_nr", "name", "time", "value"]
+
+
+def series_chunks(series_data, chunk_rows=CHUNK_ROWS):
+    """Yield (times, values) chunks of one series; times as datetime64[s] UTC."""
+    dates = series_data.get("dates") or []
+    values = series_data.get("values") or []
+    for start in range(0, len(dates), chunk_rows):
+        times = utc_times(dates[start : start + chunk_rows])
+        yield times, np.asarray(values[start : start + chunk_rows], dtype=np.float64)
+
+
+def _csv_prefix(well):
+    """Return the quoted 'gmw_id,tube_nr,name,' start of the rows of a well."""
+    buffer = io.StringIO()
+    csv.writer(buffer, lineterminator="").writerow(
+        [well.get("gmw_id"), well.get("tube_nr"), well.get("name"), ""]
+    )
+    return buffer.getvalue()
+
+
+def export_csv_gz(path, wells, load, progress=None, is_cancelled=None):
+    """Write all series to one gzip CSV in long format.
+
+    ``wells`` is a list of dicts with ``cache_key``, ``gmw_id``, ``tube_nr``
+    and ``name``; ``load(cache_key)`` returns the series data of a well.
+    Returns the number of rows, or None if cancelled.
+    """
+    tmp_path = f"{path}.part"
+    rows = 0
+    try:
+        with gzip.open(
+            tmp_path, "wt", encoding="utf-8", newline="", compresslevel=CSV_COMPRESS_LEVEL
+        ) as f:
+            f.write(",".join(CSV_COLUMNS) + "\n")
+            for done, well in enumerate(wells, 1):
+                series_data = load(well["cache_key"]) or {}
+                prefix = _csv_prefix(well)
+                for times, values in series_chunks(series_data):
+                    if is_cancelled is not None and is_cancelled():
+                        return None
+                    stamps = np.datetime_as_string(times, unit="s").tolist()
+                    f.write(
+                        "".join(
+                            f"{prefix}{stamp}Z,{value:.10g}\n"
+                            for stamp, value in zip(stamps, values.tolist())
+                        )
+                    )
+                    rows += len(times)
+                if progress is not None:
+                    progress(100.0 * done / len(wells))
+        os.replace(tmp_path, path)
+        return rows
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def export_parquet(directory, wells, load, progress=None, is_cancelled=None):
+    """Write all series to a Parquet dataset partitioned by GMW.
+
+    Creates ``gmw_id=<id>/part-0.parquet`` per GMW with the tubes of that
+    well, written chunk by chunk as row groups. An earlier export in the
+    same directory is replaced. Needs pyarrow. Returns the number of rows,
+    or None if cancelled.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    if os.path.exists(directory) and not all(
+        entry.startswith("gmw_id=") for entry in os.listdir(directory)
+    ):
+        raise FileExistsError(f"{directory} exists and is not a Parquet export")
+
+    schema = pa.schema(
+        [
+            ("tube_nr", pa.int32()),
+            ("name", pa.string()),
+            ("time", pa.timestamp("s", tz="UTC")),
+            ("value", pa.float64()),
+        ]
+    )
+
+    by_gmw = {}
+    for well in wells:
+        by_gmw.setdefault(str(well.get("gmw_id")), []).append(well)
+
+    tmp_dir = f"{directory}.part"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    rows = 0
+    done = 0
+    try:
+        for gmw_id, gmw_wells in by_gmw.items():
+            partition = os.path.join(tmp_dir, "gmw_id=" + re.sub(r"[^\w.-]", "_", gmw_id))
+            os.makedirs(partition, exist_ok=True)
+            with pq.ParquetWriter(
+                os.path.join(partition, "part-0.parquet"), schema, compression="zstd"
+            ) as writer:
+                for well in gmw_wells:
+                    series_data = load(well["cache_key"]) or {}
+                    tube_nr = int(well.get("tube_nr") or 1)
+                    name = str(well.get("name") or "")
+                    for times, values in series_chunks(series_data):
+                        if is_cancelled is not None and is_cancelled():
+                            return None
+                        n = len(times)
+                        writer.write_table(
+                            pa.table(
+                                [
+                                    pa.repeat(pa.scalar(tube_nr, pa.int32()), n),
+                                    pa.repeat(pa.scalar(name, pa.string()), n),
+                                    pa.array(times, type=pa.timestamp("s", tz="UTC")),
+                                    pa.array(values),
+                                ],
+                                schema=schema,
+                            )
+                        )
+                        rows += n
+                    done += 1
+                    if progress is not None:
+                        progress(100.0 * done / len(wells))
+
+        if os.path.exists(directory):
+            shutil.rmtree(directory)
+        os.replace(tmp_dir, directory)
+        return rows
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
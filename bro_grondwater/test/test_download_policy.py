@@ -0,0 +1,75 @@
+"""Tests for the download retry policy."""
+
+import unittest
+
+from bro_grondwater.download_policy import (
+    PERMANENT,
+    THROTTLED,
+    TRANSIENT,
+    CircuitBreaker,
+    fetch_with_retries,
+)
+
+
+class _Response:
+    def __init__(self, status_code):
+        self.status_code = status_code
+
+
+class _HTTPError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f"{status_code} error")
+        self.response = _Response(status_code)
+
+
+def _failing(*errors, result="ok"):
+    """Return a fetch function raising ``errors`` in turn, then returning ``result``."""
+    remaining = list(errors)
+
+    def fetch():
+        if remaining:
+            raise remaining.pop(0)
+        return result
+
+    return fetch
+
+
+class FetchWithRetriesTest(unittest.TestCase):
+    def setUp(self):
+        self.attempts = []
+
+    def _fetch(self, fetch, **kwargs):
+        return fetch_with_retries(
+            fetch,
+            CircuitBreaker(),
+            backoff=0,
+            on_attempt=lambda waited, seconds, kind: self.attempts.append(kind),
+            **kwargs,
+        )
+
+    def test_throttled_and_transient_errors_are_retried(self):
+        result = self._fetch(_failing(_HTTPError(429), _HTTPError(503)))
+        self.assertEqual(result, ("ok", None, None))
+        self.assertEqual(self.attempts, [THROTTLED, TRANSIENT, None])
+
+    def test_permanent_error_is_not_retried(self):
+        result, error, kind = self._fetch(_failing(_HTTPError(404)))
+        self.assertIsNone(result)
+        self.assertEqual((error, kind), ("404 error", PERMANENT))
+        self.assertEqual(self.attempts, [PERMANENT])
+
+    def test_gives_up_after_max_retries(self):
+        errors = [_HTTPError(503) for _ in range(3)]
+        result, _, kind = self._fetch(_failing(*errors), max_retries=3)
+        self.assertIsNone(result)
+        self.assertEqual(kind, TRANSIENT)
+        self.assertEqual(len(self.attempts), 3)
+
+    def test_cancelled_while_breaker_waits(self):
+        result = self._fetch(_failing(), is_cancelled=lambda: True)
+        self.assertEqual(result, (None, "Cancelled", TRANSIENT))
+        self.assertEqual(self.attempts, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
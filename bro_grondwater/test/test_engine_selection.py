@@ -0,0 +1,69 @@
+"""Tests for the hydropandas engine policy and response replay."""
+
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+from bro_grondwater.engine_selection import (
+    BRODATA_ENGINE,
+    DEFAULT_ENGINE,
+    EXPLORE_EVERY,
+    EnginePolicy,
+    recorded_responses,
+)
+
+BUCKET = "1-10 km2"
+
+
+class EnginePolicyTest(unittest.TestCase):
+    def test_benchmarks_decide_without_live_timings(self):
+        policy = EnginePolicy(
+            [BRODATA_ENGINE, DEFAULT_ENGINE],
+            benchmarks={BUCKET: {BRODATA_ENGINE: [3, 2.0], DEFAULT_ENGINE: [3, 1.0]}},
+        )
+        self.assertEqual(policy.fastest(BUCKET), DEFAULT_ENGINE)
+
+    def test_other_engine_is_explored(self):
+        policy = EnginePolicy([BRODATA_ENGINE, DEFAULT_ENGINE])
+        choices = [policy.choose(BUCKET) for _ in range(2 * EXPLORE_EVERY)]
+        self.assertEqual(choices.count(DEFAULT_ENGINE), 2)
+        self.assertEqual(choices[EXPLORE_EVERY - 1], DEFAULT_ENGINE)
+
+        # Once both have live timings, those decide
+        policy.record(BUCKET, BRODATA_ENGINE, 5.0)
+        policy.record(BUCKET, DEFAULT_ENGINE, 1.0)
+        self.assertEqual(policy.fastest(BUCKET), DEFAULT_ENGINE)
+
+    def test_single_engine_is_not_explored(self):
+        policy = EnginePolicy([DEFAULT_ENGINE])
+        choices = {policy.choose(BUCKET) for _ in range(2 * EXPLORE_EVERY)}
+        self.assertEqual(choices, {DEFAULT_ENGINE})
+
+
+class RecordedResponsesTest(unittest.TestCase):
+    def test_requests_from_other_threads_are_replayed(self):
+        import requests
+
+        def send(adapter, request, **kwargs):
+            response = requests.Response()
+            response.status_code = 200
+            response._content = request.url.encode("utf-8")
+            return response
+
+        url = "https://publiek.broservices.nl/gm/v1/gmw-relations/GMW000000000001"
+        results = []
+        with tempfile.TemporaryDirectory() as fixture_dir:
+            with mock.patch("requests.adapters.HTTPAdapter.send", send):
+                with recorded_responses(fixture_dir):
+                    requests.get(url)
+            with recorded_responses(fixture_dir):
+                # Without the fake transport this only succeeds from the recording
+                worker = threading.Thread(target=lambda: results.append(requests.get(url)))
+                worker.start()
+                worker.join()
+        self.assertEqual(results[0].content, url.encode("utf-8"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,94 @@
+"""Tests for the streaming GLD parser against hydropandas.
+
+The documents in ``fixtures`` follow the BRO public REST services: one GMW,
+its gmw-relations and two GLDs of tube 1, covering both daylight saving
+switches, a nil value and duplicate timestamps.
+"""
+
+import io
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+
+from bro_grondwater.gld_parser import (
+    GLDSeries,
+    compare_with_hydropandas,
+    parse_gld,
+    validate_against_hydropandas,
+)
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures")
+GMW_ID = "GMW000000000001"
+
+
+def _serve_fixture(adapter, request, **kwargs):
+    """HTTPAdapter.send that answers BRO requests from ``FIXTURES``."""
+    import requests
+    from urllib.parse import urlsplit
+
+    path = urlsplit(request.url).path
+    bro_id = path.rsplit("/", 1)[-1]
+    if "/gmw-relations/" in path:
+        name = f"gmw-relations_{bro_id}.json"
+    else:
+        name = f"{bro_id}.xml"
+
+    response = requests.Response()
+    response.url = request.url
+    response.request = request
+    try:
+        with open(os.path.join(FIXTURES, name), "rb") as f:
+            content = f.read()
+        response.status_code = 200
+    except FileNotFoundError:
+        content = b""
+        response.status_code = 404
+    response.raw = io.BytesIO(content)
+    response.encoding = "utf-8"
+    return response
+
+
+class ParseGldTest(unittest.TestCase):
+    def test_first_of_duplicate_timestamps_is_kept(self):
+        series = parse_gld(os.path.join(FIXTURES, "GLD000000000001.xml"))
+        dates = list(series.iso_dates())
+        self.assertEqual(dates.count("2020-03-29T11:00:00"), 1)
+        self.assertEqual(series.values[dates.index("2020-03-29T11:00:00")], 1.25)
+
+    def test_concatenate_keeps_the_first_part(self):
+        first = GLDSeries(np.array([0, 60]), np.array([1.0, 2.0]), np.array([0, 0]), ["a"])
+        second = GLDSeries(np.array([60, 120]), np.array([5.0, 3.0]), np.array([0, 0]), ["b"])
+        combined = GLDSeries.concatenate([first, second])
+        np.testing.assert_array_equal(combined.times, [0, 60, 120])
+        np.testing.assert_array_equal(combined.values, [1.0, 2.0, 3.0])
+
+    def test_matches_hydropandas(self):
+        import hydropandas as hpd
+
+        with mock.patch("requests.adapters.HTTPAdapter.send", _serve_fixture):
+            obs = hpd.GroundwaterObs.from_bro(GMW_ID, 1)
+        series = GLDSeries.concatenate(
+            [
+                parse_gld(os.path.join(FIXTURES, f"{gld_id}.xml"))
+                for gld_id in ("GLD000000000001", "GLD000000000002")
+            ]
+        )
+        report = compare_with_hydropandas(series, obs)
+        self.assertTrue(report["matches"], report)
+        self.assertEqual(report["parser_points"], 9)
+
+    def test_validate_records_and_replays(self):
+        with tempfile.TemporaryDirectory() as fixture_dir:
+            with mock.patch("requests.adapters.HTTPAdapter.send", _serve_fixture):
+                recorded = validate_against_hydropandas(GMW_ID, 1, fixture_dir)
+            # Without the fake transport every request must come from the recording
+            replayed = validate_against_hydropandas(GMW_ID, 1, fixture_dir)
+        self.assertTrue(recorded["matches"], recorded)
+        self.assertEqual(replayed, recorded)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,61 @@
+"""Tests for the long term level statistics of head_surface."""
+
+import unittest
+
+import numpy as np
+
+from bro_grondwater.head_surface import GHG, GLG, GVG, series_statistic
+
+
+def _manual_series(first_year, last_year, hour=10):
+    """Manual measurements on the 14th and 28th of every month, at ``hour``."""
+    times = np.array(
+        [
+            np.datetime64(f"{year:04d}-{month:02d}-{day:02d}T{hour:02d}:00", "s").astype(np.int64)
+            for year in range(first_year, last_year + 1)
+            for month in range(1, 13)
+            for day in (14, 28)
+        ],
+        dtype=np.float64,
+    )
+    # Seasonal level: high in winter, low in summer
+    day_of_year = (times / 86400) % 365.25
+    values = -1.0 + 0.5 * np.cos(2 * np.pi * day_of_year / 365.25)
+    return times, values
+
+
+class SeriesStatisticTest(unittest.TestCase):
+    def test_manual_series_on_14th_and_28th(self):
+        times, values = _manual_series(2010, 2019)
+        ghg = series_statistic(times, values, GHG)
+        glg = series_statistic(times, values, GLG)
+        gvg = series_statistic(times, values, GVG)
+
+        for statistic in (ghg, glg, gvg):
+            self.assertFalse(np.isnan(statistic))
+        self.assertGreater(ghg, gvg)
+        self.assertGreater(gvg, glg)
+        self.assertAlmostEqual(ghg, values.max(), delta=0.05)
+        self.assertAlmostEqual(glg, values.min(), delta=0.05)
+
+    def test_measurement_on_the_sample_date_is_used(self):
+        # Only the three GVG dates are measured, far apart from each other
+        times = np.array(
+            [
+                np.datetime64(date, "s").astype(np.int64)
+                for date in ("2015-03-14T10:00", "2015-03-28T10:00", "2015-04-14T10:00")
+            ],
+            dtype=np.float64,
+        )
+        values = np.array([-0.4, -0.6, -0.8])
+        self.assertAlmostEqual(series_statistic(times, values, GVG), -0.6)
+
+    def test_long_gaps_give_nan(self):
+        times, values = _manual_series(2010, 2012)
+        # Keep one measurement every three months
+        sparse = slice(None, None, 6)
+        self.assertTrue(np.isnan(series_statistic(times[sparse], values[sparse], GHG)))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,56 @@
+"""Tests for the snapshot metadata store."""
+
+import os
+import tempfile
+import unittest
+
+from bro_grondwater.metadata_store import MetadataStore, read_csv_snapshot
+
+
+def _write_csv(path, rows):
+    with open(path, "w", encoding="utf-8-sig") as f:
+        f.write("bro_id;tube_nr;x;y\n")
+        for i in range(rows):
+            f.write(f"GMW{i:012d};1;{155000 + i};463000\n")
+
+
+class MetadataStoreTest(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self._tmp.cleanup)
+        self.csv_path = os.path.join(self._tmp.name, "snapshot.csv")
+        self.store_dir = os.path.join(self._tmp.name, "store")
+        self.store = MetadataStore(os.path.join(self.store_dir, "snapshot.sqlite"))
+
+    def test_csv_progress_is_a_fraction_of_the_file(self):
+        _write_csv(self.csv_path, 35000)
+        fractions = []
+        rows = sum(1 for _ in read_csv_snapshot(self.csv_path, fractions.append))
+        self.assertEqual(rows, 35000)
+        self.assertEqual(len(fractions), 3)
+        self.assertEqual(fractions, sorted(fractions))
+        self.assertTrue(0 < fractions[0] and fractions[-1] <= 1)
+
+    def test_cancelled_import_leaves_no_files(self):
+        _write_csv(self.csv_path, 100)
+        result = self.store.ingest(
+            read_csv_snapshot(self.csv_path), self.csv_path, is_cancelled=lambda: True
+        )
+        self.assertIsNone(result)
+        self.assertEqual(os.listdir(self.store_dir), [])
+
+    def test_failed_import_keeps_the_previous_snapshot(self):
+        _write_csv(self.csv_path, 100)
+        self.assertEqual(self.store.ingest(read_csv_snapshot(self.csv_path), self.csv_path), 100)
+
+        def broken_rows():
+            yield {"bro_id": "GMW000000000001", "x": "155000", "y": "463000"}
+            raise IOError("read error")
+
+        with self.assertRaises(IOError):
+            self.store.ingest(broken_rows(), self.csv_path)
+        self.assertEqual(os.listdir(self.store_dir), ["snapshot.sqlite"])
+
+
+if __name__ == "__main__":
+    unittest.main()
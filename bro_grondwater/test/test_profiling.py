@@ -0,0 +1,48 @@
+"""Tests for the operation profiler."""
+
+import pstats
+import tempfile
+import unittest
+
+from bro_grondwater.profiling import OperationProfiler
+
+
+def _between_ticks():
+    return sum(range(1000))
+
+
+def _tick():
+    return sum(range(1000))
+
+
+class OperationProfilerTest(unittest.TestCase):
+    def test_background_operation_records_only_spans(self):
+        with tempfile.TemporaryDirectory() as output_dir:
+            reports = []
+            profiler = OperationProfiler(output_dir, lambda name, paths: reports.append(paths))
+            profiler.enabled = True
+            ticks = []
+
+            def start_download():
+                ticks.append(profiler.span(_tick))
+                profiler.keep_running()
+
+            profiler.run(start_download)
+            for _ in range(3):
+                _between_ticks()
+                ticks[0]()
+            profiler.finish()
+
+            prof_path, memory_path = reports[0]
+            functions = {name for _, _, name in pstats.Stats(prof_path).stats}
+            with open(memory_path, encoding="utf-8") as f:
+                memory_report = f.read()
+
+        self.assertIn("start_download", functions)
+        self.assertIn("_tick", functions)
+        self.assertNotIn("_between_ticks", functions)
+        self.assertIn("Span _tick: 3 calls", memory_report)
+
+
+if __name__ == "__main__":
+    unittest.main()
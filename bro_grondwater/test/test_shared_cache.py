@@ -0,0 +1,73 @@
+"""Tests for the locks of the cache shared between QGIS sessions."""
+
+import os
+import tempfile
+import threading
+import time
+import unittest
+
+from bro_grondwater.shared_cache import SharedSeriesCache
+
+GMW_ID = "GMW000000000001"
+
+
+class ClaimTest(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self._tmp.cleanup)
+        self.cache = SharedSeriesCache(self._tmp.name, stale_after=1.0, poll=0.01)
+        self.lock_path = self.cache._lock_path(GMW_ID)
+
+    def _leave_stale_lock(self):
+        with open(self.lock_path, "w", encoding="utf-8") as f:
+            f.write('{"token": "crashed"}')
+        old = time.time() - 60
+        os.utime(self.lock_path, (old, old))
+
+    def test_fresh_lock_is_not_broken(self):
+        with self.cache.claim(GMW_ID):
+            self.assertFalse(self.cache._break_if_stale(self.lock_path))
+            self.assertTrue(os.path.exists(self.lock_path))
+
+    def test_stale_lock_is_taken_over(self):
+        self._leave_stale_lock()
+        with self.cache.claim(GMW_ID) as waited:
+            self.assertTrue(waited)
+        self.assertEqual(os.listdir(self._tmp.name), [])
+
+    def test_one_holder_at_a_time_after_a_crash(self):
+        self._leave_stale_lock()
+        holders = []
+        most = []
+        lock = threading.Lock()
+
+        def claim():
+            with self.cache.claim(GMW_ID):
+                with lock:
+                    holders.append(1)
+                    most.append(len(holders))
+                time.sleep(0.005)
+                with lock:
+                    holders.pop()
+
+        threads = [threading.Thread(target=claim) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(most), 8)
+        self.assertEqual(max(most), 1)
+        # No lock, guard or moved-aside files are left behind
+        self.assertEqual(os.listdir(self._tmp.name), [])
+
+    def test_release_keeps_a_lock_taken_over_by_another_session(self):
+        with self.cache.claim(GMW_ID):
+            # This session stalled: its lock was broken and claimed elsewhere
+            os.remove(self.lock_path)
+            other = self.cache._try_lock(self.lock_path)
+        self.assertTrue(self.cache._owns(self.lock_path, other))
+
+
+if __name__ == "__main__":
+    unittest.main()
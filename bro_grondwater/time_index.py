@@ -0,0 +1,236 @@
+"""
+BRO Grondwater Plugin - Time-slice index and Temporal Controller animation of levels
+"""
+
+import calendar
+import threading
+
+import numpy as np
+from qgis.core import (
+    Qgis,
+    QgsDateTimeRange,
+    QgsExpression,
+    QgsGraduatedSymbolRenderer,
+    QgsInterval,
+    QgsRendererRange,
+    QgsSymbol,
+    qgsfunction,
+)
+from qgis.PyQt.QtCore import QDateTime, QTimeZone
+from qgis.PyQt.QtGui import QColor
+
+# Expression function giving the level of a well at the frame time
+LEVEL_FUNCTION = "bro_groundwater_level"
+
+# Classes of the level relative to the series mean (m), dry to wet
+ANOMALY_CLASSES = [
+    (-1e9, -0.5, "#b2182b", "< -0.50 m"),
+    (-0.5, -0.2, "#ef8a62", "-0.50 to -0.20 m"),
+    (-0.2, 0.2, "#f7f7f7", "-0.20 to 0.20 m"),
+    (0.2, 0.5, "#67a9cf", "0.20 to 0.50 m"),
+    (0.5, 1e9, "#2166ac", "> 0.50 m"),
+]
+
+# Default animation step
+FRAME_DAYS = 7
+
+
+class TimeSliceIndex:
+    """Value of every series at a moment, looked up for all series at once.
+
+    The series are stored back to back in one array, each shifted by its
+    series number times the total time span. The shifted times are sorted as
+    a whole, so a single ``searchsorted`` finds the last measurement at or
+    before ``t`` in every series.
+    """
+
+    def __init__(self, series):
+        """``series`` is a dict {key: (timestamps, values)} with sorted timestamps."""
+        self.keys = list(series)
+        self.positions = {key: i for i, key in enumerate(self.keys)}
+
+        lengths = np.array([len(series[k][0]) for k in self.keys], dtype=np.int64)
+        self.offsets = np.zeros(len(self.keys) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=self.offsets[1:])
+
+        if self.offsets[-1]:
+            self.times = np.concatenate([series[k][0] for k in self.keys])
+            self.values = np.concatenate([series[k][1] for k in self.keys])
+        else:
+            self.times = np.zeros(0, dtype=np.float64)
+            self.values = np.zeros(0, dtype=np.float64)
+
+        self.start = float(self.times.min()) if len(self.times) else 0.0
+        self.end = float(self.times.max()) if len(self.times) else 0.0
+        self._span = self.end - self.start + 1.0
+        series_ids = np.repeat(np.arange(len(self.keys)), lengths)
+        self._shifted = (self.times - self.start) + series_ids * self._span
+
+        # Mean per series, for levels relative to the usual level of a well
+        sums = np.bincount(series_ids, weights=self.values, minlength=len(self.keys))
+        with np.errstate(invalid="ignore", divide="ignore"):
+            self.means = sums / lengths
+
+    def __len__(self):
+        return len(self.keys)
+
+    def values_at(self, t, interpolate=False, max_gap=None):
+        """Return the value of every series at time ``t`` (NaN where unknown).
+
+        Without interpolation the last measurement at or before ``t`` is
+        used. ``max_gap`` (seconds) drops values older than that, and with
+        interpolation it drops values between measurements further apart.
+        """
+        n = len(self.keys)
+        result = np.full(n, np.nan)
+        if n == 0 or not len(self.times):
+            return result
+
+        # Past the end a query would land in the next series' block: clamp it
+        query = (min(t, self.end) - self.start) + np.arange(n) * self._span
+        before = np.searchsorted(self._shifted, query, side="right") - 1
+        has_before = before >= self.offsets[:-1]
+
+        idx = np.where(has_before, before, 0)
+        result[has_before] = self.values[idx[has_before]]
+        if not interpolate:
+            if max_gap is not None:
+                stale = has_before & (t - self.times[idx] > max_gap)
+                result[stale] = np.nan
+            return result
+
+        # Linear interpolation towards the next measurement of the same series
+        after = idx + 1
+        has_after = has_before & (after < self.offsets[1:])
+        after = np.where(has_after, after, 0)
+        t0 = self.times[idx]
+        t1 = self.times[after]
+        exact = has_before & (t0 == t)
+        between = has_after & ~exact
+        if max_gap is not None:
+            between &= t1 - t0 <= max_gap
+        fraction = np.zeros(n)
+        fraction[between] = (t - t0[between]) / (t1[between] - t0[between])
+        interpolated = self.values[idx] + fraction * (self.values[after] - self.values[idx])
+        result[:] = np.nan
+        result[exact] = self.values[idx[exact]]
+        result[between] = interpolated[between]
+        return result
+
+
+def _qdatetime_seconds(moment):
+    """Return the wall clock time of a QDateTime as seconds, taken as UTC.
+
+    Stored measurement times use the same convention (see series_arrays).
+    """
+    return float(calendar.timegm(moment.toPyDateTime().timetuple()))
+
+
+def _seconds_qdatetime(seconds):
+    return QDateTime.fromSecsSinceEpoch(int(seconds), QTimeZone.utc())
+
+
+class LevelAnimation:
+    """Feed per-frame groundwater levels from a TimeSliceIndex to the wells layer.
+
+    Registers the ``bro_groundwater_level()`` expression function used by a
+    graduated renderer. The values of all wells are computed once per frame
+    time; the renderer then only looks them up per feature.
+    """
+
+    def __init__(self, index, interpolate=False, relative=True, max_gap_days=90):
+        self.index = index
+        self.interpolate = interpolate
+        self.relative = relative
+        self.max_gap = max_gap_days * 86400
+        self._frame = (None, None)
+        self._lock = threading.Lock()
+        self._function = None
+
+    def frame_values(self, t):
+        """Return the values of all wells at ``t``, computed once per frame."""
+        frame_t, values = self._frame
+        if frame_t == t:
+            return values
+        with self._lock:
+            values = self.index.values_at(t, self.interpolate, self.max_gap)
+            if self.relative:
+                values = values - self.index.means
+            self._frame = (t, values)
+        return values
+
+    def value(self, cache_key, moment):
+        position = self.index.positions.get(cache_key)
+        if position is None or moment is None:
+            return None
+        value = self.frame_values(_qdatetime_seconds(moment))[position]
+        return None if np.isnan(value) else float(value)
+
+    def register(self):
+        """Register the expression function used by the renderer."""
+        animation = self
+
+        @qgsfunction(group="BRO Grondwater", referenced_columns=["bro_id", "tube_nr", "name"])
+        def bro_groundwater_level(feature, parent, context):
+            """
+            Groundwater level of the well at the start of the map time range.
+            Relative to the mean of the series, or in m NAP when the animation
+            was started with absolute levels.
+            <h4>Syntax</h4>
+            <div class="syntax"><code>bro_groundwater_level()</code></div>
+            """
+            moment = context.variable("map_start_time") if context else None
+            cache_key = f"{feature['bro_id']}_{feature['tube_nr']}_{feature['name']}"
+            return animation.value(cache_key, moment)
+
+        self._function = bro_groundwater_level
+
+    def unregister(self):
+        if self._function is not None:
+            QgsExpression.unregisterFunction(LEVEL_FUNCTION)
+            self._function = None
+
+    def renderer(self, layer):
+        """Return a graduated renderer on the (relative) level at the frame time."""
+        classes = ANOMALY_CLASSES if self.relative else self._level_classes()
+        ranges = []
+        for lower, upper, color, label in classes:
+            symbol = QgsSymbol.defaultSymbol(layer.geometryType())
+            symbol.setColor(QColor(color))
+            symbol.setSize(3.0)
+            ranges.append(QgsRendererRange(lower, upper, symbol, label))
+        return QgsGraduatedSymbolRenderer(f"{LEVEL_FUNCTION}()", ranges)
+
+    def _level_classes(self):
+        """Return quantile classes over all levels (m NAP)."""
+        finite = self.index.values[np.isfinite(self.index.values)]
+        if not len(finite):
+            return ANOMALY_CLASSES
+        edges = np.quantile(finite, np.linspace(0, 1, len(ANOMALY_CLASSES) + 1))
+        return [
+            (float(edges[i]), float(edges[i + 1]), color, f"{edges[i]:.2f} - {edges[i + 1]:.2f} m NAP")
+            for i, (_, _, color, _) in enumerate(ANOMALY_CLASSES)
+        ]
+
+    def time_range(self):
+        return QgsDateTimeRange(
+            _seconds_qdatetime(self.index.start), _seconds_qdatetime(self.index.end)
+        )
+
+    def apply(self, layer, controller):
+        """Make the layer temporal, style it and set up the temporal controller."""
+        properties = layer.temporalProperties()
+        properties.setMode(Qgis.VectorTemporalMode.FixedTemporalRange)
+        properties.setFixedTemporalRange(self.time_range())
+        properties.setIsActive(True)
+        layer.setRenderer(self.renderer(layer))
+        layer.triggerRepaint()
+
+        controller.setTemporalExtents(self.time_range())
+        controller.setFrameDuration(QgsInterval(FRAME_DAYS, Qgis.TemporalUnit.Days))
+        controller.setNavigationMode(Qgis.TemporalNavigationMode.Animated)
+
+    def prepare_frame(self, time_range):
+        """Compute the values for a new map time range before it is rendered."""
+        if time_range.begin().isValid():
+            self.frame_values(_qdatetime_seconds(time_range.begin()))
@@ -0,0 +1,75 @@
+"""
+BRO Grondwater Plugin - Time window bookkeeping for downloaded series
+
+A window is a (tmin, tmax) tuple of ISO date strings, where None means
+unbounded. Each downloaded series records the window it covers in its
+metadata under "coverage".
+"""
+
+FULL_HISTORY = (None, None)
+
+
+def series_coverage(series_data):
+    """Return the window covered by stored series data (full history if unknown)."""
+    if not series_data:
+        return None
+    coverage = series_data.get("metadata", {}).get("coverage")
+    return tuple(coverage) if coverage else FULL_HISTORY
+
+
+def _before(a, b):
+    """Return True if lower bound ``a`` starts before lower bound ``b``."""
+    return b is not None and (a is None or a < b)
+
+
+def _after(a, b):
+    """Return True if upper bound ``a`` ends after upper bound ``b``."""
+    return b is not None and (a is None or a > b)
+
+
+def missing_spans(coverage, window):
+    """Return the windows that must be fetched to extend ``coverage`` to ``window``.
+
+    Spans are adjacent to the coverage, so the result stays one contiguous
+    window. Returns [window] when nothing is covered yet.
+    """
+    if coverage is None:
+        return [tuple(window)]
+
+    cov_min, cov_max = coverage
+    tmin, tmax = window
+    spans = []
+    if _before(tmin, cov_min):
+        spans.append((tmin, cov_min))
+    if _after(tmax, cov_max):
+        spans.append((cov_max, tmax))
+    return spans
+
+
+def union(coverage, window):
+    """Return the contiguous window spanning ``coverage`` and ``window``."""
+    if coverage is None:
+        return tuple(window)
+    cov_min, cov_max = coverage
+    tmin, tmax = window
+    return (
+        tmin if _before(tmin, cov_min) else cov_min,
+        tmax if _after(tmax, cov_max) else cov_max,
+    )
+
+
+def merge_series(stored, fetched):
+    """Merge fetched series data into stored data, keeping dates unique and sorted."""
+    values_by_date = dict(zip(stored.get("dates", []), stored.get("values", [])))
+    values_by_date.update(zip(fetched.get("dates", []), fetched.get("values", [])))
+    dates = sorted(values_by_date)
+
+    metadata = dict(stored.get("metadata", {}))
+    metadata["coverage"] = list(
+        union(series_coverage(stored), series_coverage(fetched))
+    )
+    return {
+        "dates": dates,
+        "values": [values_by_date[d] for d in dates],
+        "metadata": metadata,
+    }
@@ -0,0 +1,278 @@
+"""
+Load test of the measurement download path against the mock BRO server.
+
+Downloads thousands of (generated) wells through the streaming GLD parser
+with the plugin's retry, backoff and circuit breaker policy, and reports
+throughput, latency percentiles and how failures were handled. With
+recorded fixtures, well retrieval through hydropandas can be timed too.
+
+Examples:
+
+    python tools/load_test.py --wells 2000 --latency 0.05 --rate-429 0.02
+    python tools/load_test.py --wells 500 --outage 5:10 --breaker-cooldown 2
+    python tools/load_test.py --fixtures FIXTURE_DIR --retrieve 118000,122000,486000,490000
+"""
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+from urllib.parse import urlsplit, urlunsplit
+
+import numpy as np
+
+TOOLS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(TOOLS_DIR))
+sys.path.insert(0, TOOLS_DIR)
+
+from download_policy import CircuitBreaker, fetch_with_retries  # noqa: E402
+from gld_parser import fetch_gmw_series  # noqa: E402
+from mock_bro_server import MockBroServer, add_arguments, config_from_arguments  # noqa: E402
+
+# Hosts redirected to the mock server during retrieval runs
+LIVE_HOSTS = ("publiek.broservices.nl", "service.pdok.nl")
+
+
+def percentiles(samples):
+    if not samples:
+        return {"p50": None, "p95": None, "p99": None, "max": None}
+    values = np.asarray(samples)
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {"p50": p50, "p95": p95, "p99": p99, "max": float(values.max())}
+
+
+class DownloadRun:
+    """Download wells like the plugin does and collect timings.
+
+    Runs the plugin's retry loop (``download_policy.fetch_with_retries``):
+    up to ``max_retries`` attempts per well, exponential backoff for
+    throttled/transient errors, and a shared circuit breaker that pauses all
+    workers during outages.
+    """
+
+    def __init__(self, base_url, workers=3, max_retries=3, backoff=1.0, breaker=None):
+        self.base_url = base_url
+        self.workers = workers
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.breaker = breaker or CircuitBreaker()
+        self._lock = threading.Lock()
+        self.attempt_latencies = []
+        self.well_latencies = []
+        self.attempts = 0
+        self.retries = 0
+        self.breaker_wait = 0.0
+        self.points = 0
+        self.failures = {}
+        self.errors_seen = {}
+
+    def _download(self, gmw_id, tube_nrs, tmin, tmax):
+        start = time.perf_counter()
+        attempts = []
+
+        def on_attempt(waited, seconds, error_kind):
+            attempts.append(error_kind)
+            with self._lock:
+                self.attempts += 1
+                self.breaker_wait += waited
+                self.attempt_latencies.append(seconds)
+                if error_kind is not None:
+                    self.errors_seen[error_kind] = self.errors_seen.get(error_kind, 0) + 1
+
+        series, _, error_kind = fetch_with_retries(
+            lambda: fetch_gmw_series(gmw_id, tube_nrs, tmin, tmax, base_url=self.base_url),
+            self.breaker,
+            max_retries=self.max_retries,
+            backoff=self.backoff,
+            on_attempt=on_attempt,
+        )
+        with self._lock:
+            self.retries += len(attempts) - 1
+            if series is None:
+                self.failures[error_kind] = self.failures.get(error_kind, 0) + 1
+                return False
+            self.well_latencies.append(time.perf_counter() - start)
+            self.points += sum(len(s) for s in series.values())
+        return True
+
+    def run(self, gmw_ids, tube_nrs, tmin=None, tmax=None):
+        """Download all wells and return the report dict."""
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            futures = [
+                executor.submit(self._download, gmw_id, tube_nrs, tmin, tmax)
+                for gmw_id in gmw_ids
+            ]
+            succeeded = sum(1 for future in as_completed(futures) if future.result())
+        duration = time.perf_counter() - start
+
+        return {
+            "wells": len(gmw_ids),
+            "succeeded": succeeded,
+            "failed": dict(self.failures),
+            "duration_s": duration,
+            "wells_per_s": succeeded / duration if duration else None,
+            "points_per_s": self.points / duration if duration else None,
+            "attempts": self.attempts,
+            "retries": self.retries,
+            "errors_seen": dict(self.errors_seen),
+            "breaker_wait_s": self.breaker_wait,
+            "well_latency_s": percentiles(self.well_latencies),
+            "request_latency_s": percentiles(self.attempt_latencies),
+        }
+
+
+@contextmanager
+def redirect_requests(base_url):
+    """Send requests for the live BRO/PDOK hosts to the mock server instead."""
+    from requests.adapters import HTTPAdapter
+
+    target = urlsplit(base_url)
+    original_send = HTTPAdapter.send
+
+    def send(adapter, request, **kwargs):
+        parts = urlsplit(request.url)
+        if parts.hostname in LIVE_HOSTS:
+            request.url = urlunsplit(
+                (target.scheme, target.netloc, parts.path, parts.query, parts.fragment)
+            )
+        return original_send(adapter, request, **kwargs)
+
+    HTTPAdapter.send = send
+    try:
+        yield
+    finally:
+        HTTPAdapter.send = original_send
+
+
+def run_retrieval(base_url, extent, repeats, engines):
+    """Time hpd.read_bro for an extent against the mock server, per engine."""
+    import hydropandas as hpd
+
+    from engine_selection import engine_kwargs
+
+    report = {}
+    with redirect_requests(base_url):
+        for engine in engines:
+            timings = []
+            try:
+                for _ in range(repeats):
+                    start = time.perf_counter()
+                    collection = hpd.read_bro(
+                        extent=extent,
+                        tmin=None,
+                        tmax=None,
+                        only_metadata=True,
+                        **engine_kwargs(engine),
+                    )
+                    timings.append(time.perf_counter() - start)
+            except Exception as e:
+                report[engine] = {"error": f"{type(e).__name__}: {e}"}
+                continue
+            report[engine] = {"wells": len(collection), "seconds": percentiles(timings)}
+    return report
+
+
+def print_report(report):
+    downloads = report.get("downloads")
+    if downloads:
+        print(
+            f"Downloads: {downloads['succeeded']}/{downloads['wells']} wells in "
+            f"{downloads['duration_s']:.1f} s "
+            f"({downloads['wells_per_s']:.1f} wells/s, {downloads['points_per_s']:.0f} points/s)"
+        )
+        print(
+            f"  attempts {downloads['attempts']}, retries {downloads['retries']}, "
+            f"breaker wait {downloads['breaker_wait_s']:.1f} s"
+        )
+        for name in ("well_latency_s", "request_latency_s"):
+            p = downloads[name]
+            if p["p50"] is not None:
+                print(
+                    f"  {name}: p50 {p['p50']:.3f}  p95 {p['p95']:.3f}  "
+                    f"p99 {p['p99']:.3f}  max {p['max']:.3f}"
+                )
+        print(f"  errors seen: {downloads['errors_seen'] or 'none'}")
+        print(f"  failed wells: {downloads['failed'] or 'none'}")
+    for engine, result in report.get("retrieval", {}).items():
+        if "error" in result:
+            print(f"Retrieval ({engine}): {result['error']}")
+        else:
+            p = result["seconds"]
+            print(
+                f"Retrieval ({engine}): {result['wells']} wells, "
+                f"p50 {p['p50']:.2f} s, max {p['max']:.2f} s"
+            )
+    print(f"Server responses: {report['server']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__.split("\n\n")[1], formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    add_arguments(parser)
+    parser.add_argument("--url", help="Use a running mock server instead of starting one")
+    parser.add_argument("--wells", type=int, default=1000, help="Number of wells to download")
+    parser.add_argument("--workers", type=int, default=3, help="Download threads (plugin: 3)")
+    parser.add_argument("--tmin", help="Start of the download period (YYYY-MM-DD)")
+    parser.add_argument("--tmax", help="End of the download period (YYYY-MM-DD)")
+    parser.add_argument(
+        "--backoff", type=float, default=1.0, help="Base backoff in seconds (plugin: 1)"
+    )
+    parser.add_argument("--breaker-threshold", type=int, default=5)
+    parser.add_argument("--breaker-cooldown", type=float, default=15.0)
+    parser.add_argument(
+        "--retrieve",
+        metavar="XMIN,XMAX,YMIN,YMAX",
+        help="Also time hpd.read_bro for this RD extent (needs recorded fixtures)",
+    )
+    parser.add_argument("--engines", default="brodata,default")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--json", help="Write the report to this JSON file")
+    args = parser.parse_args()
+
+    server = None
+    base_url = args.url
+    if base_url is None:
+        server = MockBroServer(config_from_arguments(args), args.fixtures).start()
+        base_url = server.url
+
+    report = {}
+    try:
+        if args.wells:
+            run = DownloadRun(
+                base_url,
+                workers=args.workers,
+                backoff=args.backoff,
+                breaker=CircuitBreaker(
+                    threshold=args.breaker_threshold,
+                    cooldown=args.breaker_cooldown,
+                    max_cooldown=16 * args.breaker_cooldown,
+                ),
+            )
+            gmw_ids = [f"GMW{i:012d}" for i in range(1, args.wells + 1)]
+            report["downloads"] = run.run(
+                gmw_ids, list(range(1, args.tubes + 1)), args.tmin, args.tmax
+            )
+        if args.retrieve:
+            extent = tuple(float(v) for v in args.retrieve.split(","))
+            report["retrieval"] = run_retrieval(
+                base_url, extent, args.repeats, args.engines.split(",")
+            )
+    finally:
+        report["server"] = dict(server.stats) if server else {}
+        if server is not None:
+            server.stop()
+
+    print_report(report)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, default=float)
+
+
+if __name__ == "__main__":
+    main()
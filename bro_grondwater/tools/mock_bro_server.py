@@ -0,0 +1,354 @@
+"""
+Local stand-in for the BRO and PDOK services, for offline load tests.
+
+Responses come from recorded fixtures (the JSON files written by the engine
+benchmark or ``gld_parser.validate_against_hydropandas``) or, for the
+gmw-relations and GLD endpoints, are generated. Latency, bandwidth, HTTP 429
+throttling and outage windows are configurable so the download scheduler can
+be exercised reproducibly.
+
+Run standalone:
+
+    python tools/mock_bro_server.py --port 8765 --latency 0.05 --rate-429 0.02
+"""
+
+import argparse
+import base64
+import calendar
+import json
+import math
+import os
+import random
+import re
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+# Size of the chunks a response is written in when bandwidth is limited
+CHUNK_SIZE = 16384
+
+WATERML_HEADER = (
+    '<?xml version="1.0" encoding="UTF-8"?>'
+    '<dispatchDataResponse xmlns="http://www.broservices.nl/xsd/dsgld/1.0"'
+    ' xmlns:waterml="http://www.opengis.net/waterml/2.0"'
+    ' xmlns:swe="http://www.opengis.net/swe/2.0">'
+    "<dispatchDocument><GLD_O><observation><waterml:OM_Observation><waterml:result>"
+    "<waterml:MeasurementTimeseries>"
+)
+WATERML_FOOTER = (
+    "</waterml:MeasurementTimeseries></waterml:result></waterml:OM_Observation>"
+    "</observation></GLD_O></dispatchDocument></dispatchDataResponse>"
+)
+WATERML_POINT = (
+    "<waterml:point><waterml:MeasurementTVP><waterml:time>{time}</waterml:time>"
+    '<waterml:value uom="m">{value:.3f}</waterml:value><waterml:metadata>'
+    "<waterml:TVPMeasurementMetadata><waterml:qualifier><swe:Category>"
+    "<swe:value>goedgekeurd</swe:value></swe:Category></waterml:qualifier>"
+    "</waterml:TVPMeasurementMetadata></waterml:metadata></waterml:MeasurementTVP>"
+    "</waterml:point>"
+)
+
+CAPABILITIES = (
+    '<?xml version="1.0" encoding="UTF-8"?>'
+    '<WMS_Capabilities version="1.3.0" xmlns="http://www.opengis.net/wms">'
+    "<Capability><Layer><Name>gm_gmw</Name><Layer><Name>gm_gmw</Name></Layer>"
+    "<Layer><Name>standaard</Name></Layer></Layer></Capability></WMS_Capabilities>"
+)
+
+
+class MockConfig:
+    """Network behaviour of the mock server.
+
+    ``outages`` is a list of (start, duration) in seconds after the server
+    started during which every request gets HTTP 503.
+    """
+
+    def __init__(
+        self,
+        latency=0.0,
+        jitter=0.0,
+        bandwidth=0,
+        rate_429=0.0,
+        outages=(),
+        tubes_per_well=2,
+        points_per_gld=1000,
+        seed=1,
+    ):
+        self.latency = latency
+        self.jitter = jitter
+        self.bandwidth = bandwidth  # bytes per second, 0 is unlimited
+        self.rate_429 = rate_429
+        self.outages = list(outages)
+        self.tubes_per_well = tubes_per_well
+        self.points_per_gld = points_per_gld
+        self.seed = seed
+
+
+def _fixture_key(url):
+    parts = urlsplit(url)
+    return f"{parts.path}?{parts.query}" if parts.query else parts.path
+
+
+def load_fixtures(fixture_dir):
+    """Return {path?query: fixture} for the recorded responses in a folder."""
+    fixtures = {}
+    if not fixture_dir:
+        return fixtures
+    for root, _, files in os.walk(fixture_dir):
+        for file_name in files:
+            if not file_name.endswith(".json"):
+                continue
+            with open(os.path.join(root, file_name), encoding="utf-8") as f:
+                fixture = json.load(f)
+            if "url" in fixture and "content" in fixture:
+                fixtures[_fixture_key(fixture["url"])] = fixture
+    return fixtures
+
+
+def synthetic_relations(gmw_id, tubes_per_well):
+    """Return a gmw-relations document with one GLD per tube."""
+    number = re.sub(r"\D", "", gmw_id) or "0"
+    return {
+        "broId": gmw_id,
+        "monitoringTubeReferences": [
+            {
+                "tubeNumber": tube_nr,
+                "gldReferences": [{"broId": f"GLD{int(number):09d}{tube_nr:03d}"}],
+            }
+            for tube_nr in range(1, tubes_per_well + 1)
+        ],
+    }
+
+
+def synthetic_gld(gld_id, points, tmin=None, tmax=None):
+    """Return a WaterML GLD document with daily measurements."""
+    number = int(re.sub(r"\D", "", gld_id) or 0)
+    start = calendar.timegm(time.strptime(tmin, "%Y-%m-%d")) if tmin else 946684800
+    end = calendar.timegm(time.strptime(tmax, "%Y-%m-%d")) if tmax else math.inf
+    parts = [WATERML_HEADER]
+    for i in range(points):
+        moment = start + i * 86400
+        if moment > end:
+            break
+        parts.append(
+            WATERML_POINT.format(
+                time=time.strftime("%Y-%m-%dT%H:%M:%S+00:00", time.gmtime(moment)),
+                value=math.sin(i / 58.0 + number) - (number % 7),
+            )
+        )
+    parts.append(WATERML_FOOTER)
+    return "".join(parts).encode("utf-8")
+
+
+class _QuietServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Clients giving up on a slow response are expected under load
+        if not isinstance(sys.exc_info()[1], (BrokenPipeError, ConnectionResetError)):
+            super().handle_error(request, client_address)
+
+
+class MockBroServer:
+    """Threaded HTTP server replaying BRO/PDOK responses."""
+
+    def __init__(self, config=None, fixture_dir=None, host="127.0.0.1", port=0):
+        self.config = config or MockConfig()
+        self.fixtures = load_fixtures(fixture_dir)
+        self.started = time.monotonic()
+        self.stats = {}
+        self._lock = threading.Lock()
+        self._random = random.Random(self.config.seed)
+        self._thread = None
+
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                server._handle(self)
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                if length:
+                    self.rfile.read(length)
+                server._handle(self)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.httpd = _QuietServer((host, port), Handler)
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        """Serve in a background thread."""
+        self.started = time.monotonic()
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def _count(self, status):
+        with self._lock:
+            self.stats[status] = self.stats.get(status, 0) + 1
+
+    def _in_outage(self):
+        elapsed = time.monotonic() - self.started
+        return any(start <= elapsed < start + duration for start, duration in self.config.outages)
+
+    def _draw(self):
+        with self._lock:
+            return self._random.random(), self._random.random()
+
+    def _respond(self, handler, status, body, content_type, headers=None):
+        self._count(status)
+        handler.send_response(status)
+        handler.send_header("Content-Type", content_type)
+        handler.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            handler.send_header(name, value)
+        handler.end_headers()
+
+        bandwidth = self.config.bandwidth
+        if not bandwidth:
+            handler.wfile.write(body)
+            return
+        for offset in range(0, len(body), CHUNK_SIZE):
+            chunk = body[offset : offset + CHUNK_SIZE]
+            handler.wfile.write(chunk)
+            time.sleep(len(chunk) / bandwidth)
+
+    def _handle(self, handler):
+        config = self.config
+        throttle_draw, jitter_draw = self._draw()
+        try:
+            if self._in_outage():
+                self._respond(handler, 503, b"Service Unavailable", "text/plain")
+                return
+            if throttle_draw < config.rate_429:
+                self._respond(
+                    handler, 429, b"Too Many Requests", "text/plain", {"Retry-After": "1"}
+                )
+                return
+
+            time.sleep(max(0.0, config.latency + (2 * jitter_draw - 1) * config.jitter))
+
+            fixture = self.fixtures.get(_fixture_key(handler.path))
+            if fixture is not None:
+                headers = {
+                    k: v
+                    for k, v in fixture["headers"].items()
+                    if k.lower() not in ("content-length", "content-encoding", "transfer-encoding")
+                }
+                content_type = headers.pop("Content-Type", "application/octet-stream")
+                self._respond(
+                    handler,
+                    fixture["status"],
+                    base64.b64decode(fixture["content"]),
+                    content_type,
+                    headers,
+                )
+                return
+
+            parts = urlsplit(handler.path)
+            query = {k: v[0] for k, v in parse_qs(parts.query).items()}
+            match = re.search(r"/gm/v1/gmw-relations/([^/]+)$", parts.path)
+            if match:
+                body = json.dumps(
+                    synthetic_relations(match.group(1), config.tubes_per_well)
+                ).encode("utf-8")
+                self._respond(handler, 200, body, "application/json")
+                return
+            match = re.search(r"/gm/gld/v1/objects/([^/]+)$", parts.path)
+            if match:
+                body = synthetic_gld(
+                    match.group(1),
+                    config.points_per_gld,
+                    query.get("observationPeriodBeginDate"),
+                    query.get("observationPeriodEndDate"),
+                )
+                self._respond(handler, 200, body, "application/xml")
+                return
+            if query.get("request", query.get("REQUEST", "")).lower() == "getcapabilities":
+                self._respond(handler, 200, CAPABILITIES.encode("utf-8"), "application/xml")
+                return
+
+            self._respond(handler, 404, b"Not Found", "text/plain")
+        except (BrokenPipeError, ConnectionResetError):
+            self._count("disconnected")
+
+
+def parse_outages(values):
+    """Parse outage windows given as START:DURATION seconds."""
+    outages = []
+    for value in values or []:
+        start, duration = value.split(":")
+        outages.append((float(start), float(duration)))
+    return outages
+
+
+def add_arguments(parser):
+    """Add the mock server options to an argument parser."""
+    parser.add_argument("--fixtures", help="Folder with recorded responses")
+    parser.add_argument("--latency", type=float, default=0.0, help="Latency per request (s)")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Latency jitter (+/- s)")
+    parser.add_argument(
+        "--bandwidth", type=float, default=0, help="Bandwidth per response (bytes/s)"
+    )
+    parser.add_argument(
+        "--rate-429", type=float, default=0.0, help="Fraction of requests answered with 429"
+    )
+    parser.add_argument(
+        "--outage",
+        action="append",
+        metavar="START:DURATION",
+        help="Answer 503 during this window (s after start); repeatable",
+    )
+    parser.add_argument("--tubes", type=int, default=2, help="Tubes per generated well")
+    parser.add_argument("--points", type=int, default=1000, help="Points per generated GLD")
+    parser.add_argument("--seed", type=int, default=1)
+
+
+def config_from_arguments(args):
+    return MockConfig(
+        latency=args.latency,
+        jitter=args.jitter,
+        bandwidth=args.bandwidth,
+        rate_429=args.rate_429,
+        outages=parse_outages(args.outage),
+        tubes_per_well=args.tubes,
+        points_per_gld=args.points,
+        seed=args.seed,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--port", type=int, default=8765)
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    server = MockBroServer(config_from_arguments(args), args.fixtures, port=args.port)
+    print(f"Mock BRO server on {server.url} ({len(server.fixtures)} fixtures)")
+    print("Set BROGrondwater/bro_api_url to this URL to use it from the plugin")
+    try:
+        server.started = time.monotonic()
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+BRO Grondwater Plugin - GeoPackage storage for retrieved wells
+"""
+
+import os
+from qgis.core import (
+    Qgis,
+    QgsCoordinateReferenceSystem,
+    QgsFeatureRequest,
+    QgsProject,
+    QgsVectorFileWriter,
+    QgsVectorLayer,
+)
+
+WELLS_LAYER_NAME = "bro_wells"
+
+
+def well_key(bro_id, tube_nr):
+    """Return the key that identifies a single tube of a monitoring well."""
+    return (str(bro_id or ""), int(tube_nr) if tube_nr not in (None, "") else 0)
+
+
+def open_wells_layer(path, display_name):
+    """Open the wells table of a GeoPackage, or return None if it does not exist."""
+    if not os.path.exists(path):
+        return None
+
+    layer = QgsVectorLayer(f"{path}|layername={WELLS_LAYER_NAME}", display_name, "ogr")
+    if not layer.isValid():
+        return None
+    return layer
+
+
+def create_wells_geopackage(path, fields):
+    """Create an empty, spatially indexed wells table in a GeoPackage.
+
+    An existing GeoPackage is kept; only the wells table is (re)created.
+    """
+    options = QgsVectorFileWriter.SaveVectorOptions()
+    options.driverName = "GPKG"
+    options.layerName = WELLS_LAYER_NAME
+    options.layerOptions = ["SPATIAL_INDEX=YES", "FID=fid"]
+    if os.path.exists(path):
+        options.actionOnExistingFile = (
+            QgsVectorFileWriter.ActionOnExistingFile.CreateOrOverwriteLayer
+        )
+    else:
+        options.actionOnExistingFile = (
+            QgsVectorFileWriter.ActionOnExistingFile.CreateOrOverwriteFile
+        )
+
+    writer = QgsVectorFileWriter.create(
+        path,
+        fields,
+        Qgis.WkbType.Point,
+        QgsCoordinateReferenceSystem("EPSG:28992"),
+        QgsProject.instance().transformContext(),
+        options,
+    )
+    if writer.hasError() != QgsVectorFileWriter.WriterError.NoError:
+        message = writer.errorMessage()
+        del writer
+        raise IOError(f"Could not create GeoPackage {path}: {message}")
+
+    # Deleting the writer flushes and closes the data source
+    del writer
+
+
+def existing_well_keys(layer):
+    """Return the set of (bro_id, tube_nr) keys already stored in the layer.
+
+    The depth filter is a subset string on the layer (and its provider), so
+    it is cleared while reading; otherwise filtered wells would look new.
+    """
+    request = QgsFeatureRequest()
+    request.setFlags(QgsFeatureRequest.Flag.NoGeometry)
+    request.setSubsetOfAttributes(["bro_id", "tube_nr"], layer.fields())
+
+    subset = layer.subsetString()
+    if subset:
+        layer.setSubsetString("")
+    try:
+        return {
+            well_key(feature["bro_id"], feature["tube_nr"])
+            for feature in layer.getFeatures(request)
+        }
+    finally:
+        if subset:
+            layer.setSubsetString(subset)
+
+
+def append_wells(layer, features):
+    """Append features that are not stored yet, in a single transaction.
+
+    Returns the number of features that were added.
+    """
+    known = existing_well_keys(layer)
+    new_features = []
+    for feature in features:
+        key = well_key(feature["bro_id"], feature["tube_nr"])
+        if key in known:
+            continue
+        known.add(key)
+        new_features.append(feature)
+
+    if not new_features:
+        return 0
+
+    # The OGR provider wraps addFeatures in one transaction for GeoPackages
+    success, _ = layer.dataProvider().addFeatures(new_features)
+    if not success:
+        errors = "; ".join(layer.dataProvider().errors())
+        raise IOError(f"Could not write wells to GeoPackage: {errors}")
+
+    layer.updateExtents()
+    return len(new_features)